@@ -7,9 +7,16 @@ from .agent_base import Agent
 
 # Tools
 from .browser_preview import BrowserPreviewTool
+from .command_output import CommandOutputTool
+from .command_status import CommandStatusTool
 from .edit_file import EditFileTool
+from .edit_files import EditFilesTool
+from .edit_history import EditHistoryTool
+from .kill_command import KillCommandTool
 from .run_command import RunCommandTool
 from .view_file import ViewFileTool
+from .view_files import ViewFilesTool
+from .wait_command import WaitCommandTool
 from .write_to_file import WriteToFileTool
 
 # Agents
@@ -30,9 +37,16 @@ __all__ = [
 
     # Tools
     'BrowserPreviewTool',
+    'CommandOutputTool',
+    'CommandStatusTool',
     'EditFileTool',
+    'EditFilesTool',
+    'EditHistoryTool',
+    'KillCommandTool',
     'RunCommandTool',
     'ViewFileTool',
+    'ViewFilesTool',
+    'WaitCommandTool',
     'WriteToFileTool',
 
     # Agents
@@ -1,11 +1,11 @@
 """
 Base Agent class for the multi-agent MCP server.
 """
-import json
 import logging
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional, Callable
 
+from . import serialization
 from .base_tool import BaseTool
 
 
@@ -60,7 +60,10 @@ class Agent(ABC):
         Returns:
             The system prompt for the agent
         """
-        tools_json = json.dumps({tool.name: tool.to_dict() for tool in self.tools}, indent=2)
+        # Each tool serializes its definition once; only the mapping is built here
+        tools_json = "{\n" + ",\n".join(
+            f"  {serialization.dumps(tool.name)}: {tool.to_json()}" for tool in self.tools
+        ) + "\n}"
         
         return f"""
 You are the {self.name} agent, part of a multi-agent system.
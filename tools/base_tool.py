@@ -1,9 +1,11 @@
 """
 Base Tool class for MCP server tools.
 """
-import json
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Optional
+
+from . import serialization
+from .schema import compile_schema
 
 
 class BaseTool(ABC):
@@ -22,6 +24,22 @@ class BaseTool(ABC):
         self.description = description
         self.schema = schema
         
+        # Parse and compile the schema once, rather than on every call
+        try:
+            self.schema_obj = serialization.loads(schema)
+            self._validator = compile_schema(self.schema_obj)
+        except (serialization.JSONDecodeError, ValueError):
+            self.schema_obj = None
+            self._validator = None
+        
+        # The definition never changes, so build and serialize it once
+        self._definition = {
+            "name": self.name,
+            "description": self.description,
+            "schema": self.schema
+        }
+        self._definition_json: Optional[str] = None
+        
     @abstractmethod
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -35,6 +53,21 @@ class BaseTool(ABC):
         """
         pass
     
+    async def stream(self, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute the tool, yielding its response in one or more frames.
+        
+        Tools that report progress as they go override this; by default the
+        result of execute is the only frame.
+        
+        Args:
+            params: The parameters for the tool
+            
+        Yields:
+            The responses of the tool
+        """
+        yield await self.execute(params)
+    
     def to_dict(self) -> Dict[str, str]:
         """
         Convert the tool to a dictionary representation.
@@ -42,35 +75,33 @@ class BaseTool(ABC):
         Returns:
             A dictionary with the tool's name, description, and schema
         """
-        return {
-            "name": self.name,
-            "description": self.description,
-            "schema": self.schema
-        }
+        return dict(self._definition)
+    
+    def to_json(self) -> str:
+        """
+        Get the serialized definition of the tool.
+        
+        Returns:
+            The compact JSON form of to_dict(), computed once
+        """
+        if self._definition_json is None:
+            self._definition_json = serialization.dumps(self._definition)
+        return self._definition_json
     
     def validate_params(self, params: Dict[str, Any]) -> Optional[str]:
         """
         Validate the parameters against the schema.
         
+        Checks required parameters, parameter types, unexpected parameters
+        when additionalProperties is false, and the types of array items.
+        
         Args:
             params: The parameters to validate
             
         Returns:
             An error message if validation fails, None otherwise
         """
-        # This is a simplified validation - in a real implementation,
-        # you would use a JSON schema validator
-        try:
-            schema_obj = json.loads(self.schema)
-            required = schema_obj.get("required", [])
-            
-            # Check required parameters
-            for param in required:
-                if param not in params:
-                    return f"Missing required parameter: {param}"
-            
-            # Additional validation could be added here
-            
-            return None
-        except json.JSONDecodeError:
+        if self._validator is None:
             return "Invalid schema format"
+        
+        return self._validator(params)
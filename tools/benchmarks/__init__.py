@@ -0,0 +1,5 @@
+"""
+Benchmarks for the MCP server tools.
+
+Each module can be run on its own, e.g. python -m tools.benchmarks.bench_tool_calls
+"""
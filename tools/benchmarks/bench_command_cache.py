@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark cached vs. uncached runs of a command over a source tree.
+
+Generates a tree of TypeScript files and runs a command reading all of them
+with run_command, first uncached, then with CacheInputs set: once to fill the
+cache, then again on the unchanged tree, and once more after touching a file.
+By default the command sleeps for a second before reading the files, standing
+in for a type checker; pass --command to time a real one.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from ..command_cache import get_command_cache
+from ..run_command import RunCommandTool
+
+
+def generate_tree(root: str, count: int):
+    """Write count small TypeScript files spread over a few directories."""
+    for index in range(count):
+        directory = os.path.join(root, "src", f"module_{index % 20}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file_{index}.ts"), "w") as f:
+            f.write(f"export const value{index}: number = {index};\n" * 20)
+    with open(os.path.join(root, "tsconfig.json"), "w") as f:
+        f.write('{"compilerOptions": {"strict": true}}\n')
+    # Files older than the racy window have their digests remembered
+    old = time.time() - 60
+    for directory, _, names in os.walk(root):
+        for name in names:
+            os.utime(os.path.join(directory, name), (old, old))
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Command result cache benchmark")
+    parser.add_argument("--files", type=int, default=2000, help="Number of source files generated")
+    parser.add_argument("--command", default="sleep 1; cat src/*/*.ts | wc -l", help="Command line to run")
+    parser.add_argument("--cwd", help="Run in this directory instead of a generated tree")
+    return parser.parse_args()
+
+
+async def timed(tool: RunCommandTool, params) -> str:
+    """Run a command and describe how long it took."""
+    start = time.perf_counter()
+    result = await tool.execute(params)
+    elapsed = (time.perf_counter() - start) * 1e3
+    return f"{elapsed:>10.1f}ms  cached={result.get('cached')}  exit_code={result.get('exit_code')}"
+
+
+async def run_benchmark(args, cwd: str):
+    """Run the command in each mode and print the timings."""
+    tool = RunCommandTool()
+    params = {
+        "CommandLine": args.command,
+        "Cwd": cwd,
+        "Blocking": True,
+        "WaitMsBeforeAsync": 0,
+        "SafeToAutoRun": True
+    }
+    cached = dict(params, CacheInputs=["src/**/*.ts", "tsconfig.json"])
+
+    print(f"{args.command!r} in {cwd}")
+    print(f"{'uncached':<18}{await timed(tool, params)}")
+    print(f"{'cold cache':<18}{await timed(tool, cached)}")
+    print(f"{'warm cache':<18}{await timed(tool, cached)}")
+
+    with open(os.path.join(cwd, "tsconfig.json"), "a") as f:
+        f.write("\n")
+    print(f"{'after an edit':<18}{await timed(tool, cached)}")
+    print(f"cache: {get_command_cache().stats()}")
+
+
+def main():
+    """Run the benchmark."""
+    args = parse_args()
+    if args.cwd:
+        asyncio.run(run_benchmark(args, args.cwd))
+        return
+    with tempfile.TemporaryDirectory() as root:
+        generate_tree(root, args.files)
+        asyncio.run(run_benchmark(args, root))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark the edit engine of edit_file on large files.
+
+Applies a CodeEdit with dozens of edit blocks to a generated Python file of
+100k lines, with the anchored engine and with the original implementation,
+which searched each block with str.find and never spliced the result in.
+"""
+import argparse
+import re
+import time
+from typing import Callable, Set, Tuple
+
+from ..edit_engine import apply_edits
+
+
+def legacy_apply_edits(original_content: str, code_edit: str) -> str:
+    """The original EditFileTool._apply_edits."""
+    edit_sections = re.split(r'{{ *\.\.\. *}}', code_edit)
+    if len(edit_sections) == 1 and "{{ ... }}" not in code_edit:
+        return edit_sections[0]
+
+    result = original_content
+    current_pos = 0
+    for section in edit_sections:
+        if not section.strip():
+            continue
+        section_pos = result.find(section, current_pos)
+        if section_pos == -1:
+            result += "\n" + section
+        else:
+            current_pos = section_pos + len(section)
+    return result
+
+
+def generate_file(lines: int, doubled: Set[int] = frozenset()) -> Tuple[str, int]:
+    """Generate a Python module of about the given number of lines."""
+    body = [
+        "    total = 0",
+        "    for item in items:",
+        "        if item is None:",
+        "            continue",
+        "        total += item",
+        "    return total",
+        "",
+    ]
+    functions = lines // (len(body) + 1)
+    parts = []
+    for index in range(functions):
+        parts.append(f"def function_{index}(items):")
+        parts.extend(body)
+        if index in doubled:
+            parts[-2] = "    return total * 2"
+    return "\n".join(parts) + "\n", functions
+
+
+def edited_functions(functions: int, hunks: int) -> range:
+    """The indexes of the functions changed by the edit."""
+    step = max(1, functions // hunks)
+    return range(0, step * hunks, step)
+
+
+def generate_edit(functions: int, hunks: int) -> str:
+    """Generate a CodeEdit changing the return line of evenly spaced functions."""
+    blocks = ["{{ ... }}"]
+    for index in edited_functions(functions, hunks):
+        blocks.extend([
+            f"def function_{index}(items):",
+            "    total = 0",
+            "    for item in items:",
+            "        if item is None:",
+            "            continue",
+            "        total += item",
+            "    return total * 2",
+            "",
+            f"def function_{index + 1}(items):",
+            "{{ ... }}",
+        ])
+    return "\n".join(blocks) + "\n"
+
+
+def timed(function: Callable[[], object], repeat: int) -> float:
+    """Return the mean time of one call, in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Edit engine benchmark")
+    parser.add_argument("--lines", type=int, default=100_000, help="Number of lines in the edited file")
+    parser.add_argument("--hunks", type=int, default=48, help="Number of edit blocks in the edit")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per measurement")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark and print the timings."""
+    args = parse_args()
+
+    content, functions = generate_file(args.lines)
+    code_edit = generate_edit(functions, args.hunks)
+
+    expected, _ = generate_file(args.lines, set(edited_functions(functions, args.hunks)))
+
+    new_content, hunks = apply_edits(content, code_edit)
+    legacy_content = legacy_apply_edits(content, code_edit)
+
+    print(f"file: {content.count(chr(10))} lines, {len(content) / 1e6:.1f} MB; edit: {args.hunks} blocks")
+    print(f"{'implementation':<16}{'time':>12}{'correct':>10}")
+    print(f"{'legacy':<16}{timed(lambda: legacy_apply_edits(content, code_edit), args.repeat):>10.1f}ms{str(legacy_content == expected):>10}")
+    print(f"{'anchored':<16}{timed(lambda: apply_edits(content, code_edit), args.repeat):>10.1f}ms{str(new_content == expected):>10}")
+    print(f"hunks applied: {len(hunks)}")
+
+if __name__ == "__main__":
+    main()
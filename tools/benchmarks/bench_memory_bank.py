@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark storing memories in a large MemoryBankAgent.
+
+Fills a bank with a number of memories, then times storing more of them one
+by one, once with the log-structured store and once by rewriting index.pkl
+and content.pkl in full as the agent used to on every write.
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import tempfile
+import time
+from typing import Dict
+
+from .. import serialization
+from ..memory_bank_agent import MemoryBankAgent
+
+
+def make_content(index: int, size: int) -> str:
+    """Generate the content of a memory."""
+    line = f"def function_{index}(value):  # memory {index}\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def fill(agent: MemoryBankAgent, count: int, size: int):
+    """Write count memories to the agent's log in one batch."""
+    records = []
+    for index in range(count):
+        metadata = {"tags": ["bench"], "timestamp": 0}
+        records.append((f"c/memory_{index}", serialization.dumps_bytes(make_content(index, size))))
+        records.append((f"m/memory_{index}", serialization.dumps_bytes(metadata)))
+        agent.memory_index[f"memory_{index}"] = metadata
+    agent._store.write_batch(records)
+
+
+async def store_log(agent: MemoryBankAgent, count: int, size: int, offset: int) -> float:
+    """Time storing memories through the agent, in ms per store."""
+    start = time.perf_counter()
+    for index in range(offset, offset + count):
+        message = {"action": "store", "key": f"memory_{index}", "content": make_content(index, size), "tags": ["bench"]}
+        await agent.process(message, {"timestamp": 0})
+    return (time.perf_counter() - start) * 1e3 / count
+
+
+def store_pickles(directory: str, index: Dict, content: Dict, count: int, size: int, offset: int) -> float:
+    """Time storing memories by rewriting both pickles each time, in ms per store."""
+    start = time.perf_counter()
+    for i in range(offset, offset + count):
+        content[f"memory_{i}"] = make_content(i, size)
+        index[f"memory_{i}"] = {"tags": ["bench"], "timestamp": 0}
+        with open(os.path.join(directory, "index.pkl"), "wb") as f:
+            f.write(pickle.dumps(index))
+        with open(os.path.join(directory, "content.pkl"), "wb") as f:
+            f.write(pickle.dumps(content))
+    return (time.perf_counter() - start) * 1e3 / count
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="MemoryBank store benchmark")
+    parser.add_argument("--memories", type=int, default=20000, help="Number of memories already in the bank")
+    parser.add_argument("--size", type=int, default=2048, help="Size of each memory in bytes")
+    parser.add_argument("--stores", type=int, default=20, help="Number of memories stored while timing")
+    return parser.parse_args()
+
+
+async def run_benchmark(args):
+    """Run both stores and print the timings."""
+    with tempfile.TemporaryDirectory() as root:
+        agent = MemoryBankAgent(os.path.join(root, "log"))
+        fill(agent, args.memories, args.size)
+        log_ms = await store_log(agent, args.stores, args.size, args.memories)
+
+        directory = os.path.join(root, "pickles")
+        os.makedirs(directory)
+        index = {f"memory_{i}": {"tags": ["bench"], "timestamp": 0} for i in range(args.memories)}
+        content = {f"memory_{i}": make_content(i, args.size) for i in range(args.memories)}
+        pickle_ms = store_pickles(directory, index, content, args.stores, args.size, args.memories)
+
+    print(f"{args.memories} memories of {args.size} bytes")
+    print(f"{'pickle rewrite':<16}{pickle_ms:>10.2f}ms per store")
+    print(f"{'append to log':<16}{log_ms:>10.2f}ms per store")
+
+
+def main():
+    """Run the benchmark."""
+    asyncio.run(run_benchmark(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Benchmark the per-message cost of JSON encoding and decoding.
+
+Compares the standard library calls the servers used to make directly with
+the serialization module, which uses orjson when it is installed.
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict
+
+from .. import serialization
+
+
+def view_file_response() -> Dict[str, Any]:
+    """A typical view_file response: 200 lines of TypeScript."""
+    line = "  const [employees, setEmployees] = useState<Employee[]>([]); // état local\n"
+    return {
+        "file_path": "/repo/app/(dashboards)/rh/employees/page.tsx",
+        "start_line": 0,
+        "end_line": 199,
+        "total_lines": 1200,
+        "content": line * 200,
+    }
+
+
+def run_command_response() -> Dict[str, Any]:
+    """A typical run_command response: a build log."""
+    line = "info  - Compiled /rh/employees in 412 ms (1834 modules)\n"
+    return {
+        "command_id": "cmd_42",
+        "status": "completed",
+        "exit_code": 0,
+        "stdout": line * 2000,
+        "stderr": "",
+    }
+
+
+def agent_response() -> Dict[str, Any]:
+    """A typical agent response: a list of memory search results."""
+    return {
+        "status": "success",
+        "count": 50,
+        "results": [
+            {
+                "key": f"component_{i}",
+                "content": "Employee table with sorting, filtering and pagination. " * 4,
+                "metadata": {"tags": ["rh", "component", "table"], "timestamp": 1760000000.0 + i},
+            }
+            for i in range(50)
+        ],
+    }
+
+
+def tool_call_parameters() -> str:
+    """The parameters of a typical edit_file call, as received on the wire."""
+    return json.dumps({
+        "CodeMarkdownLanguage": "typescript",
+        "TargetFile": "/repo/app/(dashboards)/rh/employees/columns.tsx",
+        "Instruction": "Add a department column",
+        "TargetLintErrorIds": [],
+        "CodeEdit": "{{ ... }}\n  {\n    accessorKey: \"department\",\n    header: \"Département\",\n  },\n{{ ... }}\n" * 20,
+    })
+
+
+def timed(function: Callable[[], Any], repeat: int) -> float:
+    """Return the mean time of one call, in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument("--repeat", type=int, default=2000, help="Number of calls per measurement")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark and print a table of timings."""
+    args = parse_args()
+
+    view_file = view_file_response()
+    run_command = run_command_response()
+    agent = agent_response()
+    parameters = tool_call_parameters()
+
+    cases = {
+        "encode view_file": (
+            lambda: json.dumps(view_file, indent=2),
+            lambda: serialization.dumps(view_file, indent=True),
+        ),
+        "encode run_command": (
+            lambda: json.dumps(run_command, indent=2),
+            lambda: serialization.dumps(run_command, indent=True),
+        ),
+        "encode agent response": (
+            lambda: json.dumps(agent),
+            lambda: serialization.dumps(agent),
+        ),
+        "decode agent response": (
+            (lambda encoded: lambda: json.loads(encoded))(json.dumps(agent)),
+            (lambda encoded: lambda: serialization.loads(encoded))(json.dumps(agent)),
+        ),
+        "decode tool call": (
+            lambda: json.loads(parameters),
+            lambda: serialization.loads(parameters),
+        ),
+    }
+
+    print(f"backend: {serialization.BACKEND}")
+    print(f"{'message':<24}{'stdlib':>12}{serialization.BACKEND:>12}{'speedup':>10}")
+    for name, (before, after) in cases.items():
+        before_us = timed(before, args.repeat)
+        after_us = timed(after, args.repeat)
+        print(f"{name:<24}{before_us:>10.1f}us{after_us:>10.1f}us{before_us / after_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark the latency of short commands, spawned vs. run in shell sessions.
+
+Runs the same small commands one after the other, once with a new shell per
+command as run_command does by default and once in a warm ShellSessionPool,
+and reports the latency of each command.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from ..shell_session import ShellSessionPool, sessions_supported
+
+
+COMMANDS = ["true", "echo hello", "ls", "pwd", "git status --short"]
+
+
+async def spawn(command_line: str, cwd: str):
+    """Run a command in a new shell."""
+    process = await asyncio.create_subprocess_shell(
+        command_line,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd
+    )
+    await process.communicate()
+
+
+async def measure(run: Callable[[str, str], Awaitable[object]], cwd: str, repeat: int) -> List[float]:
+    """Return the latency of each command, in milliseconds."""
+    latencies = []
+    for index in range(repeat):
+        command_line = COMMANDS[index % len(COMMANDS)]
+        start = time.perf_counter()
+        await run(command_line, cwd)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return latencies
+
+
+def report(name: str, latencies: List[float]):
+    """Print the latency distribution of a mode."""
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<10}{statistics.mean(ordered):>10.2f}ms{statistics.median(ordered):>10.2f}ms{p95:>10.2f}ms")
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Shell session benchmark")
+    parser.add_argument("--repeat", type=int, default=200, help="Number of commands run per mode")
+    parser.add_argument("--cwd", default=os.getcwd(), help="Working directory of the commands")
+    return parser.parse_args()
+
+
+async def run_benchmark(args):
+    """Run both modes and print their latencies."""
+    pool = ShellSessionPool()
+    try:
+        # Warm up the session so its startup is not counted
+        await pool.run("true", args.cwd)
+
+        spawned = await measure(spawn, args.cwd, args.repeat)
+        session = await measure(pool.run, args.cwd, args.repeat)
+    finally:
+        await pool.close()
+
+    print(f"{args.repeat} commands ({', '.join(COMMANDS)}) in {args.cwd}")
+    print(f"{'mode':<10}{'mean':>12}{'median':>12}{'p95':>12}")
+    report("spawn", spawned)
+    report("session", session)
+    print(f"sessions started: {pool.stats()['started']}")
+
+
+def main():
+    """Run the benchmark."""
+    if not sessions_supported():
+        print("Shell sessions need a POSIX shell")
+        return
+    asyncio.run(run_benchmark(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Benchmark memory queries, linear substring scan vs. the full-text index.
+
+Generates documents from a vocabulary with a Zipf-like word distribution,
+like notes about a codebase, indexes them with TextIndex and times a few
+kinds of queries against the lowercase substring scan the MemoryBank agent
+used to answer them with.
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from ..text_index import TextIndex
+
+
+def generate_documents(count: int, vocabulary: int, words: int, seed: int) -> Dict[str, str]:
+    """Generate count documents of about the given number of words each."""
+    rng = random.Random(seed)
+    terms = [f"{rng.choice(['get', 'set', 'load', 'parse', 'user', 'auth', 'route'])}{index}" for index in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return {
+        f"memory_{index}": " ".join(rng.choices(terms, weights, k=rng.randint(words // 2, words * 3 // 2)))
+        for index in range(count)
+    }
+
+
+def timed(function: Callable[[], object], repeat: int) -> float:
+    """Time a function, in ms per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1e3 / repeat
+
+
+def linear_scan(documents: Dict[str, str], query: str) -> List[str]:
+    """Match documents the way the agent used to."""
+    query = query.lower()
+    return [key for key, content in documents.items() if query in content.lower()]
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Full-text index benchmark")
+    parser.add_argument("--documents", type=int, default=100000, help="Number of documents indexed")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="Number of distinct words")
+    parser.add_argument("--words", type=int, default=40, help="Average number of words per document")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of times each query is run")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark and print the timings."""
+    args = parse_args()
+    documents = generate_documents(args.documents, args.vocabulary, args.words, seed=1)
+    keys = list(documents)
+
+    index = TextIndex()
+    start = time.perf_counter()
+    index.add_all(documents.items())
+    build_seconds = time.perf_counter() - start
+    print(f"{args.documents} documents indexed in {build_seconds:.1f}s")
+
+    sample = documents[keys[len(keys) // 2]].split()
+    by_frequency = sorted(set(sample), key=lambda word: index._document_counts[index._term_ids[word]])
+    rare, common = by_frequency[0], by_frequency[-1]
+    queries = {
+        "rare word": rare,
+        "common word": common,
+        "three words": f"{rare} {by_frequency[len(by_frequency) // 2]} {common}",
+        "phrase": f'"{sample[0]} {sample[1]}"',
+        "prefix": f"{common[:-1]}*"
+    }
+
+    print(f"{'query':<14}{'':<24}{'linear scan':>14}{'index':>12}")
+    for name, query in queries.items():
+        scan_ms = timed(lambda: linear_scan(documents, query.strip('"*')), max(1, args.repeat // 10))
+        index_ms = timed(lambda: index.search(query, args.top_k), args.repeat)
+        print(f"{name:<14}{query:<24}{scan_ms:>12.2f}ms{index_ms:>10.2f}ms")
+
+    start = time.perf_counter()
+    for key in keys[:1000]:
+        index.add(key, documents[key] + " updated")
+    print(f"update: {(time.perf_counter() - start) * 1e3 / 1000:.3f}ms per document")
+
+
+if __name__ == "__main__":
+    main()
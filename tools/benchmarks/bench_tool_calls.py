@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark the incremental tool call parser against the original regex.
+"""
+import argparse
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List
+
+from ..tool_call_parser import ToolCallParser, iter_tool_calls
+
+
+def regex_extract_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """The regex-based extract_tool_calls this parser replaced."""
+    pattern = r'<([a-zA-Z_][a-zA-Z0-9_]*)>\s*(.*?)\s*</\1>'
+    tool_calls = []
+    for match in re.finditer(pattern, text, re.DOTALL):
+        try:
+            tool_calls.append({"name": match.group(1), "parameters": json.loads(match.group(2))})
+        except json.JSONDecodeError:
+            continue
+    return tool_calls
+
+
+def parser_extract_tool_calls(text: str) -> List[Dict[str, Any]]:
+    """Extract tool calls with the incremental parser in one go."""
+    return list(iter_tool_calls(text))
+
+
+def chunked_extract_tool_calls(text: str, chunk_size: int = 4096) -> List[Dict[str, Any]]:
+    """Extract tool calls with the incremental parser, fed in chunks."""
+    parser = ToolCallParser()
+    tool_calls = []
+    for start in range(0, len(text), chunk_size):
+        tool_calls.extend(parser.feed(text[start:start + chunk_size]))
+    tool_calls.extend(parser.close())
+    return tool_calls
+
+
+def many_calls(size: int) -> str:
+    """A message made of many small view_file calls."""
+    call = '<view_file>{"AbsolutePath": "/repo/app/page.tsx", "StartLine": 0, "EndLine": 200, "IncludeSummaryOfOtherLines": false}</view_file>\n'
+    return call * (size // len(call))
+
+
+def large_payload(size: int) -> str:
+    """A message made of a few write_to_file calls with large contents."""
+    content = "export default function Page() { return <div>Hello</div>; }\n" * (size // 240)
+    call = "<write_to_file>" + json.dumps({"TargetFile": "/repo/app/page.tsx", "CodeContent": content, "EmptyFile": False}) + "</write_to_file>\n"
+    return call * 4
+
+
+def unbalanced_tags(size: int, tags: int) -> str:
+    """A message with prose, unclosed tags, and a single call at the end."""
+    filler = "Some prose describing the change in detail. " * (size // (45 * tags) + 1)
+    parts = [f"<step_{i}> {filler}" for i in range(tags)]
+    parts.append('<view_file>{"AbsolutePath": "/repo/README.md", "StartLine": 0, "EndLine": 10, "IncludeSummaryOfOtherLines": false}</view_file>')
+    return "".join(parts)
+
+
+def timed(function: Callable[[str], List[Dict[str, Any]]], text: str, repeat: int) -> float:
+    """Return the best time of several runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Tool call parser benchmark")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Size of the generated messages in MB")
+    parser.add_argument("--unclosed-tags", type=int, default=50, help="Number of unclosed tags in the unbalanced message")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per measurement")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark and print a table of timings."""
+    args = parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+
+    cases = {
+        "many calls": many_calls(size),
+        "large payloads": large_payload(size),
+        "unbalanced tags": unbalanced_tags(size, args.unclosed_tags),
+    }
+    extractors = {
+        "regex": regex_extract_tool_calls,
+        "parser": parser_extract_tool_calls,
+        "parser (4 KB chunks)": chunked_extract_tool_calls,
+    }
+
+    print(f"{'case':<18}{'size':>10}  " + "".join(f"{name:>22}" for name in extractors))
+    for case, text in cases.items():
+        timings = [timed(function, text, args.repeat) for function in extractors.values()]
+        print(
+            f"{case:<18}{len(text) / 1024 / 1024:>8.1f}MB  "
+            + "".join(f"{timing * 1000:>20.1f}ms" for timing in timings)
+        )
+
+
+if __name__ == "__main__":
+    main()
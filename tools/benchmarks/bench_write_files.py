@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark creating many files with write_to_file.
+
+Creates a scaffold of files spread over a few directories, once with one
+write_to_file call per file and once with a single call in bulk mode, each in
+a fresh temporary directory.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from ..file_io import configure_file_io
+from ..journal import configure_journal
+from ..write_to_file import WriteToFileTool
+
+
+def generate_files(root: str, count: int, directories: int) -> List[Dict[str, str]]:
+    """Generate the TargetFile and CodeContent of a scaffold of components."""
+    files = []
+    for index in range(count):
+        name = f"Component{index}"
+        files.append({
+            "TargetFile": os.path.join(root, "components", f"group_{index % directories}", f"{name}.tsx"),
+            "CodeContent": (
+                f"export default function {name}() {{\n"
+                f"  return <div className=\"{name.lower()}\">{name}</div>;\n"
+                "}\n"
+            ) * 10
+        })
+    return files
+
+
+async def create_one_by_one(tool: WriteToFileTool, files: List[Dict[str, str]]):
+    """Create each file with its own call."""
+    for file in files:
+        await tool.execute({"TargetFile": file["TargetFile"], "CodeContent": file["CodeContent"], "EmptyFile": False})
+
+
+async def create_in_bulk(tool: WriteToFileTool, files: List[Dict[str, str]]):
+    """Create all files with a single call."""
+    result = await tool.execute({"Files": files})
+    assert "error" not in result, result
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Bulk file creation benchmark")
+    parser.add_argument("--files", type=int, default=200, help="Number of files to create")
+    parser.add_argument("--directories", type=int, default=10, help="Number of directories the files are spread over")
+    parser.add_argument("--fsync-writes", action="store_true", help="Flush each file to disk before renaming it")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark and print the timings."""
+    args = parse_args()
+    configure_file_io(8, fsync_writes=args.fsync_writes)
+    tool = WriteToFileTool()
+
+    print(f"{args.files} files in {args.directories} directories, fsync: {args.fsync_writes}")
+    print(f"{'mode':<16}{'time':>12}")
+    for mode, create in (("one by one", create_one_by_one), ("bulk", create_in_bulk)):
+        with tempfile.TemporaryDirectory() as root:
+            configure_journal(os.path.join(root, ".mcp_journal"))
+            files = generate_files(os.path.join(root, "app"), args.files, args.directories)
+            start = time.perf_counter()
+            asyncio.run(create(tool, files))
+            elapsed = (time.perf_counter() - start) * 1e3
+        print(f"{mode:<16}{elapsed:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
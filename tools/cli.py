@@ -4,12 +4,22 @@ Command-line interface for the MCP server.
 """
 import argparse
 import asyncio
-import json
 import logging
 import sys
 from typing import Dict, Any
 
+from . import serialization
+from .command_cache import DEFAULT_COMMAND_CACHE_BYTES, configure_command_cache
+from .command_manager import DEFAULT_COMMAND_TIMEOUT, DEFAULT_RETENTION, configure_commands
+from .command_scheduler import (
+    DEFAULT_MAX_COMMANDS_PER_CLIENT, DEFAULT_MAX_CONCURRENT_COMMANDS, configure_command_scheduler
+)
+from .dispatch import DEFAULT_MAX_CONCURRENT_REQUESTS
+from .file_io import DEFAULT_FILE_IO_WORKERS, DEFAULT_FSYNC_WRITES, configure_file_io
+from .journal import DEFAULT_JOURNAL_DIR, DEFAULT_JOURNAL_MAX_BYTES, configure_journal
 from .mcp_server import MCPServer
+from .output_buffer import DEFAULT_BUFFER_BYTES, DEFAULT_OUTPUT_CAP, DEFAULT_SPILL_BYTES
+from .shell_session import DEFAULT_SESSION_TIMEOUT, DEFAULT_SHELL_SESSIONS, configure_shell_sessions
 
 
 def parse_args():
@@ -17,6 +27,66 @@ def parse_args():
     parser = argparse.ArgumentParser(description="MCP Server")
     parser.add_argument("--host", default="localhost", help="Host to bind to")
     parser.add_argument("--port", type=int, default=8765, help="Port to bind to")
+    parser.add_argument(
+        "--max-concurrent-requests", type=int, default=DEFAULT_MAX_CONCURRENT_REQUESTS,
+        help="Maximum number of request-ID-tagged frames processed concurrently per connection"
+    )
+    parser.add_argument(
+        "--file-io-workers", type=int, default=DEFAULT_FILE_IO_WORKERS,
+        help="Number of threads doing file I/O for the tools"
+    )
+    parser.add_argument(
+        "--fsync-writes", action="store_true", default=DEFAULT_FSYNC_WRITES,
+        help="Flush written files to disk before renaming them into place"
+    )
+    parser.add_argument(
+        "--journal-dir", default=DEFAULT_JOURNAL_DIR,
+        help="Directory of the undo journal of file edits"
+    )
+    parser.add_argument(
+        "--journal-max-mb", type=int, default=DEFAULT_JOURNAL_MAX_BYTES // (1024 * 1024),
+        help="Size of the undo journal above which the oldest edits are dropped"
+    )
+    parser.add_argument(
+        "--command-buffer-kb", type=int, default=DEFAULT_BUFFER_BYTES // 1024,
+        help="Output of each background command kept in memory, per stream"
+    )
+    parser.add_argument(
+        "--command-spill-mb", type=int, default=DEFAULT_SPILL_BYTES // (1024 * 1024),
+        help="Output of each background command spilled to disk once memory is full, per stream"
+    )
+    parser.add_argument(
+        "--command-retention", type=int, default=DEFAULT_RETENTION,
+        help="Completed background commands kept for status and output queries"
+    )
+    parser.add_argument(
+        "--command-timeout", type=float, default=DEFAULT_COMMAND_TIMEOUT,
+        help="Seconds a blocking command may run before it is killed, unless the call sets TimeoutMs"
+    )
+    parser.add_argument(
+        "--command-output-kb", type=int, default=DEFAULT_OUTPUT_CAP // 1024,
+        help="Output of each stream of a blocking command returned; the middle of longer output is elided"
+    )
+    parser.add_argument(
+        "--shell-sessions", action="store_true", default=DEFAULT_SHELL_SESSIONS,
+        help="Run blocking commands in a pool of persistent shells instead of a new shell each"
+    )
+    parser.add_argument(
+        "--session-timeout", type=float, default=DEFAULT_SESSION_TIMEOUT,
+        help="Seconds a command may run in a shell session before the session is evicted"
+    )
+    parser.add_argument(
+        "--max-concurrent-commands", type=int, default=DEFAULT_MAX_CONCURRENT_COMMANDS,
+        help="Commands run at once across all clients; further commands are queued"
+    )
+    parser.add_argument(
+        "--max-commands-per-client", type=int, default=DEFAULT_MAX_COMMANDS_PER_CLIENT,
+        help="Commands run at once by a single client connection"
+    )
+    parser.add_argument(
+        "--command-cache-mb", type=int, default=DEFAULT_COMMAND_CACHE_BYTES // (1024 * 1024),
+        help="Output of cached command results kept in memory; 0 disables the cache"
+    )
     parser.add_argument("--list-tools", action="store_true", help="List available tools and exit")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     return parser.parse_args()
@@ -33,13 +103,39 @@ async def main():
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
     
+    # Size the thread pool used for file I/O
+    configure_file_io(args.file_io_workers, fsync_writes=args.fsync_writes)
+    
+    # Set where edits are journaled for undo
+    configure_journal(args.journal_dir, args.journal_max_mb * 1024 * 1024)
+    
+    # Set how much output of background commands is kept, and for how many,
+    # and how long blocking commands may run and how much output they return
+    configure_commands(
+        args.command_buffer_kb * 1024, args.command_spill_mb * 1024 * 1024, args.command_retention,
+        args.command_timeout, args.command_output_kb * 1024
+    )
+    
+    # Run blocking commands in persistent shells if asked to
+    configure_shell_sessions(args.shell_sessions, timeout=args.session_timeout)
+    
+    # Limit how many commands run at once
+    configure_command_scheduler(args.max_concurrent_commands, args.max_commands_per_client)
+    
+    # Size the cache of command results
+    configure_command_cache(args.command_cache_mb * 1024 * 1024)
+    
     # Create the MCP server
-    server = MCPServer(host=args.host, port=args.port)
+    server = MCPServer(
+        host=args.host,
+        port=args.port,
+        max_concurrent_requests=args.max_concurrent_requests
+    )
     
     # List tools if requested
     if args.list_tools:
         tool_definitions = server.get_tool_definitions()
-        print(json.dumps(tool_definitions, indent=2))
+        print(serialization.dumps(tool_definitions, indent=True))
         return
     
     # Start the server
@@ -6,6 +6,8 @@ from typing import Dict, Any, List, Optional
 
 from .agent_base import Agent
 from .base_tool import BaseTool
+from .file_transaction import FileTransaction, TransactionError, describe_changes
+from .journal import record_changes
 
 
 class CoderAgent(Agent):
@@ -108,11 +110,19 @@ class CoderAgent(Agent):
         }
     
     async def _implement_code(self, message: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
-        """Implement code changes based on a plan."""
+        """
+        Implement code changes based on a plan.
+        
+        A step either names a single file_path, or lists all of its changes in
+        "changes": [{"file_path": ..., "code_edit": ...} for edits of existing
+        files, or {"file_path": ..., "content": ...} for new files]. Listed
+        changes are applied as one transaction.
+        """
         plan = message.get("plan", {})
         step_id = message.get("step_id", None)
         file_path = message.get("file_path", "")
         code_changes = message.get("code_changes", "")
+        changes = message.get("changes", [])
         
         if not plan:
             return {"status": "error", "message": "Missing plan"}
@@ -120,6 +130,9 @@ class CoderAgent(Agent):
         if step_id is None:
             return {"status": "error", "message": "Missing step_id"}
         
+        if changes:
+            return await self._apply_changes(step_id, changes)
+        
         if not file_path:
             return {"status": "error", "message": "Missing file_path"}
         
@@ -133,6 +146,47 @@ class CoderAgent(Agent):
             "changes_made": True
         }
     
+    async def _apply_changes(self, step_id: Any, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply the changes of a step to all of its files at once."""
+        transaction = FileTransaction()
+        
+        for change in changes:
+            file_path = change.get("file_path", "")
+            if not file_path:
+                return {"status": "error", "message": "Missing file_path in changes"}
+            
+            if "code_edit" in change:
+                transaction.edit(file_path, change["code_edit"])
+            elif "content" in change:
+                transaction.create(file_path, change["content"])
+            else:
+                return {"status": "error", "message": f"Missing code_edit or content for {file_path}"}
+        
+        # Journal the changes before the files are unlocked
+        edit_ids = []
+        
+        async def journal(changes):
+            edit_ids.append(await record_changes("coder", changes))
+        
+        try:
+            committed = await transaction.commit(journal)
+        except TransactionError as e:
+            return {
+                "status": "error",
+                "message": f"No changes made for step {step_id}: {str(e)}",
+                "errors": e.errors
+            }
+        
+        edit_id = edit_ids[0]
+        
+        return {
+            "status": "success",
+            "message": f"Implemented changes for step {step_id} in {len(committed)} files",
+            "edit_id": edit_id,
+            "files": describe_changes(committed),
+            "changes_made": True
+        }
+    
     async def _review_code(self, message: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
         """Review code changes."""
         file_path = message.get("file_path", "")
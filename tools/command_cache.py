@@ -0,0 +1,274 @@
+"""
+Result cache for idempotent commands run by run_command.
+
+Agents run the same lint, type-check and test commands again and again while
+nothing they depend on has changed. A command that declares its inputs, as
+glob patterns, can have its result cached: the key is a hash of the command
+line, the working directory, the environment variables it names and the
+contents of every file its patterns match, so a hit returns the exit code and
+output of an identical earlier run without running anything.
+
+Hashing a large source tree on every call would cost most of what the cache
+saves, so the digest of each file is remembered together with its
+modification time, size and inode, and a file is only read again once one of
+them changes. The cache keeps the most recently used results up to a total
+size, and counts hits, misses and evictions.
+"""
+import glob
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from stat import S_ISREG
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Bytes of results kept in the cache, overridable with MCP_COMMAND_CACHE_MB;
+# 0 disables the cache
+DEFAULT_COMMAND_CACHE_BYTES = int(os.environ.get("MCP_COMMAND_CACHE_MB", "64")) * 1024 * 1024
+
+# Files the input patterns of a command may match; a command matching more is
+# not cached
+MAX_INPUT_FILES = 50000
+
+# File digests remembered between calls
+DEFAULT_MAX_DIGESTS = 100000
+
+# A file modified this recently may be modified again within the resolution
+# of its modification time without it changing, so its digest is not
+# remembered
+RACY_SECONDS = 2.0
+
+# Bytes read from an input file at a time when hashing it
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class CachedResult(NamedTuple):
+    """The result of a command run, as stored in the cache."""
+    exit_code: int
+    stdout: str
+    stderr: str
+    run_seconds: float
+    created_at: float
+    truncated: bool = False
+
+    @property
+    def size(self) -> int:
+        """Characters of output the result holds, counted as bytes against the cache size."""
+        return len(self.stdout) + len(self.stderr)
+
+
+class CommandCache:
+    """LRU cache of command results, keyed by command and input contents."""
+
+    def __init__(self, max_bytes: int = DEFAULT_COMMAND_CACHE_BYTES, max_digests: int = DEFAULT_MAX_DIGESTS):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Bytes of output kept in the cache
+            max_digests: File digests remembered between calls
+        """
+        self.max_bytes = max_bytes
+        self.max_digests = max_digests
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._digests: "OrderedDict[str, Tuple[int, int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        command_line: str,
+        cwd: str,
+        input_patterns: Iterable[str],
+        env_names: Iterable[str] = ()
+    ) -> Optional[str]:
+        """
+        Compute the cache key of a command.
+
+        This does blocking I/O and should be run off the event loop.
+
+        Args:
+            command_line: The command line
+            cwd: The working directory of the command
+            input_patterns: Glob patterns of the files the command reads,
+                relative to cwd; ** matches any number of directories
+            env_names: Names of the environment variables the command depends on
+
+        Returns:
+            The key, or None if the patterns match too many files to cache
+        """
+        cwd = os.path.abspath(cwd)
+        patterns = sorted(set(input_patterns))
+        paths = _expand(cwd, patterns)
+        if paths is None:
+            logger.warning(f"Inputs of {command_line!r} match more than {MAX_INPUT_FILES} files; not caching")
+            return None
+
+        key = hashlib.sha256()
+        for part in (command_line, cwd, *patterns):
+            key.update(part.encode("utf-8", errors="surrogatepass") + b"\0")
+        for name in sorted(set(env_names)):
+            value = os.environ.get(name)
+            entry = f"{name}={value}\0" if value is not None else f"{name}\1\0"
+            key.update(entry.encode("utf-8", errors="surrogatepass"))
+        prefix = os.path.join(cwd, "")
+        for path, stat in paths:
+            name = path[len(prefix):] if path.startswith(prefix) else path
+            key.update(name.encode("utf-8", errors="surrogatepass") + b"\0")
+            key.update(self._digest(path, stat).encode("ascii") + b"\0")
+        return key.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """
+        Look up the result of a command.
+
+        Args:
+            key: The cache key of the command
+
+        Returns:
+            The stored result, or None on a miss
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: CachedResult):
+        """
+        Store the result of a command, evicting the least recently used ones.
+
+        A result larger than the whole cache is not stored.
+
+        Args:
+            key: The cache key of the command
+            result: The result of running it
+        """
+        if result.size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._results[key] = result
+            self._bytes += result.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every stored result and remembered digest."""
+        with self._lock:
+            self._results.clear()
+            self._digests.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get counters describing the cache.
+
+        Returns:
+            The number and size of the stored results, and the number of hits,
+            misses and evictions
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+    def _digest(self, path: str, stat: os.stat_result) -> str:
+        """Get the content hash of a file, reusing it while the file is unchanged."""
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        with self._lock:
+            known = self._digests.get(path)
+            if known is not None and known[:3] == version:
+                self._digests.move_to_end(path)
+                return known[3]
+
+        digest = hashlib.sha1()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+        except OSError:
+            return "unreadable"
+        value = digest.hexdigest()
+
+        if time.time() - stat.st_mtime_ns / 1e9 > RACY_SECONDS:
+            with self._lock:
+                self._digests[path] = (*version, value)
+                self._digests.move_to_end(path)
+                while len(self._digests) > self.max_digests:
+                    self._digests.popitem(last=False)
+        return value
+
+
+def _expand(cwd: str, patterns: List[str]) -> Optional[List[Tuple[str, os.stat_result]]]:
+    """List the files matched by glob patterns with their stats, or None if there are too many."""
+    paths: Dict[str, os.stat_result] = {}
+    for pattern in patterns:
+        for path in glob.iglob(os.path.join(cwd, pattern), recursive=True):
+            path = os.path.normpath(path)
+            if path in paths:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if S_ISREG(stat.st_mode):
+                paths[path] = stat
+                if len(paths) > MAX_INPUT_FILES:
+                    return None
+    return sorted(paths.items())
+
+
+_cache: Optional[CommandCache] = None
+_cache_bytes = DEFAULT_COMMAND_CACHE_BYTES
+
+
+def get_command_cache() -> Optional[CommandCache]:
+    """
+    Get the command cache shared by all tools.
+
+    Returns:
+        The cache, or None if it is disabled
+    """
+    global _cache
+    if _cache_bytes <= 0:
+        return None
+    if _cache is None:
+        _cache = CommandCache(_cache_bytes)
+    return _cache
+
+
+def configure_command_cache(max_bytes: int):
+    """
+    Set the size of the command cache.
+
+    Args:
+        max_bytes: Bytes of output kept in the cache; 0 disables it
+    """
+    global _cache, _cache_bytes
+    _cache_bytes = max_bytes
+    _cache = None
@@ -0,0 +1,634 @@
+"""
+Registry of the commands started by run_command.
+
+Every non-blocking command gets a RunningCommand that drains its stdout and
+stderr as soon as they are written, so the process never stalls on a full
+pipe, into bounded OutputBuffers that other tools can read from by offset or
+follow as the output comes in. A command waits in the queue of the
+CommandScheduler until it gets a slot; it is registered, and can be queried
+or cancelled, from the moment it is submitted. A command may give its slot
+back a while after it starts, so that dev servers and watchers, which run
+until they are killed, do not hold up the commands queued after them.
+
+Commands run in their own process group, so killing a command also kills the
+processes it started, and their resource usage is sampled for the whole
+group while they run; once they finish, it is added to the usage ledger.
+Completed commands are kept for a while so their status and output can
+still be queried; past the retention limit, the oldest are reaped and their
+buffers freed.
+"""
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .command_scheduler import INTERACTIVE, Ticket, get_command_scheduler
+from .output_buffer import DEFAULT_BUFFER_BYTES, DEFAULT_OUTPUT_CAP, DEFAULT_SPILL_BYTES, OutputBuffer
+from .resource_usage import AccountedProcess, ResourceUsage, get_usage_ledger
+
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a pipe at a time
+DRAIN_CHUNK_BYTES = 64 * 1024
+
+# Bytes of each stream returned by a read by default
+DEFAULT_READ_BYTES = 64 * 1024
+
+# Completed commands kept for status and output queries, overridable with
+# MCP_COMMAND_RETENTION; older ones are reaped
+DEFAULT_RETENTION = int(os.environ.get("MCP_COMMAND_RETENTION", "50"))
+
+# Seconds a blocking command may run before it is killed, overridable with
+# MCP_COMMAND_TIMEOUT
+DEFAULT_COMMAND_TIMEOUT = float(os.environ.get("MCP_COMMAND_TIMEOUT", "600"))
+
+# Seconds a killed command gets to exit before it is killed forcibly
+KILL_GRACE_SECONDS = 3.0
+
+# Seconds to keep draining the pipes after the process exits, for output
+# still in flight; a background child holding a pipe open does not keep the
+# command running past this
+DRAIN_GRACE_SECONDS = 1.0
+
+
+class RunningCommand:
+    """A command started in the background, with its buffered output."""
+
+    def __init__(
+        self,
+        command_id: str,
+        command_line: str,
+        cwd: str,
+        ticket: Optional[Ticket] = None,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+        spill_bytes: int = DEFAULT_SPILL_BYTES,
+        on_done: Optional[Callable[["RunningCommand"], None]] = None,
+        workflow_id: Optional[str] = None
+    ):
+        """
+        Initialize a command waiting for its process; see attach.
+
+        Args:
+            command_id: The ID of the command
+            command_line: The command line to run
+            cwd: The working directory of the command
+            ticket: The scheduler ticket of the command
+            buffer_bytes: Bytes of each stream kept in memory
+            spill_bytes: Bytes of each stream spilled to disk
+            on_done: Called with the command once it has finished
+            workflow_id: The workflow the command runs for
+        """
+        self.command_id = command_id
+        self.command_line = command_line
+        self.cwd = cwd
+        self.ticket = ticket
+        self.workflow_id = workflow_id
+        self.process: Optional[AccountedProcess] = None
+        self.stdout = OutputBuffer(buffer_bytes, spill_bytes)
+        self.stderr = OutputBuffer(buffer_bytes, spill_bytes)
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.killed_with: Optional[str] = None
+        self.cancelled = False
+        self.error: Optional[str] = None
+
+        self._drainers: List[asyncio.Task] = []
+        self._attached = asyncio.Event()
+        self._done = asyncio.Event()
+        self._on_done = on_done
+        self._waiter: Optional[asyncio.Task] = None
+
+    def attach(self, process: AccountedProcess):
+        """
+        Start draining the output of the process running the command.
+
+        Args:
+            process: The process, with its stdout and stderr piped
+        """
+        self.process = process
+        self.started_at = time.time()
+        self._drainers = [
+            asyncio.create_task(self._drain(process.stdout, self.stdout)),
+            asyncio.create_task(self._drain(process.stderr, self.stderr))
+        ]
+        self._waiter = asyncio.create_task(self._wait())
+        self._attached.set()
+
+    def abort(self, error: Optional[str] = None):
+        """
+        Finish a command that never got a process.
+
+        Args:
+            error: Why the command could not be started, or None if it was cancelled
+        """
+        if self.done:
+            return
+        self.error = error
+        self.cancelled = error is None
+        self.stdout.close()
+        self.stderr.close()
+        self._attached.set()
+        self._finish()
+
+    @property
+    def done(self) -> bool:
+        """Whether the process has exited and its output has been drained."""
+        return self._done.is_set()
+
+    @property
+    def status(self) -> str:
+        """queued, running, completed, killed, cancelled or failed."""
+        if not self.done:
+            return "running" if self._attached.is_set() else "queued"
+        if self.cancelled:
+            return "cancelled"
+        if self.error is not None:
+            return "failed"
+        return "completed" if self.killed_with is None else "killed"
+
+    @property
+    def queue_position(self) -> Optional[int]:
+        """Place of the command in the scheduler queue, while it is queued."""
+        if self.ticket is None or self.done:
+            return None
+        return get_command_scheduler().position(self.ticket)
+
+    @property
+    def queue_wait(self) -> float:
+        """Seconds the command waited for a slot, up to now if it is still queued."""
+        return (self.started_at or self.finished_at or time.time()) - self.queued_at
+
+    @property
+    def duration(self) -> float:
+        """Seconds the command has run for, up to now if it is still running."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def resources(self) -> Optional[ResourceUsage]:
+        """Resources used by the command, final once it is done and sampled live until then."""
+        if self.process is None:
+            return None
+        # /proc is in memory, so sampling it does not block the loop for long
+        return self.process.sample()
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        """The exit code of the process, once it has exited."""
+        return self.process.returncode if self.done and self.process is not None else None
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the command to finish.
+
+        Args:
+            timeout: Longest time to wait, in seconds
+
+        Returns:
+            True if the command has finished
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self._done.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.done
+
+    async def wait_for_output(self, stdout_offset: int, stderr_offset: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until there is output past the given offsets, or the command finishes.
+
+        Args:
+            stdout_offset: The offset read up to in stdout
+            stderr_offset: The offset read up to in stderr
+            timeout: Longest time to wait, in seconds
+
+        Returns:
+            True if there is new output or the command has finished
+        """
+        if self.done or self.stdout.size > stdout_offset or self.stderr.size > stderr_offset:
+            return True
+
+        waiters = [
+            asyncio.create_task(self.stdout.wait(stdout_offset)),
+            asyncio.create_task(self.stderr.wait(stderr_offset)),
+            asyncio.create_task(self._done.wait())
+        ]
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return bool(done)
+
+    async def read(self, stdout_offset: int = 0, stderr_offset: int = 0, max_bytes: int = DEFAULT_READ_BYTES) -> Dict[str, Any]:
+        """
+        Read the output of the command past the given offsets.
+
+        Args:
+            stdout_offset: The offset to read stdout from
+            stderr_offset: The offset to read stderr from
+            max_bytes: Largest number of bytes to read from each stream
+
+        Returns:
+            The status of the command, the text read from each stream, and
+            the offsets to read from next
+        """
+        stdout = await self.stdout.read(stdout_offset, max_bytes)
+        stderr = await self.stderr.read(stderr_offset, max_bytes)
+
+        result: Dict[str, Any] = {
+            "command_id": self.command_id,
+            "status": self.status,
+            "stdout": stdout.data.decode("utf-8", errors="replace"),
+            "stderr": stderr.data.decode("utf-8", errors="replace"),
+            "stdout_offset": stdout.next_offset,
+            "stderr_offset": stderr.next_offset,
+            "more_output": stdout.next_offset < self.stdout.size or stderr.next_offset < self.stderr.size
+        }
+        if self.status == "queued":
+            result["queue_position"] = self.queue_position
+        if self.done:
+            result["exit_code"] = self.exit_code
+            result["queue_wait_seconds"] = round(self.queue_wait, 3)
+            result["run_seconds"] = round(self.duration, 3)
+            if self.process is not None:
+                result["resources"] = self.resources.to_dict()
+        if self.error is not None:
+            result["error"] = self.error
+        if stdout.dropped or stderr.dropped:
+            result["dropped_bytes"] = {"stdout": stdout.dropped, "stderr": stderr.dropped}
+        if stdout.expired or stderr.expired:
+            result["output_expired"] = True
+            result["message"] = "The command was reaped and its output freed; the bytes not read are in dropped_bytes"
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the command.
+
+        Returns:
+            The ID, command line, status, exit code, times and output sizes of the command
+        """
+        result = {
+            "command_id": self.command_id,
+            "command_line": self.command_line,
+            "cwd": self.cwd,
+            "pid": self.process.pid if self.process is not None else None,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "killed_with": self.killed_with,
+            "priority": self.ticket.priority if self.ticket is not None else None,
+            "workflow_id": self.workflow_id,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_wait_seconds": round(self.queue_wait, 3),
+            "run_seconds": round(self.duration, 3),
+            "stdout_bytes": self.stdout.size,
+            "stderr_bytes": self.stderr.size
+        }
+        if self.process is not None:
+            result["resources"] = self.resources.to_dict()
+        if self.status == "queued":
+            result["queue_position"] = self.queue_position
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+    async def kill(self, force: bool = False, grace: float = KILL_GRACE_SECONDS) -> bool:
+        """
+        Kill the command and every process in its process group.
+
+        The processes are sent SIGTERM, then SIGKILL if they have not exited
+        within the grace period; with force, they are sent SIGKILL at once.
+        A command still queued is cancelled instead, and never started.
+
+        Args:
+            force: Whether to skip SIGTERM
+            grace: Seconds to wait for the processes to exit after SIGTERM
+
+        Returns:
+            True if the command was queued or running, and has been cancelled or killed
+        """
+        if self.done:
+            return False
+
+        if self.status == "queued" and not (self.ticket is not None and self.ticket.granted):
+            self.abort()
+            return True
+
+        # A command granted a slot but still being spawned is killed once it has a process
+        await self._attached.wait()
+        if self.done:
+            return False
+
+        if not force:
+            self._signal(signal.SIGTERM)
+            self.killed_with = "SIGTERM"
+            if await self.wait(grace):
+                return True
+
+        self._signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+        self.killed_with = "SIGKILL"
+        await self.wait(grace)
+        return True
+
+    def release(self):
+        """Free the output buffers of a completed command."""
+        self.stdout.release()
+        self.stderr.release()
+
+    def _signal(self, signum: int):
+        """Send a signal to the process group of the command."""
+        signal_process_group(self.process, signum)
+
+    async def _drain(self, stream: Optional[asyncio.StreamReader], buffer: OutputBuffer):
+        """Copy a pipe into its buffer until it is closed."""
+        try:
+            while stream is not None:
+                chunk = await stream.read(DRAIN_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await buffer.write(chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to read output of {self.command_id}: {str(e)}")
+        finally:
+            buffer.close()
+
+    async def _wait(self):
+        """Wait for the process to exit and its pipes to be drained."""
+        try:
+            await self.process.wait()
+            _, pending = await asyncio.wait(self._drainers, timeout=DRAIN_GRACE_SECONDS)
+            for drainer in pending:
+                drainer.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self._finish()
+
+    def _finish(self):
+        """Mark the command as finished."""
+        self.finished_at = time.time()
+        self._done.set()
+        if self._on_done is not None:
+            self._on_done(self)
+
+
+class CommandManager:
+    """The commands started in the background, by ID."""
+
+    def __init__(
+        self,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+        spill_bytes: int = DEFAULT_SPILL_BYTES,
+        retention: int = DEFAULT_RETENTION,
+        timeout: float = DEFAULT_COMMAND_TIMEOUT,
+        output_cap: int = DEFAULT_OUTPUT_CAP
+    ):
+        """
+        Initialize an empty registry.
+
+        Args:
+            buffer_bytes: Bytes of each stream of a command kept in memory
+            spill_bytes: Bytes of each stream of a command spilled to disk
+            retention: Completed commands kept before the oldest are reaped
+            timeout: Seconds a blocking command may run by default
+            output_cap: Bytes of each stream of a blocking command returned by default
+        """
+        self.buffer_bytes = buffer_bytes
+        self.spill_bytes = spill_bytes
+        self.retention = retention
+        self.timeout = timeout
+        self.output_cap = output_cap
+        self.reaped = 0
+        self._commands: Dict[str, RunningCommand] = {}
+        self._counter = 0
+        self._starters: Set[asyncio.Task] = set()
+
+    def next_id(self) -> str:
+        """
+        Allocate a command ID.
+
+        Returns:
+            A new, unique command ID
+        """
+        self._counter += 1
+        return f"cmd_{self._counter}"
+
+    async def start(
+        self,
+        command_line: str,
+        cwd: str,
+        command_id: Optional[str] = None,
+        client: Optional[str] = None,
+        priority: str = INTERACTIVE,
+        workflow_id: Optional[str] = None,
+        slot_seconds: Optional[float] = None
+    ) -> RunningCommand:
+        """
+        Start a command in the background, once the scheduler gives it a slot.
+
+        If a slot is free, the command is started before this returns, and
+        a failure to start it is raised; otherwise it is returned queued, and
+        started later.
+
+        Args:
+            command_line: The command line to run in the shell
+            cwd: The working directory of the command
+            command_id: The ID to give the command; a new one by default
+            client: The client the command runs for
+            priority: The priority class of the command
+            workflow_id: The workflow the command runs for
+            slot_seconds: Seconds the command holds its slot once started;
+                until it finishes if None
+
+        Returns:
+            The running or queued command
+        """
+        scheduler = get_command_scheduler()
+        ticket = scheduler.submit(client, priority)
+        command = RunningCommand(
+            command_id or self.next_id(), command_line, cwd, ticket,
+            self.buffer_bytes, self.spill_bytes, self._finished, workflow_id
+        )
+
+        if ticket.granted:
+            try:
+                command.attach(await spawn_command(command_line, cwd))
+            except BaseException:
+                scheduler.release(ticket)
+                raise
+            _release_after(ticket, slot_seconds)
+        else:
+            starter = asyncio.create_task(self._start_queued(command, slot_seconds))
+            self._starters.add(starter)
+            starter.add_done_callback(self._starters.discard)
+
+        self._commands[command.command_id] = command
+        return command
+
+    def get(self, command_id: str) -> Optional[RunningCommand]:
+        """
+        Get a command by ID.
+
+        Args:
+            command_id: The ID of the command
+
+        Returns:
+            The command, or None if there is no such command
+        """
+        return self._commands.get(command_id)
+
+    def commands(self) -> List[RunningCommand]:
+        """
+        List the commands, oldest first.
+
+        Returns:
+            Every running command and every completed command not reaped yet
+        """
+        return list(self._commands.values())
+
+    def reap(self) -> int:
+        """
+        Forget the oldest completed commands beyond the retention limit.
+
+        Returns:
+            The number of commands reaped
+        """
+        completed = [command for command in self._commands.values() if command.done]
+        excess = completed[:max(0, len(completed) - self.retention)]
+        for command in excess:
+            del self._commands[command.command_id]
+            command.release()
+        self.reaped += len(excess)
+        return len(excess)
+
+    async def _start_queued(self, command: RunningCommand, slot_seconds: Optional[float]):
+        """Start a queued command once it gets a slot."""
+        try:
+            await get_command_scheduler().wait(command.ticket)
+        except asyncio.CancelledError:
+            # The command was cancelled while queued
+            command.abort()
+            return
+
+        try:
+            command.attach(await spawn_command(command.command_line, command.cwd))
+        except Exception as e:
+            command.abort(f"Failed to start command: {str(e)}")
+            return
+        _release_after(command.ticket, slot_seconds)
+
+    def _finished(self, command: RunningCommand):
+        """Give back the slot of a finished command, account for it, and reap old ones."""
+        if command.ticket is not None:
+            get_command_scheduler().release(command.ticket)
+        if command.process is not None:
+            client = command.ticket.client if command.ticket is not None else None
+            get_usage_ledger().record(command.resources, client, command.workflow_id)
+        self.reap()
+
+
+def _release_after(ticket: Ticket, seconds: Optional[float]):
+    """Give back the slot of a started command after a delay, if it has not finished by then."""
+    if seconds is not None:
+        # Releasing is idempotent, so the command finishing first is harmless
+        asyncio.get_running_loop().call_later(max(seconds, 0.0), get_command_scheduler().release, ticket)
+
+
+async def spawn_command(command_line: str, cwd: str) -> AccountedProcess:
+    """
+    Run a command line in a new shell, in a process group of its own.
+
+    Args:
+        command_line: The command line to run
+        cwd: The working directory of the command
+
+    Returns:
+        The process, with its stdout and stderr piped
+    """
+    # A process group of its own lets kill reach the command's children
+    return await AccountedProcess.start(command_line, cwd, **_process_group_options())
+
+
+def signal_process_group(process: AccountedProcess, signum: int):
+    """
+    Send a signal to every process in the process group of a command.
+
+    Args:
+        process: A process started by spawn_command
+        signum: The signal to send; outside POSIX, SIGTERM terminates the
+            process and anything else kills it
+    """
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signum)
+        elif signum == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def _process_group_options() -> Dict[str, Any]:
+    """Get the subprocess options starting a command in a new process group."""
+    if os.name == "posix":
+        return {"start_new_session": True}
+    return {"creationflags": getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)}
+
+
+_manager: Optional[CommandManager] = None
+
+
+def get_command_manager() -> CommandManager:
+    """
+    Get the command manager shared by all tools, creating it if needed.
+
+    Returns:
+        The shared command manager
+    """
+    global _manager
+    if _manager is None:
+        _manager = CommandManager()
+    return _manager
+
+
+def configure_commands(
+    buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+    spill_bytes: int = DEFAULT_SPILL_BYTES,
+    retention: int = DEFAULT_RETENTION,
+    timeout: float = DEFAULT_COMMAND_TIMEOUT,
+    output_cap: int = DEFAULT_OUTPUT_CAP
+) -> CommandManager:
+    """
+    Set how much output of each command is kept, how many completed commands,
+    and the limits of blocking commands.
+
+    Commands already started keep their buffers.
+
+    Args:
+        buffer_bytes: Bytes of each stream of a command kept in memory
+        spill_bytes: Bytes of each stream of a command spilled to disk
+        retention: Completed commands kept before the oldest are reaped
+        timeout: Seconds a blocking command may run by default
+        output_cap: Bytes of each stream of a blocking command returned by default
+
+    Returns:
+        The shared command manager
+    """
+    manager = get_command_manager()
+    manager.buffer_bytes = buffer_bytes
+    manager.spill_bytes = spill_bytes
+    manager.retention = retention
+    manager.timeout = timeout
+    manager.output_cap = output_cap
+    return manager
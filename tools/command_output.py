@@ -0,0 +1,145 @@
+"""
+Command Output Tool implementation.
+"""
+import asyncio
+from typing import Dict, Any, AsyncIterator
+from .base_tool import BaseTool
+from .command_manager import DEFAULT_READ_BYTES, get_command_manager
+
+
+# Seconds output is gathered for before a Follow frame is sent, so a chatty
+# command does not produce a frame per line
+FOLLOW_FRAME_INTERVAL = 0.1
+
+
+class CommandOutputTool(BaseTool):
+    """Tool to read or follow the output of a command started by run_command."""
+    
+    def __init__(self):
+        """Initialize the command output tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "CommandId": {
+              "type": "string",
+              "description": "The ID of the command, as returned by run_command."
+            },
+            "StdoutOffset": {
+              "type": "integer",
+              "minimum": 0,
+              "description": "The offset to read stdout from: the stdout_offset returned by the previous call, or 0 for the start. Defaults to 0."
+            },
+            "StderrOffset": {
+              "type": "integer",
+              "minimum": 0,
+              "description": "The offset to read stderr from: the stderr_offset returned by the previous call, or 0 for the start. Defaults to 0."
+            },
+            "MaxBytes": {
+              "type": "integer",
+              "minimum": 1024,
+              "maximum": 1048576,
+              "description": "Largest number of bytes to return from each stream. Defaults to 65536."
+            },
+            "WaitMs": {
+              "type": "integer",
+              "minimum": 0,
+              "maximum": 60000,
+              "description": "If there is no new output yet, wait up to this many milliseconds for some, or for the command to finish. Defaults to 0."
+            },
+            "Follow": {
+              "type": "boolean",
+              "description": "Send the output as it is printed, in several responses, until the command finishes. Send this call in a request with a request_id, so it does not hold up other requests."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["CommandId"]
+        }
+        """
+        
+        description = (
+            "Read the output of a non-blocking command started with run_command. Each call returns the output "
+            "printed since the given offsets, and the offsets to pass to the next call to get only newer output. "
+            "Set WaitMs to wait for new output instead of polling in a loop, or Follow to receive the output as it "
+            "is printed until the command finishes. The most recent output of each command is kept in memory and "
+            "older output on disk, up to a limit; output past that limit is dropped and reported in dropped_bytes. "
+            "Once a finished command is reaped, reads still in progress return output_expired."
+        )
+        
+        super().__init__("command_output", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the command output tool.
+        
+        Args:
+            params: The parameters for the tool
+        
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        command = get_command_manager().get(params.get("CommandId", ""))
+        if command is None:
+            return {"error": f"Command not found: {params.get('CommandId', '')}"}
+        
+        stdout_offset = params.get("StdoutOffset", 0)
+        stderr_offset = params.get("StderrOffset", 0)
+        max_bytes = params.get("MaxBytes", DEFAULT_READ_BYTES)
+        wait_ms = params.get("WaitMs", 0)
+        
+        try:
+            # Long-poll: wait for output past the offsets if there is none yet
+            if wait_ms > 0:
+                await command.wait_for_output(stdout_offset, stderr_offset, wait_ms / 1000)
+            
+            return await command.read(stdout_offset, stderr_offset, max_bytes)
+        
+        except Exception as e:
+            return {"error": f"Failed to read command output: {str(e)}"}
+    
+    async def stream(self, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute the command output tool, streaming the output with Follow.
+        
+        Args:
+            params: The parameters for the tool
+        
+        Yields:
+            One response per batch of output; the last one has the exit code
+        """
+        if not params.get("Follow") or self.validate_params(params):
+            yield await self.execute(params)
+            return
+        
+        command = get_command_manager().get(params.get("CommandId", ""))
+        if command is None:
+            yield {"error": f"Command not found: {params.get('CommandId', '')}"}
+            return
+        
+        stdout_offset = params.get("StdoutOffset", 0)
+        stderr_offset = params.get("StderrOffset", 0)
+        max_bytes = params.get("MaxBytes", DEFAULT_READ_BYTES)
+        
+        while True:
+            await command.wait_for_output(stdout_offset, stderr_offset)
+            if not command.done:
+                # Gather the output printed meanwhile into the same frame
+                await asyncio.sleep(FOLLOW_FRAME_INTERVAL)
+            
+            done = command.done
+            frame = await command.read(stdout_offset, stderr_offset, max_bytes)
+            stdout_offset = frame["stdout_offset"]
+            stderr_offset = frame["stderr_offset"]
+            
+            # The last frame is sent once the finished command has no output left
+            if done and not frame["more_output"]:
+                yield frame
+                return
+            if frame["stdout"] or frame["stderr"] or "dropped_bytes" in frame:
+                yield frame
@@ -0,0 +1,238 @@
+"""
+Admission control for the commands run by run_command.
+
+Every command takes a slot from the CommandScheduler before it starts and
+gives it back when it finishes. At most max_concurrent commands run at once,
+and at most max_per_client for any one client connection, so a few agents
+starting builds at the same time queue up instead of thrashing the machine.
+
+Queued commands are started in priority order: interactive commands, run on
+behalf of a user waiting for them, before workflow commands, then in the
+order they were submitted. A command whose client is at its own cap is
+skipped over until one of that client's commands finishes, so it does not
+hold up the commands of other clients.
+"""
+import asyncio
+import bisect
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+
+# Commands run at once across all clients, overridable with MCP_MAX_COMMANDS
+DEFAULT_MAX_CONCURRENT_COMMANDS = int(os.environ.get("MCP_MAX_COMMANDS", str(os.cpu_count() or 4)))
+
+# Commands run at once by a single client, overridable with
+# MCP_MAX_COMMANDS_PER_CLIENT
+DEFAULT_MAX_COMMANDS_PER_CLIENT = int(os.environ.get("MCP_MAX_COMMANDS_PER_CLIENT", "2"))
+
+# Priority classes, highest first
+INTERACTIVE = "interactive"
+WORKFLOW = "workflow"
+PRIORITIES = (INTERACTIVE, WORKFLOW)
+
+
+class Ticket:
+    """A command's place in the scheduler, queued or holding a slot."""
+
+    def __init__(self, client: Optional[str], priority: str, sequence: int):
+        """
+        Initialize a ticket; use CommandScheduler.submit to get one.
+
+        Args:
+            client: The client the command runs for
+            priority: The priority class of the command
+            sequence: The order in which the ticket was submitted
+        """
+        self.client = client
+        self.priority = priority
+        self.sort_key = (PRIORITIES.index(priority), sequence)
+        self.submitted_at = time.time()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self._granted = asyncio.get_running_loop().create_future()
+
+    @property
+    def granted(self) -> bool:
+        """Whether the ticket holds a slot."""
+        return self.granted_at is not None
+
+    @property
+    def queue_wait(self) -> float:
+        """Seconds spent in the queue, up to now if still queued."""
+        return (self.granted_at or time.time()) - self.submitted_at
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return self.sort_key < other.sort_key
+
+
+class CommandScheduler:
+    """Global and per-client concurrency limits for commands, with priorities."""
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_COMMANDS,
+        max_per_client: int = DEFAULT_MAX_COMMANDS_PER_CLIENT
+    ):
+        """
+        Initialize a scheduler with no commands.
+
+        Args:
+            max_concurrent: Commands run at once across all clients
+            max_per_client: Commands run at once by a single client
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_client = max(1, max_per_client)
+        self._queue: List[Ticket] = []
+        self._running = 0
+        self._running_by_client: Dict[Optional[str], int] = {}
+        self._sequence = itertools.count()
+
+    @property
+    def running(self) -> int:
+        """Number of commands holding a slot."""
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        """Number of commands waiting for a slot."""
+        return len(self._queue)
+
+    def submit(self, client: Optional[str] = None, priority: str = INTERACTIVE) -> Ticket:
+        """
+        Ask for a slot, granted at once if one is free.
+
+        Args:
+            client: The client the command runs for
+            priority: The priority class of the command
+
+        Returns:
+            The ticket of the command
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        ticket = Ticket(client, priority, next(self._sequence))
+        bisect.insort(self._queue, ticket)
+        self._dispatch()
+        return ticket
+
+    async def wait(self, ticket: Ticket):
+        """
+        Wait until a ticket holds a slot.
+
+        If the wait is cancelled, the ticket leaves the queue.
+
+        Args:
+            ticket: The ticket returned by submit
+        """
+        try:
+            await asyncio.shield(ticket._granted)
+        except asyncio.CancelledError:
+            self.release(ticket)
+            raise
+
+    def position(self, ticket: Ticket) -> Optional[int]:
+        """
+        Get the place of a ticket in the queue.
+
+        Args:
+            ticket: The ticket returned by submit
+
+        Returns:
+            1 for the next command to start, or None if the ticket is not queued
+        """
+        index = bisect.bisect_left(self._queue, ticket)
+        if index < len(self._queue) and self._queue[index] is ticket:
+            return index + 1
+        return None
+
+    def release(self, ticket: Ticket):
+        """
+        Give back the slot of a ticket, or take it out of the queue.
+
+        Releasing a ticket more than once has no effect.
+
+        Args:
+            ticket: The ticket returned by submit
+        """
+        if ticket.released:
+            return
+        ticket.released = True
+
+        if ticket.granted:
+            self._running -= 1
+            self._running_by_client[ticket.client] -= 1
+            if not self._running_by_client[ticket.client]:
+                del self._running_by_client[ticket.client]
+        else:
+            position = self.position(ticket)
+            if position is not None:
+                del self._queue[position - 1]
+            ticket._granted.cancel()
+
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get counters describing the scheduler.
+
+        Returns:
+            The limits, and the number of running and queued commands
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_client": self.max_per_client,
+            "running": self._running,
+            "queued": len(self._queue)
+        }
+
+    def _dispatch(self):
+        """Grant free slots to the queued tickets, in priority order."""
+        index = 0
+        while self._running < self.max_concurrent and index < len(self._queue):
+            ticket = self._queue[index]
+            if self._running_by_client.get(ticket.client, 0) >= self.max_per_client:
+                index += 1
+                continue
+
+            del self._queue[index]
+            ticket.granted_at = time.time()
+            self._running += 1
+            self._running_by_client[ticket.client] = self._running_by_client.get(ticket.client, 0) + 1
+            ticket._granted.set_result(None)
+
+
+_scheduler: Optional[CommandScheduler] = None
+
+
+def get_command_scheduler() -> CommandScheduler:
+    """
+    Get the scheduler shared by all tools, creating it if needed.
+
+    Returns:
+        The shared command scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = CommandScheduler()
+    return _scheduler
+
+
+def configure_command_scheduler(max_concurrent: int, max_per_client: int) -> CommandScheduler:
+    """
+    Set the concurrency limits of the shared scheduler.
+
+    Args:
+        max_concurrent: Commands run at once across all clients
+        max_per_client: Commands run at once by a single client
+
+    Returns:
+        The shared command scheduler
+    """
+    scheduler = get_command_scheduler()
+    scheduler.max_concurrent = max(1, max_concurrent)
+    scheduler.max_per_client = max(1, max_per_client)
+    scheduler._dispatch()
+    return scheduler
@@ -0,0 +1,73 @@
+"""
+Command Status Tool implementation.
+"""
+from typing import Dict, Any
+from .base_tool import BaseTool
+from .command_cache import get_command_cache
+from .command_manager import get_command_manager
+from .command_scheduler import get_command_scheduler
+from .resource_usage import get_usage_ledger
+
+
+class CommandStatusTool(BaseTool):
+    """Tool to get the status of the commands started by run_command."""
+    
+    def __init__(self):
+        """Initialize the command status tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "CommandId": {
+              "type": "string",
+              "description": "The ID of the command, as returned by run_command. Omit it to list every command."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object"
+        }
+        """
+        
+        description = (
+            "Get the status of a non-blocking command started with run_command: whether it is queued, running, "
+            "completed or killed, its place in the queue, its exit code, how long it waited in the queue and how long "
+            "it ran, the CPU time, peak memory and disk I/O it has used so far, and how much output it printed. Without a CommandId, list every queued and running command and "
+            "the most recently completed ones, with the number of commands running and queued, the hits and misses "
+            "of the result cache, and the resources used by completed commands per client and per workflow."
+        )
+        
+        super().__init__("command_status", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the command status tool.
+        
+        Args:
+            params: The parameters for the tool
+            
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        manager = get_command_manager()
+        command_id = params.get("CommandId")
+        
+        if command_id is None:
+            cache = get_command_cache()
+            return {
+                "commands": [command.to_dict() for command in manager.commands()],
+                "reaped": manager.reaped,
+                "scheduler": get_command_scheduler().stats(),
+                "cache": cache.stats() if cache is not None else None,
+                "usage": get_usage_ledger().to_dict()
+            }
+        
+        command = manager.get(command_id)
+        if command is None:
+            return {"error": f"Command not found: {command_id}"}
+        
+        return command.to_dict()
@@ -0,0 +1,346 @@
+"""
+Per-connection request dispatching for the MCP servers.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import serialization
+from .wire import TEXT_ENCODING, encode_message, encode_tool_response, negotiate_encoding
+
+
+# Default number of request-ID-tagged frames a single connection may have in flight
+DEFAULT_MAX_CONCURRENT_REQUESTS = 8
+
+# Parameters naming the file a tool call works on
+RESOURCE_PARAMETERS = ("TargetFile", "AbsolutePath")
+
+# List parameters of the multi-file tools, whose items name a file the same way
+RESOURCE_LIST_PARAMETERS = ("Edits", "NewFiles", "Files")
+
+# The ID of the connection whose request is being processed, inherited by the
+# tasks processing its frames
+_current_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_client", default=None)
+_client_ids = itertools.count(1)
+
+
+def get_current_client() -> Optional[str]:
+    """
+    Get the ID of the client connection whose request is being processed.
+
+    Returns:
+        The client ID, or None outside of a client connection
+    """
+    return _current_client.get()
+
+
+def unwrap_request(message: Any) -> Tuple[Optional[str], Any]:
+    """
+    Split a request-ID-tagged frame into its ID and payload.
+
+    Tagged frames are JSON objects of the form
+    {"request_id": "...", "message": ...}. Any other frame is returned
+    unchanged together with a request ID of None.
+
+    Args:
+        message: The raw frame received from the client
+
+    Returns:
+        A tuple of (request_id, payload)
+    """
+    if not isinstance(message, str) or not message.lstrip().startswith("{"):
+        return None, message
+
+    try:
+        envelope = serialization.loads(message)
+    except serialization.JSONDecodeError:
+        return None, message
+
+    if (
+        not isinstance(envelope, dict)
+        or "request_id" not in envelope
+        or "message" not in envelope
+        or "target" in envelope
+    ):
+        return None, message
+
+    payload = envelope["message"]
+    if not isinstance(payload, str):
+        payload = serialization.dumps(payload)
+
+    return str(envelope["request_id"]), payload
+
+
+def tool_call_keys(tool_call: Dict[str, Any]) -> List[str]:
+    """
+    Get the files a tool call works on.
+
+    Calls that share a key must run in the order they were given, such as
+    edits to the same file. Multi-file tools get one key per file they touch.
+
+    Args:
+        tool_call: The tool call, as returned by iter_tool_calls
+
+    Returns:
+        The normalized paths, without duplicates; empty if the call works on
+        no particular file
+    """
+    parameters = tool_call.get("parameters")
+    if not isinstance(parameters, dict):
+        return []
+
+    entries = [parameters]
+    for name in RESOURCE_LIST_PARAMETERS:
+        items = parameters.get(name)
+        if isinstance(items, list):
+            entries.extend(item for item in items if isinstance(item, dict))
+
+    keys: List[str] = []
+    for entry in entries:
+        for name in RESOURCE_PARAMETERS:
+            value = entry.get(name)
+            if isinstance(value, str) and value:
+                key = os.path.normcase(os.path.abspath(value))
+                if key not in keys:
+                    keys.append(key)
+                break
+
+    return keys
+
+
+async def run_tool_calls(
+    tool_calls: Iterable[Dict[str, Any]],
+    handler: Callable[[Dict[str, Any]], Awaitable[None]]
+):
+    """
+    Run the tool calls extracted from one message concurrently.
+
+    Independent calls run at the same time; calls that share a key (see
+    tool_call_keys) are chained so they run in the order they were given. A
+    call with several keys waits for the last earlier call on each of them.
+    The handler is expected to send the response for its call itself, so
+    responses go out as each call finishes. tool_calls may be a lazy
+    iterator such as iter_tool_calls(): each call is started as soon as it
+    has been parsed, before the rest of the message is.
+
+    Args:
+        tool_calls: The tool calls to run
+        handler: Coroutine function executing a single tool call
+
+    Returns:
+        The number of tool calls that were run
+    """
+    tails: Dict[str, asyncio.Task] = {}
+    tasks: List[asyncio.Task] = []
+
+    try:
+        for tool_call in tool_calls:
+            keys = tool_call_keys(tool_call)
+            previous = {tails[key] for key in keys if key in tails}
+            task = asyncio.create_task(_run_after(previous, handler, tool_call))
+            for key in keys:
+                tails[key] = task
+            tasks.append(task)
+
+            # Let the call start before parsing the next one
+            await asyncio.sleep(0)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if not tasks:
+        return 0
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return len(tasks)
+
+
+async def _run_after(
+    previous: Set[asyncio.Task],
+    handler: Callable[[Dict[str, Any]], Awaitable[None]],
+    tool_call: Dict[str, Any]
+):
+    """Run a tool call once the calls it is chained after have finished."""
+    if previous:
+        await asyncio.wait(previous)
+    await handler(tool_call)
+
+
+class Responder:
+    """Sends the responses for a single request back to the client."""
+
+    def __init__(self, websocket, request_id: Optional[str] = None, encoding: str = TEXT_ENCODING):
+        """
+        Initialize a responder.
+
+        Args:
+            websocket: The WebSocket connection
+            request_id: The ID of the request, or None for untagged frames
+            encoding: The wire encoding negotiated for the connection
+        """
+        self.websocket = websocket
+        self.request_id = request_id
+        self.encoding = encoding
+
+    async def send_tool_response(self, tool_name: str, response: Dict[str, Any]):
+        """
+        Send the response of a tool call.
+
+        Args:
+            tool_name: The name of the tool
+            response: The response from the tool
+        """
+        await self.websocket.send(
+            encode_tool_response(tool_name, response, self.encoding, self.request_id)
+        )
+
+    async def send_message(self, message: Dict[str, Any]):
+        """
+        Send a JSON message, such as an agent response or an error.
+
+        Args:
+            message: The message to send
+        """
+        if self.encoding == TEXT_ENCODING:
+            payload = serialization.dumps(message)
+            if self.request_id is not None:
+                payload = serialization.dumps({"request_id": self.request_id, "response": payload})
+        elif self.request_id is not None:
+            payload = encode_message({"request_id": self.request_id, "response": message}, self.encoding)
+        else:
+            payload = encode_message(message, self.encoding)
+
+        await self.websocket.send(payload)
+
+    async def send_done(self):
+        """Tell the client that every response for this request has been sent."""
+        if self.request_id is not None:
+            await self.websocket.send(
+                encode_message({"request_id": self.request_id, "done": True}, self.encoding)
+            )
+
+
+class ClientConnection:
+    """
+    Dispatches the frames received on one WebSocket connection.
+
+    Untagged frames keep the original protocol: they are processed one at a
+    time, in the order they were received. Request-ID-tagged frames are each
+    processed in their own task, so a slow request does not hold up the ones
+    behind it, and their responses are sent back as soon as they are ready.
+    At most max_concurrent_requests tagged frames run at once; once the cap
+    is reached, the connection stops reading until a slot frees up.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        handler: Callable[[Responder, str], Awaitable[None]],
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        requested_encoding: Optional[str] = None
+    ):
+        """
+        Initialize a client connection.
+
+        Args:
+            websocket: The WebSocket connection
+            handler: Coroutine function processing a single message
+            max_concurrent_requests: Maximum number of tagged frames in flight
+            requested_encoding: The wire encoding requested by the client, if any
+        """
+        self.websocket = websocket
+        self.client_id = f"client_{next(_client_ids)}"
+        self.requested_encoding = requested_encoding
+        self.encoding = negotiate_encoding(requested_encoding)
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self.logger = logging.getLogger("dispatch")
+        self._handler = handler
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self._tasks: Set[asyncio.Task] = set()
+        self._ordered: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrent_requests)
+        self._ordered_worker: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight(self) -> int:
+        """Number of tagged requests currently being processed."""
+        return len(self._tasks)
+
+    async def open(self):
+        """
+        Start the connection.
+
+        The requests of the connection are processed as its client, so tools
+        can tell clients apart. Clients that asked for an encoding are told
+        which one was chosen, before any other response.
+        """
+        _current_client.set(self.client_id)
+        if self.requested_encoding is not None:
+            await self.websocket.send(encode_message(
+                {"encoding": self.encoding, "requested_encoding": self.requested_encoding},
+                self.encoding
+            ))
+
+    async def dispatch(self, message: Any):
+        """
+        Dispatch a frame received from the client.
+
+        Args:
+            message: The raw frame
+        """
+        request_id, payload = unwrap_request(message)
+
+        if request_id is None:
+            if self._ordered_worker is None:
+                self._ordered_worker = asyncio.create_task(self._process_ordered())
+            await self._ordered.put(message)
+            return
+
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process_tagged(request_id, payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Cancel every request still being processed for this connection."""
+        pending = list(self._tasks)
+        if self._ordered_worker is not None:
+            pending.append(self._ordered_worker)
+
+        for task in pending:
+            task.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _process_ordered(self):
+        """Process untagged frames one at a time, in order."""
+        responder = Responder(self.websocket, encoding=self.encoding)
+        while True:
+            message = await self._ordered.get()
+            try:
+                await self._handler(responder, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error processing message: {str(e)}")
+
+    async def _process_tagged(self, request_id: str, message: str):
+        """Process a single tagged frame and release its slot."""
+        responder = Responder(self.websocket, request_id, self.encoding)
+        try:
+            await self._handler(responder, message)
+            await responder.send_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error processing request {request_id}: {str(e)}")
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,375 @@
+"""
+Anchored edit engine for edit_file.
+
+A CodeEdit is a sequence of edit blocks separated by {{ ... }} placeholders.
+Each block starts and ends with context lines copied from the file; the lines
+in between replace whatever lies between that context in the file:
+
+    {{ ... }}
+    def total(items):          <- head anchor
+        return sum(items) + 1  <- replacement
+    def mean(items):           <- tail anchor
+    {{ ... }}
+
+Blocks are located through a table mapping the first and last line of every
+block (ignoring trailing whitespace) to the positions where it occurs in the
+file, so the file is scanned once however many blocks the edit has. Blocks
+must appear in file order. A block that changes lines must match the file
+at both ends, except for lines added at the start or the end of the file. A
+block whose anchors match nowhere, match only at one end, or match several
+places equally well, is reported as an EditError and the file is left
+untouched.
+"""
+import bisect
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+PLACEHOLDER = re.compile(r'{{ *\.\.\. *}}')
+
+
+class EditError(ValueError):
+    """An edit that cannot be applied unambiguously."""
+
+
+class Hunk(NamedTuple):
+    """A replacement of the original lines [start, end) by new lines."""
+    start: int
+    end: int
+    lines: List[str]
+
+
+class _LineTable:
+    """The lines of a file, with the positions of the lines used as anchors."""
+
+    def __init__(self, lines: List[str], anchors: Set[str]):
+        """
+        Index the lines of a file in one pass.
+
+        Args:
+            lines: The lines of the file, without line endings
+            anchors: The lines whose positions are recorded, without
+                trailing whitespace
+        """
+        self.keys = list(map(str.rstrip, lines))
+        self.positions: Dict[str, List[int]] = defaultdict(list)
+        for number, key in enumerate(self.keys):
+            if key in anchors:
+                self.positions[key].append(number)
+
+    def occurrences(self, key: str, start: int) -> List[int]:
+        """Get the positions of a line at or after start."""
+        positions = self.positions.get(key)
+        if not positions:
+            return []
+        return positions[bisect.bisect_left(positions, start):]
+
+    def match_forward(self, position: int, keys: List[str]) -> int:
+        """Count the lines of keys matching the file from position on."""
+        count = 0
+        limit = min(len(keys), len(self.keys) - position)
+        while count < limit and self.keys[position + count] == keys[count]:
+            count += 1
+        return count
+
+    def match_backward(self, end: int, keys: List[str], floor: int) -> int:
+        """Count the last lines of keys matching the file up to end, not below floor."""
+        count = 0
+        limit = min(len(keys), end - floor)
+        while count < limit and self.keys[end - 1 - count] == keys[len(keys) - 1 - count]:
+            count += 1
+        return count
+
+
+def split_blocks(code_edit: str) -> Optional[List[List[str]]]:
+    """
+    Split a CodeEdit into edit blocks.
+
+    Args:
+        code_edit: The code edit specification, with \\n line endings
+
+    Returns:
+        The lines of each non-empty block, or None if the edit has no
+        placeholder and replaces the whole file
+    """
+    sections = PLACEHOLDER.split(code_edit)
+    if len(sections) == 1:
+        return None
+
+    blocks = []
+    for section in sections:
+        # Drop the line breaks around the placeholders themselves
+        if section.startswith("\n"):
+            section = section[1:]
+        if section.endswith("\n"):
+            section = section[:-1]
+        if section.strip():
+            blocks.append(section.split("\n"))
+    return blocks
+
+
+def plan_edits(original_lines: List[str], code_edit: str) -> List[Hunk]:
+    """
+    Locate the edit blocks of a CodeEdit in a file.
+
+    Args:
+        original_lines: The lines of the file, without line endings
+        code_edit: The code edit specification, with \\n line endings
+
+    Returns:
+        The hunks to apply, in file order and not overlapping
+
+    Raises:
+        EditError: If a block has no anchor in the file or an ambiguous one
+    """
+    blocks = split_blocks(code_edit)
+    if blocks is None:
+        lines = code_edit.split("\n")
+        if code_edit.endswith("\n"):
+            lines.pop()
+        return [Hunk(0, len(original_lines), lines)]
+
+    # Blocks are only ever located through their first and last lines
+    anchors = {line.rstrip() for block in blocks for line in (block[0], block[-1])}
+    table = _LineTable(original_lines, anchors)
+    hunks = []
+    cursor = 0
+
+    for number, block in enumerate(blocks, 1):
+        hunk, cursor = _locate_block(table, block, cursor, number)
+        if hunk is not None and (hunk.lines or hunk.start < hunk.end):
+            hunks.append(hunk)
+
+    return hunks
+
+
+def _locate_block(table: _LineTable, block: List[str], cursor: int, number: int) -> Tuple[Optional[Hunk], int]:
+    """
+    Locate one edit block at or after cursor.
+
+    Returns:
+        The hunk of the block (None if the block is only context) and the
+        position after which the next block is searched
+    """
+    keys = [line.rstrip() for line in block]
+    head_start, head_length = _find_head(table, keys, cursor, number)
+
+    if head_length == len(keys):
+        # The whole block is context: it only moves the cursor
+        return None, head_start + head_length
+
+    body_start = head_start + head_length if head_length else cursor
+    tail_end, tail_length = _find_tail(table, keys[head_length:], body_start, number, unique=not head_length)
+
+    if head_length == 0 and tail_length == 0:
+        raise EditError(
+            f"Edit block {number}: neither its first line nor its last line matches the file "
+            f"after line {cursor}; start and end each block with unchanged lines of the file"
+        )
+
+    # Without an anchor at one end, the extent of the lines replaced is
+    # unknown, unless the block adds lines at the start or end of the file
+    if head_length == 0:
+        if tail_end - tail_length != 0:
+            raise EditError(
+                f"Edit block {number}: its first line is blank or does not match the file after line {cursor}; "
+                f"start each block with unchanged lines of the file"
+            )
+        body_start = 0
+
+    if tail_length == 0:
+        if body_start != len(table.keys):
+            raise EditError(
+                f"Edit block {number}: its last line is blank or does not match the file after line {body_start - 1}; "
+                f"end each block with unchanged lines of the file"
+            )
+        tail_end = body_start
+
+    lines = block[head_length:len(block) - tail_length]
+    return Hunk(body_start, tail_end - tail_length, lines), tail_end
+
+
+def _find_head(table: _LineTable, keys: List[str], cursor: int, number: int) -> Tuple[int, int]:
+    """
+    Find the longest run of leading block lines matching the file.
+
+    Returns:
+        The position and length of the match; the length is 0 if the first
+        line of the block is blank or does not occur in the file
+
+    Raises:
+        EditError: If several positions share the longest match
+    """
+    if not keys[0]:
+        return cursor, 0
+
+    best_length = 0
+    best_positions: List[int] = []
+    for position in table.occurrences(keys[0], cursor):
+        length = table.match_forward(position, keys)
+        if length > best_length:
+            best_length = length
+            best_positions = [position]
+        elif length == best_length:
+            best_positions.append(position)
+
+    if not best_positions:
+        return cursor, 0
+
+    # A block that is only context marks a position; take the nearest one
+    if len(best_positions) > 1 and best_length < len(keys):
+        raise EditError(
+            f"Edit block {number}: its first {_lines(best_length)} {_match(best_length)} the file at lines "
+            f"{_positions(best_positions)}; include more unchanged lines to make it unique"
+        )
+
+    return best_positions[0], best_length
+
+
+def _find_tail(table: _LineTable, keys: List[str], floor: int, number: int, unique: bool) -> Tuple[int, int]:
+    """
+    Find the longest run of trailing block lines matching the file after floor.
+
+    Returns:
+        The end position and length of the match; the length is 0 if the
+        last line of the block is blank or does not occur in the file. Among
+        equally long matches, the nearest one is taken.
+
+    Raises:
+        EditError: If unique is set and several positions share the longest match
+    """
+    if not keys[-1]:
+        return floor, 0
+
+    best_length = 0
+    best_ends: List[int] = []
+    for position in table.occurrences(keys[-1], floor):
+        length = table.match_backward(position + 1, keys, floor)
+        if length > best_length:
+            best_length = length
+            best_ends = [position + 1]
+        elif length == best_length:
+            best_ends.append(position + 1)
+
+        # Nothing can beat a match of the whole block but a nearer one
+        if best_length == len(keys) and not unique:
+            break
+
+    if not best_ends:
+        return floor, 0
+
+    if len(best_ends) > 1 and unique:
+        raise EditError(
+            f"Edit block {number}: its last {_lines(best_length)} {_match(best_length)} the file ending at lines "
+            f"{_positions([end - 1 for end in best_ends])}; include more unchanged lines to make it unique"
+        )
+
+    return best_ends[0], best_length
+
+
+def apply_hunks(original_lines: List[str], hunks: List[Hunk]) -> List[str]:
+    """
+    Splice hunks into the lines of a file.
+
+    Args:
+        original_lines: The lines of the file, without line endings
+        hunks: The hunks to apply, in file order and not overlapping
+
+    Returns:
+        The edited lines
+    """
+    result: List[str] = []
+    position = 0
+    for hunk in hunks:
+        result.extend(original_lines[position:hunk.start])
+        result.extend(hunk.lines)
+        position = hunk.end
+    result.extend(original_lines[position:])
+    return result
+
+
+def split_lines(content: str) -> Tuple[List[str], str, bool]:
+    """
+    Split file contents into lines.
+
+    Args:
+        content: The contents of the file
+
+    Returns:
+        A tuple of (lines, newline, final_newline): the lines without line
+        endings, the line ending used by the file, and whether the file ends
+        with a line ending
+    """
+    newline = "\r\n" if "\r\n" in content else "\n"
+    if newline != "\n":
+        content = content.replace("\r\n", "\n")
+
+    lines = content.split("\n")
+    final_newline = content.endswith("\n")
+    if final_newline or not content:
+        lines.pop()
+    return lines, newline, final_newline
+
+
+def join_lines(lines: List[str], newline: str, final_newline: bool) -> str:
+    """
+    Join lines into file contents.
+
+    Args:
+        lines: The lines, without line endings
+        newline: The line ending to use
+        final_newline: Whether to end the contents with a line ending
+
+    Returns:
+        The contents of the file
+    """
+    content = newline.join(lines)
+    if final_newline and lines:
+        content += newline
+    return content
+
+
+def apply_edits(original_content: str, code_edit: str) -> Tuple[str, List[Hunk]]:
+    """
+    Apply a CodeEdit to the contents of a file.
+
+    The line endings of the file and its final line ending are preserved.
+
+    Args:
+        original_content: The original file content
+        code_edit: The code edit specification
+
+    Returns:
+        The new content and the hunks that were applied
+
+    Raises:
+        EditError: If a block has no anchor in the file or an ambiguous one
+    """
+    original_lines, newline, final_newline = split_lines(original_content)
+
+    # Without placeholders, the edit is the new content of the whole file
+    if PLACEHOLDER.search(code_edit) is None:
+        return code_edit, [Hunk(0, len(original_lines), split_lines(code_edit)[0])]
+
+    hunks = plan_edits(original_lines, code_edit.replace("\r\n", "\n"))
+    new_lines = apply_hunks(original_lines, hunks)
+    return join_lines(new_lines, newline, final_newline or not original_lines), hunks
+
+
+def _lines(count: int) -> str:
+    """Describe a number of lines."""
+    return "line" if count == 1 else f"{count} lines"
+
+
+def _match(count: int) -> str:
+    """Conjugate "match" for a number of lines."""
+    return "matches" if count == 1 else "match"
+
+
+def _positions(positions: List[int], limit: int = 5) -> str:
+    """List line numbers in an error message."""
+    listed = ", ".join(str(position) for position in positions[:limit])
+    if len(positions) > limit:
+        listed += f" and {len(positions) - limit} more"
+    return listed
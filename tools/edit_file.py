@@ -3,9 +3,13 @@ Edit File Tool implementation.
 """
 import json
 import os
-import re
 from typing import Dict, Any, List, Tuple
 from .base_tool import BaseTool
+from .edit_engine import EditError, Hunk, apply_edits
+from .file_io import atomic_write_text, path_lock, read_text, run_file_io
+from .file_diff import unified_diff
+from .file_transaction import FileChange
+from .journal import record_changes
 from .utils import safe_path
 
 
@@ -39,7 +43,7 @@ class EditFileTool(BaseTool):
             },
             "CodeEdit": {
               "type": "string",
-              "description": "Specify ONLY the precise lines of code that you wish to edit. **NEVER specify or write out unchanged code**. Instead, represent all unchanged code using this special placeholder: {{ ... }}"
+              "description": "One or more edit blocks separated by the special placeholder {{ ... }}, which stands for unchanged code. Each block starts and ends with an unchanged line copied from the file; the lines between those anchors replace what lies between them in the file. Write out no other unchanged code."
             }
           },
           "additionalProperties": false,
@@ -49,21 +53,25 @@ class EditFileTool(BaseTool):
         """
         
         description = (
-            "Do NOT make parallel edits to the same file.\n"
+            "Do NOT make parallel edits to the same file; concurrent edits of one file are applied one after the other.\n"
             "Use this tool to edit an existing file. Follow these rules:\n"
-            "1. Specify ONLY the precise lines of code that you wish to edit.\n"
-            "2. **NEVER specify or write out unchanged code**. Instead, represent all unchanged code using this special placeholder: {{ ... }}.\n"
-            "3. To edit multiple, non-adjacent lines of code in the same file, make a single call to this tool. Specify each edit in sequence with the special placeholder {{ ... }} to represent unchanged code in between edited lines.\n"
-            "Here's an example of how to edit three non-adjacent lines of code at once:\n"
-            "CodeContent:\n"
+            "1. Write each edit as a block that starts and ends with an unchanged line copied exactly from the file. These anchor lines locate the edit; the lines between them replace whatever lies between the anchors in the file. A block made only of edited lines, or whose first or last line is blank or not in the file, cannot be located; only lines added at the very start or end of the file may leave out the anchor on that side.\n"
+            "2. Apart from the anchor lines, do not write out unchanged code. Represent all unchanged code between blocks using this special placeholder: {{ ... }}.\n"
+            "3. To edit multiple, non-adjacent parts of the same file, make a single call to this tool, with one block per part, in file order, separated by the special placeholder {{ ... }}.\n"
+            "Here's an example of how to edit two non-adjacent lines of code at once:\n"
+            "CodeEdit:\n"
             "{{ ... }}\n"
+            "unchanged_line_before_1\n"
             "edited_line_1\n"
+            "unchanged_line_after_1\n"
             "{{ ... }}\n"
+            "unchanged_line_before_2\n"
             "edited_line_2\n"
-            "{{ ... }}\n"
-            "edited_line_3\n"
+            "unchanged_line_after_2\n"
             "{{ ... }}\n\n"
+            "4. If an anchor line could match several places in the file, add more unchanged lines around the edit until it is unique. Edits that cannot be located, or match several places equally well, are rejected without modifying the file.\n"
             "5. You may not edit file extensions: [.ipynb]\n"
+            "The result includes a unified diff of the change, so there is no need to view the file again to check the edit.\n"
             "You should specify the following arguments before the others: [TargetFile]"
         )
         
@@ -102,30 +110,49 @@ class EditFileTool(BaseTool):
             return {"error": "Editing .ipynb files is not supported"}
         
         try:
-            # Read the file
-            with open(target_file, 'r', encoding='utf-8', errors='replace') as f:
-                original_content = f.read()
-            
-            # Apply the edits
-            new_content = self._apply_edits(original_content, code_edit)
+            # Hold the lock of the file from the read to the write, so
+            # concurrent edits of the same file cannot lose each other's changes
+            async with path_lock(target_file):
+                # Read the file off the event loop
+                original_content = await run_file_io(read_text, target_file)
+                
+                # Apply the edits; nothing is written if a block cannot be located
+                try:
+                    new_content, hunks = self._apply_edits(original_content, code_edit)
+                except EditError as e:
+                    return {"error": str(e)}
+                
+                # Replace the file atomically, off the event loop
+                await run_file_io(atomic_write_text, target_file, new_content)
+                
+                # Journal the change so that it can be undone
+                edit_id = await record_changes(self.name, [
+                    FileChange(target_file, original_content, new_content, hunks)
+                ])
             
-            # Write the file
-            with open(target_file, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            # Return what changed, so the file need not be viewed again
+            diff = unified_diff(target_file, original_content, new_content, hunks)
             
-            return {
+            result = {
                 "success": True,
                 "message": f"File edited: {target_file}",
                 "file_path": target_file,
+                "edit_id": edit_id,
+                "diff": diff.text,
+                "lines_added": diff.added,
+                "lines_removed": diff.removed,
                 "instruction": instruction,
                 "language": language,
                 "lint_error_ids": lint_error_ids
             }
+            if diff.truncated:
+                result["diff_truncated"] = True
+            return result
         
         except Exception as e:
             return {"error": f"Failed to edit file: {str(e)}"}
     
-    def _apply_edits(self, original_content: str, code_edit: str) -> str:
+    def _apply_edits(self, original_content: str, code_edit: str) -> Tuple[str, List[Hunk]]:
         """
         Apply edits to the original content.
         
@@ -134,36 +161,9 @@ class EditFileTool(BaseTool):
             code_edit: The code edit specification
             
         Returns:
-            The new content with edits applied
-        """
-        # Split the original content into lines
-        original_lines = original_content.splitlines()
-        
-        # Split the code edit into sections
-        edit_sections = re.split(r'{{ *\.\.\. *}}', code_edit)
-        
-        # If there's only one section and no placeholders, replace the entire file
-        if len(edit_sections) == 1 and "{{ ... }}" not in code_edit:
-            return edit_sections[0]
-        
-        # Initialize the result with the original content
-        result = original_content
-        
-        # Apply each edit section
-        current_pos = 0
-        for section in edit_sections:
-            # Skip empty sections
-            if not section.strip():
-                continue
-            
-            # Find the next occurrence of the section in the original content
-            section_pos = result.find(section, current_pos)
+            The new content with edits applied, and the hunks that were applied
             
-            if section_pos == -1:
-                # If the section is not found, append it to the end
-                result += "\n" + section
-            else:
-                # Update the current position
-                current_pos = section_pos + len(section)
-        
-        return result
+        Raises:
+            EditError: If an edit block cannot be located unambiguously
+        """
+        return apply_edits(original_content, code_edit)
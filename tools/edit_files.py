@@ -0,0 +1,137 @@
+"""
+Edit Files Tool implementation.
+"""
+from typing import Dict, Any
+from .base_tool import BaseTool
+from .file_transaction import FileTransaction, TransactionError, describe_changes
+from .journal import record_changes
+
+
+class EditFilesTool(BaseTool):
+    """Tool to edit and create several files as a single transaction."""
+    
+    def __init__(self):
+        """Initialize the edit files tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "Instruction": {
+              "type": "string",
+              "description": "A description of the changes that you are making to the files."
+            },
+            "Edits": {
+              "type": "array",
+              "items": {
+                "type": "object",
+                "properties": {
+                  "TargetFile": {
+                    "type": "string",
+                    "description": "The existing file to modify."
+                  },
+                  "CodeEdit": {
+                    "type": "string",
+                    "description": "The edit of the file, in the same format as the CodeEdit of edit_file: blocks that start and end with unchanged anchor lines copied from the file, separated by the special placeholder {{ ... }} for unchanged code"
+                  }
+                },
+                "additionalProperties": false,
+                "required": ["TargetFile", "CodeEdit"]
+              },
+              "description": "The edits of existing files"
+            },
+            "NewFiles": {
+              "type": "array",
+              "items": {
+                "type": "object",
+                "properties": {
+                  "TargetFile": {
+                    "type": "string",
+                    "description": "The file to create. It must not exist yet; parent directories are created as needed."
+                  },
+                  "CodeContent": {
+                    "type": "string",
+                    "description": "The contents of the file"
+                  }
+                },
+                "additionalProperties": false,
+                "required": ["TargetFile", "CodeContent"]
+              },
+              "description": "The files to create"
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["Instruction"]
+        }
+        """
+        
+        description = (
+            "Edit existing files and create new files in a single transaction. Use this tool for changes that span "
+            "several files, such as refactorings, instead of one edit_file call per file.\n"
+            "Every edit is checked against the current contents of its file before anything is written. If any edit "
+            "cannot be applied or any file cannot be written, no file is changed and the error of each failing file "
+            "is returned.\n"
+            "Edits follow the same rules as edit_file, and each file may appear only once in a call. The result "
+            "includes a unified diff of each edited file. "
+            "You may not edit file extensions: [.ipynb]"
+        )
+        
+        super().__init__("edit_files", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the edit files tool.
+        
+        Args:
+            params: The parameters for the tool
+        
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        instruction = params.get("Instruction", "")
+        edits = params.get("Edits", [])
+        new_files = params.get("NewFiles", [])
+        
+        if not edits and not new_files:
+            return {"error": "No edits or new files given"}
+        
+        transaction = FileTransaction()
+        for edit in edits:
+            transaction.edit(edit["TargetFile"], edit["CodeEdit"])
+        for new_file in new_files:
+            transaction.create(new_file["TargetFile"], new_file["CodeContent"])
+        
+        # Journal the whole transaction as one edit, before the files are
+        # unlocked, so the journal follows the order the writes happened in
+        edit_ids = []
+        
+        async def journal(changes):
+            edit_ids.append(await record_changes(self.name, changes))
+        
+        try:
+            changes = await transaction.commit(journal)
+            edit_id = edit_ids[0]
+            
+            return {
+                "success": True,
+                "message": f"{len(changes)} files changed",
+                "edit_id": edit_id,
+                "instruction": instruction,
+                "files": describe_changes(changes)
+            }
+        
+        except TransactionError as e:
+            return {
+                "error": str(e),
+                "files": [
+                    {"file_path": path, "error": message}
+                    for path, message in e.errors.items()
+                ]
+            }
+        except Exception as e:
+            return {"error": f"Failed to edit files: {str(e)}"}
@@ -0,0 +1,103 @@
+"""
+Edit History Tool implementation.
+"""
+from typing import Dict, Any
+from .base_tool import BaseTool
+from .file_io import run_file_io
+from .file_transaction import TransactionError, describe_changes
+from .journal import JournalError, get_journal
+
+
+class EditHistoryTool(BaseTool):
+    """Tool to list, undo and redo the edits made by the file tools."""
+    
+    def __init__(self):
+        """Initialize the edit history tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "Action": {
+              "type": "string",
+              "enum": ["list", "undo", "redo"],
+              "description": "list the recent edits, undo an edit, or redo an undone edit"
+            },
+            "EditId": {
+              "type": "string",
+              "description": "The ID of the edit to undo or redo, as returned by edit_file, edit_files or write_to_file"
+            },
+            "Limit": {
+              "type": "integer",
+              "minimum": 1,
+              "maximum": 200,
+              "description": "Maximum number of edits to list. Defaults to 20."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["Action"]
+        }
+        """
+        
+        description = (
+            "List, undo and redo the changes made by edit_file, edit_files and write_to_file. Each of those tools "
+            "returns an edit_id. Undoing an edit restores every file it changed, and undoing the creation of a file "
+            "deletes it. An edit can only be undone while its files are unchanged since; undo the later edits of "
+            "the same files first. Use this instead of rewriting files by hand to revert a bad edit."
+        )
+        
+        super().__init__("edit_history", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the edit history tool.
+        
+        Args:
+            params: The parameters for the tool
+        
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        action = params.get("Action", "")
+        edit_id = params.get("EditId", "")
+        limit = params.get("Limit", 20)
+        
+        journal = await run_file_io(get_journal)
+        
+        if action == "list":
+            edits = await run_file_io(journal.history, limit)
+            return {"edits": edits}
+        
+        if not edit_id:
+            return {"error": f"EditId is required to {action} an edit"}
+        
+        try:
+            if action == "undo":
+                changes = await journal.undo(edit_id)
+            else:
+                changes = await journal.redo(edit_id)
+            
+            return {
+                "success": True,
+                "message": f"Edit {edit_id} {'undone' if action == 'undo' else 'redone'}",
+                "edit_id": edit_id,
+                "files": describe_changes(changes)
+            }
+        
+        except JournalError as e:
+            return {"error": str(e)}
+        except TransactionError as e:
+            return {
+                "error": f"Cannot {action} edit {edit_id}: {str(e)}",
+                "files": [
+                    {"file_path": path, "error": message}
+                    for path, message in e.errors.items()
+                ]
+            }
+        except Exception as e:
+            return {"error": f"Failed to {action} edit {edit_id}: {str(e)}"}
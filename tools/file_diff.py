@@ -0,0 +1,171 @@
+"""
+Unified diffs of file changes.
+
+A diff is computed from the hunks the edit engine applied rather than from the
+whole file: only the lines each hunk replaced are compared, after trimming the
+lines they have in common, so the comparison costs as much as the edit rather
+than as much as the file. Changes without hunks are trimmed the same way as one
+hunk covering the whole file.
+
+Diffs are capped in lines; a capped diff ends with a marker line and is
+reported as truncated.
+"""
+import difflib
+from typing import List, NamedTuple, Optional
+
+from .edit_engine import Hunk, split_lines
+
+
+# Lines of unchanged context around each change
+DEFAULT_CONTEXT = 3
+
+# Largest diff returned, in lines
+MAX_DIFF_LINES = 400
+
+# Largest region compared line by line; larger regions are shown as a single
+# replacement to keep the comparison linear
+MAX_MATCH_LINES = 2000
+
+
+class FileDiff(NamedTuple):
+    """The unified diff of a change to one file."""
+    text: str
+    added: int
+    removed: int
+    truncated: bool
+
+
+class _Change(NamedTuple):
+    """The old lines [start, end) replaced by lines starting at new_start."""
+    start: int
+    end: int
+    new_start: int
+    lines: List[str]
+
+
+def unified_diff(path: str, original: Optional[str], content: Optional[str],
+                 hunks: Optional[List[Hunk]] = None, context: int = DEFAULT_CONTEXT,
+                 max_lines: int = MAX_DIFF_LINES) -> FileDiff:
+    """
+    Compute the unified diff of a change.
+
+    Args:
+        path: The path of the file, used in the diff header
+        original: The contents before the change, or None if the file did not exist
+        content: The contents after the change, or None if the file was deleted
+        hunks: The hunks applied by the edit engine, if known
+        context: Lines of unchanged context around each change
+        max_lines: Largest number of diff lines to return
+
+    Returns:
+        The diff, with the number of added and removed lines
+    """
+    old_lines = [] if original is None else split_lines(original)[0]
+
+    if hunks is None or original is None or content is None:
+        new_lines = [] if content is None else split_lines(content)[0]
+        hunks = [Hunk(0, len(old_lines), new_lines)]
+
+    changes = _changes(old_lines, hunks)
+    if not changes:
+        return FileDiff("", 0, 0, False)
+
+    added = sum(len(change.lines) for change in changes)
+    removed = sum(change.end - change.start for change in changes)
+
+    output = [
+        "--- /dev/null" if original is None else f"--- {path}",
+        "+++ /dev/null" if content is None else f"+++ {path}"
+    ]
+    truncated = False
+    for group in _group(changes, context):
+        if len(output) >= max_lines:
+            truncated = True
+            break
+        output.extend(_format_group(group, old_lines, context))
+
+    if len(output) > max_lines:
+        output = output[:max_lines]
+        truncated = True
+
+    if truncated:
+        output.append(f"... diff truncated at {max_lines} lines (+{added} -{removed} in total)")
+    return FileDiff("\n".join(output) + "\n", added, removed, truncated)
+
+
+def _changes(old_lines: List[str], hunks: List[Hunk]) -> List[_Change]:
+    """Find the changed lines inside each hunk."""
+    changes: List[_Change] = []
+    shift = 0
+
+    for hunk in hunks:
+        old = old_lines[hunk.start:hunk.end]
+        new = hunk.lines
+        new_start = hunk.start + shift
+        shift += len(new) - len(old)
+
+        # Lines shared at both ends of a hunk are unchanged
+        prefix = 0
+        limit = min(len(old), len(new))
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+
+        old = old[prefix:len(old) - suffix]
+        new = new[prefix:len(new) - suffix]
+        a = hunk.start + prefix
+        b = new_start + prefix
+        if not old and not new:
+            continue
+
+        if len(old) > MAX_MATCH_LINES or len(new) > MAX_MATCH_LINES or not old or not new:
+            changes.append(_Change(a, a + len(old), b, new))
+            continue
+
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != "equal":
+                changes.append(_Change(a + i1, a + i2, b + j1, new[j1:j2]))
+
+    return changes
+
+
+def _group(changes: List[_Change], context: int) -> List[List[_Change]]:
+    """Group the changes whose context would overlap into one diff hunk."""
+    groups: List[List[_Change]] = []
+    for change in changes:
+        if groups and change.start - groups[-1][-1].end <= 2 * context:
+            groups[-1].append(change)
+        else:
+            groups.append([change])
+    return groups
+
+
+def _format_group(group: List[_Change], old_lines: List[str], context: int) -> List[str]:
+    """Format one diff hunk."""
+    first, last = group[0], group[-1]
+    old_start = max(0, first.start - context)
+    old_end = min(len(old_lines), last.end + context)
+    new_start = first.new_start - (first.start - old_start)
+    new_end = last.new_start + len(last.lines) + (old_end - last.end)
+
+    lines = [f"@@ -{_range(old_start, old_end)} +{_range(new_start, new_end)} @@"]
+    position = old_start
+    for change in group:
+        lines.extend(" " + line for line in old_lines[position:change.start])
+        lines.extend("-" + line for line in old_lines[change.start:change.end])
+        lines.extend("+" + line for line in change.lines)
+        position = change.end
+    lines.extend(" " + line for line in old_lines[position:old_end])
+    return lines
+
+
+def _range(start: int, end: int) -> str:
+    """Format the line range of a diff hunk header."""
+    length = end - start
+    if length == 1:
+        return str(start + 1)
+    # An empty range names the line before it
+    return f"{start + 1 if length else start},{length}"
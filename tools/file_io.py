@@ -0,0 +1,406 @@
+"""
+Non-blocking file I/O for the MCP server tools.
+
+Tools run inside the event loop, so a blocking read or write of a large file
+would stall every connected client. File operations are instead handed to a
+bounded thread pool shared by all tools.
+
+Tools that modify files take the lock of each path they touch from a shared
+registry, so concurrent edits of one file are serialized while unrelated files
+proceed in parallel, and write through a temporary file renamed into place, so
+a crash never leaves a file half-written.
+"""
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, TypeVar
+
+
+# Default number of threads doing file I/O, overridable with MCP_FILE_IO_WORKERS
+DEFAULT_FILE_IO_WORKERS = int(os.environ.get("MCP_FILE_IO_WORKERS", "8"))
+
+# Whether writes are flushed to disk before being renamed into place,
+# overridable with MCP_FSYNC_WRITES
+DEFAULT_FSYNC_WRITES = os.environ.get("MCP_FSYNC_WRITES", "").lower() in ("1", "true", "yes")
+
+# The process umask, applied to new files since temporary files are private
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+T = TypeVar("T")
+
+
+class FileIOExecutor:
+    """A bounded thread pool for file operations, with queue depth statistics."""
+
+    def __init__(self, max_workers: int = DEFAULT_FILE_IO_WORKERS):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers: Maximum number of file operations running at once
+        """
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="file-io"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._peak_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of operations waiting for a free thread."""
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        """Number of operations currently running."""
+        return self._running
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get statistics about the executor.
+
+        Returns:
+            The pool size, current queue depth, running and completed
+            operations, and the highest queue depth seen so far
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "peak_queue_depth": self._peak_queue_depth
+            }
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Run a blocking function in the pool.
+
+        Args:
+            function: The function to run
+            *args: The arguments of the function
+
+        Returns:
+            The return value of the function
+        """
+        with self._lock:
+            self._queued += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, self._queued)
+
+        future = self._executor.submit(self._call, function, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The operation never started, so it is no longer queued
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shut down the pool.
+
+        Args:
+            wait: If true, wait for the running operations to finish
+        """
+        self._executor.shutdown(wait=wait)
+
+    def _call(self, function: Callable[..., T], args: tuple) -> T:
+        """Run a function in a pool thread, keeping the counters up to date."""
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+
+_executor: Optional[FileIOExecutor] = None
+_fsync_writes = DEFAULT_FSYNC_WRITES
+
+# Locks of the paths being modified, dropped once no task holds or awaits them
+_path_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def get_file_executor() -> FileIOExecutor:
+    """
+    Get the executor shared by all tools, creating it if needed.
+
+    Returns:
+        The shared file I/O executor
+    """
+    global _executor
+    if _executor is None:
+        _executor = FileIOExecutor()
+    return _executor
+
+
+def configure_file_io(max_workers: int, fsync_writes: Optional[bool] = None) -> FileIOExecutor:
+    """
+    Replace the shared executor with one of the given size.
+
+    Args:
+        max_workers: Maximum number of file operations running at once
+        fsync_writes: If given, whether writes are flushed to disk before
+            being renamed into place
+
+    Returns:
+        The new shared file I/O executor
+    """
+    global _executor, _fsync_writes
+    previous = _executor
+    _executor = FileIOExecutor(max_workers)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    if fsync_writes is not None:
+        _fsync_writes = fsync_writes
+    return _executor
+
+
+def path_lock(path: str) -> asyncio.Lock:
+    """
+    Get the lock of a file.
+
+    All tools modifying a file hold its lock from the moment they read it to
+    the moment the new contents are in place. Paths are resolved first, so
+    every name of a file shares one lock.
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        The lock of the file
+    """
+    key = os.path.realpath(path)
+    lock = _path_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _path_locks[key] = lock
+    return lock
+
+
+@contextlib.asynccontextmanager
+async def lock_paths(paths: Iterable[str]) -> AsyncIterator[None]:
+    """
+    Hold the locks of several files.
+
+    The locks are taken in a fixed order, so two tasks locking overlapping
+    sets of files cannot deadlock.
+
+    Args:
+        paths: The paths of the files
+    """
+    keys = sorted({os.path.realpath(path) for path in paths})
+    async with contextlib.AsyncExitStack() as stack:
+        for key in keys:
+            await stack.enter_async_context(path_lock(key))
+        yield
+
+
+async def run_file_io(function: Callable[..., T], *args: Any) -> T:
+    """
+    Run a blocking file operation in the shared executor.
+
+    Args:
+        function: The function to run
+        *args: The arguments of the function
+
+    Returns:
+        The return value of the function
+    """
+    return await get_file_executor().run(function, *args)
+
+
+def read_text(path: str) -> str:
+    """
+    Read a whole text file.
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        The contents of the file, with undecodable bytes replaced and line
+        endings kept as they are
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        return f.read()
+
+
+def read_lines(path: str) -> List[str]:
+    """
+    Read the lines of a text file.
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        The lines of the file, with their line endings
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.readlines()
+
+
+def write_text(path: str, content: str):
+    """
+    Write a whole text file, without translating line endings.
+
+    Args:
+        path: The path of the file
+        content: The contents to write
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def atomic_write_text(path: str, content: str, fsync: Optional[bool] = None, overwrite: bool = True):
+    """
+    Write a whole text file atomically, without translating line endings.
+
+    The contents are written to a temporary file in the same directory, which
+    is then renamed over the target: readers see either the old or the new
+    contents, never a partial write. An existing file keeps its permissions.
+
+    Args:
+        path: The path of the file
+        content: The contents to write
+        fsync: Whether to flush the file and its directory to disk; defaults
+            to the setting of configure_file_io
+        overwrite: If false, fail if the file already exists
+
+    Raises:
+        FileExistsError: If overwrite is false and the file exists
+    """
+    if fsync is None:
+        fsync = _fsync_writes
+
+    temp_path = stage_text(path, content, fsync)
+    commit_staged(temp_path, path, fsync, overwrite)
+
+
+def stage_text(path: str, content: str, fsync: Optional[bool] = None) -> str:
+    """
+    Write the new contents of a file to a temporary file next to it.
+
+    Args:
+        path: The path of the file
+        content: The contents to write
+        fsync: Whether to flush the temporary file to disk; defaults to the
+            setting of configure_file_io
+
+    Returns:
+        The path of the temporary file, to pass to commit_staged or
+        discard_staged
+    """
+    if fsync is None:
+        fsync = _fsync_writes
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory
+    )
+
+    try:
+        with open(descriptor, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Temporary files are private; give the file the mode it will keep
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, mode)
+    except BaseException:
+        discard_staged(temp_path)
+        raise
+
+    return temp_path
+
+
+def commit_staged(temp_path: str, path: str, fsync: Optional[bool] = None, overwrite: bool = True):
+    """
+    Rename a temporary file from stage_text into place.
+
+    Args:
+        temp_path: The path of the temporary file
+        path: The path of the file
+        fsync: Whether to flush the directory entry to disk; defaults to the
+            setting of configure_file_io
+        overwrite: If false, fail if the file already exists
+
+    Raises:
+        FileExistsError: If overwrite is false and the file exists; the
+            temporary file is removed
+    """
+    if fsync is None:
+        fsync = _fsync_writes
+
+    try:
+        if overwrite:
+            os.replace(temp_path, path)
+        else:
+            _link_new(temp_path, path)
+    except BaseException:
+        discard_staged(temp_path)
+        raise
+
+    if fsync:
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def discard_staged(temp_path: str):
+    """
+    Remove a temporary file from stage_text, if it is still there.
+
+    Args:
+        temp_path: The path of the temporary file
+    """
+    try:
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def _link_new(temp_path: str, path: str):
+    """Move a temporary file to a path that must not exist yet."""
+    try:
+        # A hard link fails atomically if the target exists
+        os.link(temp_path, path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this file system: claim the name, then replace it
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        os.replace(temp_path, path)
+    else:
+        os.unlink(temp_path)
+
+
+def _fsync_directory(directory: str):
+    """Flush a directory entry to disk, where the platform allows it."""
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
@@ -0,0 +1,317 @@
+"""
+Transactional changes to several files.
+
+A transaction applies edits to existing files, creates new files and rewrites
+or deletes files as one unit. Every change is validated against the current
+contents of its file before anything is written; the new contents are then
+staged next to their files in parallel and renamed into place. If any step
+fails, the files that were already replaced get their original contents
+back, new files and directories are removed, and the tree is left as it was.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .edit_engine import EditError, Hunk, apply_edits, split_lines
+from .file_diff import MAX_DIFF_LINES, unified_diff
+from .file_io import (
+    atomic_write_text, commit_staged, discard_staged, lock_paths, read_text,
+    run_file_io, stage_text
+)
+from .utils import safe_path
+
+
+# Rewrites a file: takes its current contents (None if it does not exist)
+# and returns its new contents (None to delete it), or raises EditError
+Rewrite = Callable[[Optional[str]], Optional[str]]
+
+
+class FileChange(NamedTuple):
+    """A validated change to one file."""
+    path: str
+    original: Optional[str]
+    content: Optional[str]
+    hunks: Optional[List[Hunk]]
+
+    @property
+    def created(self) -> bool:
+        """Whether the change creates the file."""
+        return self.original is None
+
+    @property
+    def deleted(self) -> bool:
+        """Whether the change deletes the file."""
+        return self.content is None
+
+
+class TransactionError(Exception):
+    """A transaction that was not applied, with the error of each failing file."""
+
+    def __init__(self, message: str, errors: Dict[str, str]):
+        """
+        Initialize the error.
+
+        Args:
+            message: The description of the failure
+            errors: The error of each failing file, by path
+        """
+        super().__init__(message)
+        self.errors = errors
+
+
+class FileTransaction:
+    """A set of changes to files, applied all together or not at all."""
+
+    def __init__(self):
+        """Initialize an empty transaction."""
+        self._changes: List[Tuple[str, str, Any]] = []
+
+    def edit(self, path: str, code_edit: str):
+        """
+        Add an edit of an existing file.
+
+        Args:
+            path: The path of the file
+            code_edit: The code edit specification, as for edit_file
+        """
+        self._changes.append((safe_path(path), "edit", code_edit))
+
+    def create(self, path: str, content: str):
+        """
+        Add a new file.
+
+        Args:
+            path: The path of the file, which must not exist
+            content: The contents of the file
+        """
+        self._changes.append((safe_path(path), "create", content))
+
+    def rewrite(self, path: str, rewrite: Rewrite):
+        """
+        Add a change computed from the current contents of a file.
+
+        The file may or may not exist, and the change may delete it.
+
+        Args:
+            path: The path of the file
+            rewrite: The function computing the new contents of the file
+        """
+        self._changes.append((safe_path(path), "rewrite", rewrite))
+
+    @property
+    def paths(self) -> List[str]:
+        """The paths of all files changed by the transaction."""
+        return [path for path, _, _ in self._changes]
+
+    async def commit(self, on_commit: Optional[Callable[[List[FileChange]], Awaitable[None]]] = None) -> List[FileChange]:
+        """
+        Apply the transaction.
+
+        Args:
+            on_commit: Called with the changes once they are written, while the
+                files are still locked, so that they are journaled in the
+                order they were made
+
+        Returns:
+            The change made to each file, in the order they were added
+
+        Raises:
+            TransactionError: If a change is invalid or a write failed; no
+                file is left modified
+        """
+        errors = self._check_paths()
+        if errors:
+            raise TransactionError("Invalid files in transaction", errors)
+
+        # Hold the locks of every file until the transaction is done
+        async with lock_paths(self.paths):
+            changes = await self._validate()
+            await self._write(changes)
+            if on_commit is not None:
+                await on_commit(changes)
+
+        return changes
+
+    def _check_paths(self) -> Dict[str, str]:
+        """Check the paths of the transaction before touching any file."""
+        errors: Dict[str, str] = {}
+        seen = set()
+
+        for path in self.paths:
+            key = os.path.realpath(path)
+            if key in seen:
+                errors[path] = "File changed more than once in the same transaction"
+            seen.add(key)
+
+            if path.endswith(".ipynb"):
+                errors[path] = "Editing .ipynb files is not supported"
+
+        return errors
+
+    async def _validate(self) -> List[FileChange]:
+        """Compute the new contents of every file against their current contents."""
+        errors: Dict[str, str] = {}
+
+        async def validate(path: str, kind: str, payload: Any) -> Optional[FileChange]:
+            try:
+                if kind == "create":
+                    if os.path.exists(path):
+                        errors[path] = f"File already exists: {path}"
+                        return None
+                    return FileChange(path, None, payload, [Hunk(0, 0, split_lines(payload)[0])])
+
+                if kind == "edit" and not os.path.isfile(path):
+                    errors[path] = f"File not found: {path}"
+                    return None
+
+                original = await run_file_io(read_text, path) if os.path.isfile(path) else None
+
+                if kind == "edit":
+                    content, hunks = apply_edits(original, payload)
+                    return FileChange(path, original, content, hunks)
+
+                return FileChange(path, original, payload(original), None)
+
+            except EditError as e:
+                errors[path] = str(e)
+            except OSError as e:
+                errors[path] = f"Failed to read file: {str(e)}"
+            return None
+
+        changes = await asyncio.gather(*(
+            validate(path, kind, payload) for path, kind, payload in self._changes
+        ))
+
+        if errors:
+            raise TransactionError(f"{len(errors)} of {len(self._changes)} files cannot be changed", errors)
+
+        return list(changes)
+
+    async def _write(self, changes: List[FileChange]):
+        """Write every change, restoring the original tree if any write fails."""
+        created_directories: List[str] = []
+        staged: Dict[str, str] = {}
+        committed: List[FileChange] = []
+        errors: Dict[str, str] = {}
+
+        async def stage(change: FileChange):
+            if change.deleted:
+                return
+            try:
+                staged[change.path] = await run_file_io(stage_text, change.path, change.content)
+            except OSError as e:
+                errors[change.path] = f"Failed to write file: {str(e)}"
+
+        async def commit(change: FileChange):
+            try:
+                if change.deleted:
+                    await run_file_io(_remove_file, change.path)
+                else:
+                    await run_file_io(
+                        commit_staged, staged.pop(change.path), change.path, None, not change.created
+                    )
+                committed.append(change)
+            except OSError as e:
+                errors[change.path] = f"Failed to write file: {str(e)}"
+
+        try:
+            # Parent directories of new files are created once each
+            for change in changes:
+                if change.created and not change.deleted:
+                    created_directories.extend(await run_file_io(_make_directories, change.path))
+
+            await asyncio.gather(*(stage(change) for change in changes))
+            if not errors:
+                await asyncio.gather(*(commit(change) for change in changes))
+
+            if errors:
+                raise TransactionError(
+                    f"{len(errors)} of {len(changes)} files could not be written; no file was changed",
+                    errors
+                )
+
+        except BaseException:
+            await self._rollback(committed, staged, created_directories)
+            raise
+
+    async def _rollback(self, committed: List[FileChange], staged: Dict[str, str], created_directories: List[str]):
+        """Undo the writes of a failed transaction."""
+        for temp_path in staged.values():
+            await run_file_io(discard_staged, temp_path)
+
+        for change in committed:
+            if change.created:
+                await run_file_io(_remove_file, change.path)
+            else:
+                await run_file_io(atomic_write_text, change.path, change.original)
+
+        # Remove the directories created for new files, deepest first
+        for directory in reversed(created_directories):
+            await run_file_io(_remove_directory, directory)
+
+
+def _make_directories(path: str) -> List[str]:
+    """Create the missing parent directories of a file, returning them outermost first."""
+    missing = []
+    directory = os.path.dirname(path)
+    while directory and not os.path.isdir(directory):
+        missing.append(directory)
+        directory = os.path.dirname(directory)
+
+    for directory in reversed(missing):
+        os.makedirs(directory, exist_ok=True)
+
+    return list(reversed(missing))
+
+
+def _remove_file(path: str):
+    """Remove a file if it exists."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_directory(path: str):
+    """Remove a directory if it exists and is empty."""
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def describe_changes(changes: List[FileChange], max_diff_lines: int = MAX_DIFF_LINES) -> List[Dict[str, Any]]:
+    """
+    Describe the changes of a committed transaction.
+
+    Args:
+        changes: The changes returned by FileTransaction.commit
+        max_diff_lines: Largest number of diff lines across all files
+
+    Returns:
+        One entry per file, with its path, whether it was created, edited or
+        deleted, and the unified diff of each edited file
+    """
+    descriptions = []
+    budget = max_diff_lines
+
+    for change in changes:
+        description: Dict[str, Any] = {
+            "file_path": change.path,
+            "action": "deleted" if change.deleted else "created" if change.created else "edited"
+        }
+
+        if not change.created and not change.deleted:
+            diff = unified_diff(change.path, change.original, change.content, change.hunks, max_lines=max(budget, 0))
+            budget -= diff.text.count("\n")
+            description.update({
+                "diff": diff.text,
+                "lines_added": diff.added,
+                "lines_removed": diff.removed
+            })
+            if diff.truncated:
+                description["diff_truncated"] = True
+
+        descriptions.append(description)
+
+    return descriptions
@@ -0,0 +1,473 @@
+"""
+Undo journal for the tools that modify files.
+
+Every change made by edit_file, edit_files and write_to_file is recorded in an
+append-only log as a pair of line deltas: the forward delta turns the old
+contents into the new ones and the reverse delta turns them back. A delta only
+holds the lines of the regions that changed, so an entry costs about the size
+of the diff rather than the size of the files. A created file is only recorded
+by its hash: its contents are saved when the creation is undone, for a redo to
+write them back.
+
+An edit is undone by applying its reverse deltas and redone by applying its
+forward deltas again, to all of its files as one transaction. Both check the
+content hash of each file first, so an edit whose files have changed since
+cannot be undone until the later edits are. When the log outgrows its size
+limit, the oldest entries are dropped and the log is compacted.
+
+Every server on the machine shares the journal in the home directory by
+default. The log is locked between processes, and edit IDs are allocated
+while it is locked, so servers never hand out the same ID.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import serialization
+from .edit_engine import EditError, Hunk
+from .file_io import read_text, run_file_io
+from .file_transaction import FileChange, FileTransaction
+from .log_store import LogStore
+
+
+logger = logging.getLogger(__name__)
+
+# Directory of the journal, in the home directory rather than wherever the
+# server is started, overridable with MCP_JOURNAL_DIR
+DEFAULT_JOURNAL_DIR = os.environ.get("MCP_JOURNAL_DIR", os.path.join(os.path.expanduser("~"), ".mcp_journal"))
+
+# Size of the journal log above which the oldest entries are dropped,
+# overridable with MCP_JOURNAL_MAX_MB
+DEFAULT_JOURNAL_MAX_BYTES = int(os.environ.get("MCP_JOURNAL_MAX_MB", "64")) * 1024 * 1024
+
+# A line delta: (start, end, lines) replacing lines [start, end)
+Delta = List[Tuple[int, int, List[str]]]
+
+APPLIED = "applied"
+UNDONE = "undone"
+
+
+class JournalError(Exception):
+    """An undo or redo that cannot be performed."""
+
+
+def content_hash(content: Optional[str]) -> Optional[str]:
+    """
+    Hash the contents of a file.
+
+    Args:
+        content: The contents, or None for a missing file
+
+    Returns:
+        The SHA-1 of the contents, or None for a missing file
+    """
+    if content is None:
+        return None
+    return hashlib.sha1(content.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def make_deltas(original: Optional[str], content: Optional[str], hunks: Optional[List[Hunk]]) -> Tuple[Optional[Delta], Optional[Delta]]:
+    """
+    Compute the forward and reverse deltas of a change.
+
+    Deltas work on the contents split on \\n, so they reproduce the contents
+    exactly, line endings included. The hunks of the edit engine give the
+    changed regions; without them, or if they do not reproduce the new
+    contents, the whole file is one region. The lines a region shares at
+    both ends are left out, so a delta only holds the lines that changed.
+
+    Args:
+        original: The contents before the change, or None if the file did not exist
+        content: The contents after the change, or None if the file was deleted
+        hunks: The hunks applied by the change, if known
+
+    Returns:
+        The forward and reverse deltas; a delta of None deletes the file
+    """
+    old_lines = [] if original is None else original.split("\n")
+    new_lines = [] if content is None else content.split("\n")
+
+    # Regions as (old start, old end, new start, new end)
+    regions = [(0, len(old_lines), 0, len(new_lines))]
+    if hunks is not None and original is not None and content is not None:
+        shift = 0
+        regions = []
+        for hunk in hunks:
+            start = hunk.start + shift
+            regions.append((hunk.start, hunk.end, start, start + len(hunk.lines)))
+            shift += len(hunk.lines) - (hunk.end - hunk.start)
+
+    forward, reverse = _region_deltas(old_lines, new_lines, regions)
+    if _apply_lines(old_lines, forward) != new_lines:
+        forward, reverse = _region_deltas(old_lines, new_lines, [(0, len(old_lines), 0, len(new_lines))])
+
+    return (
+        None if content is None else forward,
+        None if original is None else reverse
+    )
+
+
+def _region_deltas(old_lines: List[str], new_lines: List[str], regions: List[Tuple[int, int, int, int]]) -> Tuple[Delta, Delta]:
+    """Build the forward and reverse deltas of changed regions, trimming their unchanged ends."""
+    forward: Delta = []
+    reverse: Delta = []
+    for old_start, old_end, new_start, new_end in regions:
+        # Lines shared at both ends of a region are unchanged
+        limit = min(old_end - old_start, new_end - new_start)
+        prefix = 0
+        while prefix < limit and old_lines[old_start + prefix] == new_lines[new_start + prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_lines[old_end - 1 - suffix] == new_lines[new_end - 1 - suffix]:
+            suffix += 1
+
+        old_start += prefix
+        new_start += prefix
+        old_end -= suffix
+        new_end -= suffix
+        if old_start == old_end and new_start == new_end:
+            continue
+
+        forward.append((old_start, old_end, new_lines[new_start:new_end]))
+        reverse.append((new_start, new_end, old_lines[old_start:old_end]))
+    return forward, reverse
+
+
+def apply_delta(content: Optional[str], delta: Optional[Delta]) -> Optional[str]:
+    """
+    Apply a delta to the contents of a file.
+
+    Args:
+        content: The current contents, or None if the file does not exist
+        delta: The delta, or None to delete the file
+
+    Returns:
+        The new contents, or None if the file is deleted
+    """
+    if delta is None:
+        return None
+    lines = [] if content is None else content.split("\n")
+    return "\n".join(_apply_lines(lines, delta))
+
+
+def _apply_lines(lines: List[str], delta: Delta) -> List[str]:
+    """Splice the regions of a delta into lines."""
+    result: List[str] = []
+    position = 0
+    for start, end, replacement in delta:
+        result.extend(lines[position:start])
+        result.extend(replacement)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
+class EditJournal:
+    """An on-disk journal of file changes, with undo and redo by edit ID."""
+
+    def __init__(self, directory: str = DEFAULT_JOURNAL_DIR, max_bytes: int = DEFAULT_JOURNAL_MAX_BYTES):
+        """
+        Open a journal.
+
+        Args:
+            directory: The directory of the journal log
+            max_bytes: Size of the log above which the oldest entries are dropped
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._store = LogStore(os.path.join(directory, "edits.log"))
+        self._lock = threading.Lock()
+
+        # Edit IDs are numbered in order, across restarts and servers
+        numbers = [_edit_number(key) for key in self._edit_ids()]
+        self._next_number = max(numbers, default=0) + 1
+
+    def record(self, tool: str, changes: List[FileChange]) -> str:
+        """
+        Record a change made by a tool.
+
+        This does blocking I/O and should be run off the event loop.
+
+        Args:
+            tool: The name of the tool that made the change
+            changes: The change made to each file
+
+        Returns:
+            The ID of the edit
+        """
+        files = []
+        for change in changes:
+            if change.original is None:
+                # The contents of a created file are only kept once it is undone
+                forward, reverse = None, None
+            else:
+                forward, reverse = make_deltas(change.original, change.content, change.hunks)
+            files.append({
+                # Absolute, so that undo works whatever the working directory
+                "path": os.path.abspath(change.path),
+                "before": content_hash(change.original),
+                "after": content_hash(change.content),
+                "forward": forward,
+                "reverse": reverse
+            })
+
+        with self._lock, self._store.locked():
+            # Other servers may share the journal, so the next number is
+            # taken from the log while it is locked
+            numbers = [_edit_number(key) for key in self._edit_ids()]
+            self._next_number = max(self._next_number, max(numbers, default=0) + 1)
+            edit_id = f"edit_{self._next_number}"
+            self._next_number += 1
+
+            entry = {"id": edit_id, "tool": tool, "time": time.time(), "files": files}
+            self._store.put(edit_id, serialization.dumps_bytes(entry))
+            self._compact_if_needed()
+
+        return edit_id
+
+    def entry(self, edit_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an entry of the journal.
+
+        Args:
+            edit_id: The ID of the edit
+
+        Returns:
+            The entry, or None if it is not in the journal
+        """
+        data = self._store.get(edit_id)
+        return None if data is None else serialization.loads(data)
+
+    def state(self, edit_id: str) -> str:
+        """
+        Get whether an edit is applied or undone.
+
+        Args:
+            edit_id: The ID of the edit
+
+        Returns:
+            APPLIED or UNDONE
+        """
+        state = self._store.get(f"{edit_id}/state")
+        return APPLIED if state is None else state.decode("utf-8")
+
+    def history(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        List the most recent edits, newest first.
+
+        Args:
+            limit: Maximum number of edits to list
+
+        Returns:
+            The ID, tool, time, state and files of each edit
+        """
+        edit_ids = sorted(self._edit_ids(), key=_edit_number, reverse=True)[:limit]
+
+        summaries = []
+        for edit_id in edit_ids:
+            entry = self.entry(edit_id)
+            if entry is None:
+                continue
+            summaries.append({
+                "edit_id": edit_id,
+                "tool": entry["tool"],
+                "time": entry["time"],
+                "state": self.state(edit_id),
+                "files": [file["path"] for file in entry["files"]]
+            })
+        return summaries
+
+    async def undo(self, edit_id: str) -> List[FileChange]:
+        """
+        Undo an edit, restoring the files it changed.
+
+        Args:
+            edit_id: The ID of the edit
+
+        Returns:
+            The change made to each file
+
+        Raises:
+            JournalError: If the edit is unknown or already undone
+            TransactionError: If a file has changed since the edit
+        """
+        return await self._replay(edit_id, undo=True)
+
+    async def redo(self, edit_id: str) -> List[FileChange]:
+        """
+        Redo an undone edit.
+
+        Args:
+            edit_id: The ID of the edit
+
+        Returns:
+            The change made to each file
+
+        Raises:
+            JournalError: If the edit is unknown or not undone
+            TransactionError: If a file has changed since the undo
+        """
+        return await self._replay(edit_id, undo=False)
+
+    async def _replay(self, edit_id: str, undo: bool) -> List[FileChange]:
+        """Apply the reverse or forward deltas of an edit as one transaction."""
+        entry = await run_file_io(self.entry, edit_id)
+        if entry is None:
+            raise JournalError(f"Unknown edit: {edit_id}")
+
+        state = await run_file_io(self.state, edit_id)
+        if undo and state == UNDONE:
+            raise JournalError(f"Edit {edit_id} is already undone")
+        if not undo and state == APPLIED:
+            raise JournalError(f"Edit {edit_id} is not undone")
+
+        # Created files whose contents the entry does not hold
+        created = [file for file in entry["files"] if file["after"] is not None and file["forward"] is None]
+        if undo and created:
+            # Save the contents of the created files before deleting them; the
+            # transaction checks that they are still what the edit wrote
+            contents = await run_file_io(_read_created, created)
+            await run_file_io(self._store.put, f"{edit_id}/created", serialization.dumps_bytes(contents))
+        elif created:
+            data = await run_file_io(self._store.get, f"{edit_id}/created")
+            contents = {} if data is None else serialization.loads(data)
+            for file in created:
+                if contents.get(file["path"]) is None:
+                    raise JournalError(f"Journal entry of edit {edit_id} is missing the contents of {file['path']}")
+                file["forward"] = [(0, 0, contents[file["path"]].split("\n"))]
+
+        transaction = FileTransaction()
+        for file in entry["files"]:
+            if undo:
+                transaction.rewrite(file["path"], _replayer(edit_id, file["after"], file["before"], file["reverse"]))
+            else:
+                transaction.rewrite(file["path"], _replayer(edit_id, file["before"], file["after"], file["forward"]))
+
+        records = [(f"{edit_id}/state", (UNDONE if undo else APPLIED).encode("utf-8"))]
+        if created and not undo:
+            records.append((f"{edit_id}/created", None))
+
+        # The new state is recorded before the files are unlocked
+        async def mark(changes: List[FileChange]):
+            await run_file_io(self._store.write_batch, records)
+
+        return await transaction.commit(mark)
+
+    def _edit_ids(self) -> List[str]:
+        """List the IDs of the edits in the journal."""
+        return [key for key in self._store.keys() if "/" not in key]
+
+    def _compact_if_needed(self):
+        """Drop the oldest entries and compact the log once it is too large."""
+        if self._store.size <= self.max_bytes:
+            return
+
+        # Keep the newest entries filling up to half of the limit
+        dropped = []
+        live_bytes = self._store.live_bytes
+        edit_ids = sorted(self._edit_ids(), key=_edit_number)
+        for edit_id in edit_ids[:-1]:
+            if live_bytes <= self.max_bytes // 2:
+                break
+            data = self._store.get(edit_id)
+            live_bytes -= len(data or b"") + len(self._store.get(f"{edit_id}/created") or b"")
+            dropped.extend([edit_id, f"{edit_id}/state", f"{edit_id}/created"])
+
+        logger.info(f"Compacting edit journal, dropping {len(dropped) // 3} oldest edits")
+        self._store.compact(drop=dropped)
+
+
+def _replayer(edit_id: str, expected: Optional[str], target: Optional[str], delta: Optional[Delta]):
+    """Build the rewrite of one file for an undo or redo."""
+    def rewrite(content: Optional[str]) -> Optional[str]:
+        if content_hash(content) != expected:
+            raise EditError(f"File has changed since edit {edit_id}; undo the later edits of this file first")
+        result = apply_delta(content, delta)
+        if content_hash(result) != target:
+            raise EditError(f"Journal entry of edit {edit_id} does not reproduce the file")
+        return result
+
+    return rewrite
+
+
+def _read_created(files: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """Read the current contents of the files created by an edit, by path."""
+    contents: Dict[str, Optional[str]] = {}
+    for file in files:
+        try:
+            contents[file["path"]] = read_text(file["path"])
+        except OSError:
+            contents[file["path"]] = None
+    return contents
+
+
+def _edit_number(edit_id: str) -> int:
+    """Get the sequence number of an edit ID."""
+    try:
+        return int(edit_id.split("/")[0].rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+_journal: Optional[EditJournal] = None
+_journal_lock = threading.Lock()
+_journal_dir = DEFAULT_JOURNAL_DIR
+_journal_max_bytes = DEFAULT_JOURNAL_MAX_BYTES
+
+
+def get_journal() -> EditJournal:
+    """
+    Get the journal shared by all tools, opening it if needed.
+
+    Opening the journal reads its log, so the first call should be made off
+    the event loop.
+
+    Returns:
+        The shared edit journal
+    """
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = EditJournal(_journal_dir, _journal_max_bytes)
+        return _journal
+
+
+def configure_journal(directory: str = DEFAULT_JOURNAL_DIR, max_bytes: int = DEFAULT_JOURNAL_MAX_BYTES):
+    """
+    Set where the shared journal is kept and how large it may grow.
+
+    The journal is opened on first use.
+
+    Args:
+        directory: The directory of the journal log
+        max_bytes: Size of the log above which the oldest entries are dropped
+    """
+    global _journal, _journal_dir, _journal_max_bytes
+    with _journal_lock:
+        _journal_dir = directory
+        _journal_max_bytes = max_bytes
+        _journal = None
+
+
+async def record_changes(tool: str, changes: List[FileChange]) -> Optional[str]:
+    """
+    Record a change in the shared journal, off the event loop.
+
+    A failure to record is logged rather than raised: the files have already
+    been changed at this point.
+
+    Args:
+        tool: The name of the tool that made the change
+        changes: The change made to each file
+
+    Returns:
+        The ID of the edit, or None if it could not be recorded
+    """
+    try:
+        return await run_file_io(lambda: get_journal().record(tool, changes))
+    except Exception as e:
+        logger.warning(f"Failed to record {tool} change in the edit journal: {str(e)}")
+        return None
@@ -0,0 +1,76 @@
+"""
+Kill Command Tool implementation.
+"""
+from typing import Dict, Any
+from .base_tool import BaseTool
+from .command_manager import get_command_manager
+
+
+class KillCommandTool(BaseTool):
+    """Tool to kill a command started by run_command."""
+    
+    def __init__(self):
+        """Initialize the kill command tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "CommandId": {
+              "type": "string",
+              "description": "The ID of the command, as returned by run_command."
+            },
+            "Force": {
+              "type": "boolean",
+              "description": "Kill the processes at once with SIGKILL, instead of asking them to exit with SIGTERM first. Defaults to false."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["CommandId"]
+        }
+        """
+        
+        description = (
+            "Stop a non-blocking command started with run_command, such as a dev server that is no longer needed. "
+            "Every process the command started is stopped with it. The processes are asked to exit first and "
+            "killed if they have not exited after a few seconds, unless Force is set. A command still queued is "
+            "cancelled and never started."
+        )
+        
+        super().__init__("kill_command", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the kill command tool.
+        
+        Args:
+            params: The parameters for the tool
+            
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        command_id = params.get("CommandId", "")
+        force = params.get("Force", False)
+        
+        command = get_command_manager().get(command_id)
+        if command is None:
+            return {"error": f"Command not found: {command_id}"}
+        
+        try:
+            killed = await command.kill(force=force)
+        except Exception as e:
+            return {"error": f"Failed to kill command: {str(e)}"}
+        
+        result = command.to_dict()
+        if killed and command.cancelled:
+            result["message"] = f"Command {command_id} cancelled before it started"
+        elif killed:
+            result["message"] = f"Command {command_id} killed with {command.killed_with}"
+        else:
+            result["message"] = f"Command {command_id} had already finished"
+        return result
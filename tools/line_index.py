@@ -0,0 +1,274 @@
+"""
+Line-offset index for reading line ranges out of large files.
+
+Indexing a file records the byte offset of every LINE_STRIDE-th line. A range
+read then maps the file, jumps to the nearest recorded line and scans at most
+LINE_STRIDE - 1 lines to reach the start of the range, so its cost is roughly
+the size of the range rather than the size of the file. Indexes are cached
+per file and rebuilt when the file's modification time or size changes.
+"""
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+# A byte offset is recorded every LINE_STRIDE lines
+LINE_STRIDE = 64
+
+# Maximum number of file indexes kept in the cache
+DEFAULT_CACHE_SIZE = 128
+
+# Matches LINE_STRIDE complete lines; each match ends where a recorded line starts
+_STRIDE = re.compile(rb"(?:[^\n]*\n){%d}" % LINE_STRIDE)
+
+
+class LineIndex:
+    """Sparse line-offset index of one version of a file."""
+
+    def __init__(self, path: str, mtime_ns: int, size: int, offsets: array, total_lines: int):
+        """
+        Initialize a line index.
+
+        Args:
+            path: The path of the file
+            mtime_ns: The modification time of the indexed version
+            size: The size in bytes of the indexed version
+            offsets: The byte offset of every LINE_STRIDE-th line
+            total_lines: The number of lines in the file
+        """
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets
+        self.total_lines = total_lines
+
+    @classmethod
+    def build(cls, path: str) -> "LineIndex":
+        """
+        Index a file.
+
+        Args:
+            path: The path of the file
+
+        Returns:
+            The index of the current version of the file
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            offsets = array("q", [0])
+
+            if stat.st_size == 0:
+                return cls(path, stat.st_mtime_ns, 0, offsets, 0)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                size = len(mapped)
+                offsets.extend(match.end() for match in _STRIDE.finditer(mapped))
+
+                # The last recorded offset may be the end of the file itself
+                if offsets[-1] == size and len(offsets) > 1:
+                    offsets.pop()
+                    total_lines = len(offsets) * LINE_STRIDE
+                else:
+                    tail = mapped[offsets[-1]:]
+                    total_lines = (len(offsets) - 1) * LINE_STRIDE + tail.count(b"\n")
+                    if tail and not tail.endswith(b"\n"):
+                        total_lines += 1
+
+        return cls(path, stat.st_mtime_ns, size, offsets, total_lines)
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        """
+        Check whether the index still matches the file.
+
+        Args:
+            stat: The current status of the file
+
+        Returns:
+            True if the file has not changed since it was indexed
+        """
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def read_range(self, start_line: int, end_line: int) -> Optional[str]:
+        """
+        Read a range of lines.
+
+        Args:
+            start_line: The first line to read, 0-indexed
+            end_line: The last line to read, inclusive
+
+        Returns:
+            The text of the lines, with line endings normalized to \\n, or
+            None if the file has changed since it was indexed
+        """
+        contents = self.read_ranges([(start_line, end_line)])
+        return None if contents is None else contents[0]
+
+    def read_ranges(self, ranges: List[Tuple[int, int]]) -> Optional[List[str]]:
+        """
+        Read several ranges of lines, mapping the file once.
+
+        Args:
+            ranges: (start_line, end_line) pairs, 0-indexed and inclusive
+
+        Returns:
+            The text of each range, with line endings normalized to \\n, or
+            None if the file has changed since it was indexed
+        """
+        if self.total_lines == 0:
+            return ["" for _ in ranges]
+
+        contents = []
+        with open(self.path, "rb") as f:
+            if not self.is_current(os.fstat(f.fileno())):
+                return None
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start_line, end_line in ranges:
+                    if end_line < start_line:
+                        contents.append("")
+                        continue
+                    start = self._line_offset(mapped, start_line)
+                    end = self._skip_lines(mapped, start, end_line - start_line + 1)
+                    contents.append(mapped[start:end].decode("utf-8", errors="replace").replace("\r\n", "\n"))
+
+        return contents
+
+    def _line_offset(self, mapped: mmap.mmap, line: int) -> int:
+        """Get the byte offset of the start of a line."""
+        stride, remainder = divmod(line, LINE_STRIDE)
+        return self._skip_lines(mapped, self.offsets[stride], remainder)
+
+    def _skip_lines(self, mapped: mmap.mmap, offset: int, count: int) -> int:
+        """Get the offset count lines after offset, stopping at the end of the file."""
+        for _ in range(count):
+            newline = mapped.find(b"\n", offset)
+            if newline == -1:
+                return len(mapped)
+            offset = newline + 1
+        return offset
+
+
+class LineIndexCache:
+    """LRU cache of line indexes, invalidated by modification time and size."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of files kept in the cache
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> LineIndex:
+        """
+        Get the index of a file, building it if it is missing or stale.
+
+        This does blocking I/O and should be run off the event loop.
+
+        Args:
+            path: The path of the file
+
+        Returns:
+            The index of the current version of the file
+        """
+        key = os.path.realpath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None and index.is_current(stat):
+                self._entries.move_to_end(key)
+                return index
+
+        index = LineIndex.build(key)
+
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return index
+
+    def invalidate(self, path: str):
+        """
+        Drop the index of a file.
+
+        Args:
+            path: The path of the file
+        """
+        with self._lock:
+            self._entries.pop(os.path.realpath(path), None)
+
+
+_cache = LineIndexCache()
+
+
+def get_line_index(path: str) -> LineIndex:
+    """
+    Get the index of a file from the shared cache.
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        The index of the current version of the file
+    """
+    return _cache.get(path)
+
+
+def read_line_range(path: str, start_line: int, end_line: int) -> Tuple[str, int, int, int]:
+    """
+    Read a range of lines, clamped to the bounds of the file.
+
+    Args:
+        path: The path of the file
+        start_line: The first line to read, 0-indexed
+        end_line: The last line to read, inclusive
+
+    Returns:
+        A tuple of (content, total_lines, start_line, end_line), with the
+        line numbers adjusted to be within bounds
+    """
+    ranges, total_lines = read_line_ranges(path, [(start_line, end_line)])
+    content, start, end = ranges[0]
+    return content, total_lines, start, end
+
+
+def read_line_ranges(path: str, ranges: List[Tuple[int, int]]) -> Tuple[List[Tuple[str, int, int]], int]:
+    """
+    Read several ranges of lines from one version of a file.
+
+    Args:
+        path: The path of the file
+        ranges: (start_line, end_line) pairs, 0-indexed and inclusive
+
+    Returns:
+        A tuple of ([(content, start_line, end_line), ...], total_lines),
+        with the line numbers of each range adjusted to be within bounds
+    """
+    while True:
+        index = get_line_index(path)
+        total_lines = index.total_lines
+
+        clamped = [
+            (max(0, min(start_line, total_lines - 1)), max(0, min(end_line, total_lines - 1)))
+            for start_line, end_line in ranges
+        ]
+
+        contents = index.read_ranges(clamped)
+        if contents is not None:
+            return [
+                (content, start, end)
+                for content, (start, end) in zip(contents, clamped)
+            ], total_lines
+
+        # The file changed after it was indexed; index it again
+        _cache.invalidate(path)
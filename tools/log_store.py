@@ -0,0 +1,436 @@
+"""
+Append-only, log-structured key-value store.
+
+Every put or delete appends one record to a log file; an in-memory index maps
+each live key to the position of its latest value, so a read is one
+positioned read of the file. Overwritten and deleted values stay in the log
+as garbage until compaction copies the live records to a new log and swaps
+it in.
+
+Each record is framed as:
+
+    length (uint32) | crc32 (uint32) | key length (uint16) | kind (uint8) | key | value
+
+with the CRC covering everything after it. When the store is opened, the log
+is scanned and a record cut short by a crash, or failing its CRC, ends the
+log: it and anything after it are truncated away.
+
+Several processes may open the same log. Every access takes an flock on a
+lock file next to it, then catches up with what the other processes did:
+records they appended are indexed, and a log they compacted is reopened and
+scanned again. Without fcntl, on Windows, a log must only be opened by one
+process.
+"""
+import contextlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+_FRAME = struct.Struct("<II")
+_HEADER = struct.Struct("<HB")
+
+_PUT = 0
+_DELETE = 1
+
+# Largest record accepted when reading a log, to reject corrupt lengths early
+MAX_RECORD_SIZE = 1 << 30
+
+# Largest key, in bytes of UTF-8
+MAX_KEY_SIZE = 0xFFFF
+
+
+class _Entry(NamedTuple):
+    """The position of a live value in the log."""
+    value_offset: int
+    value_length: int
+    record_length: int
+
+
+class LogStore:
+    """A key-value store backed by an append-only log file."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Open a store, creating its log if needed and recovering from a torn tail.
+
+        Args:
+            path: The path of the log file
+            fsync: Whether to flush every record to disk before returning
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._index: Dict[str, _Entry] = {}
+        self._live_bytes = 0
+        self._size = 0
+        self._file = None
+        self._lock_depth = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # The lock file is never replaced, unlike the log when it is compacted
+        self._lock_file = open(f"{path}.lock", "ab")
+
+        # Taking the lock opens the log, recovering it from a torn tail
+        with self.locked():
+            pass
+
+    @property
+    def size(self) -> int:
+        """Size of the log file in bytes."""
+        return self._size
+
+    @property
+    def live_bytes(self) -> int:
+        """Bytes of the log taken by live records."""
+        return self._live_bytes
+
+    @property
+    def garbage_bytes(self) -> int:
+        """Bytes of the log taken by overwritten and deleted records."""
+        return self._size - self._live_bytes
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        with self.locked():
+            return key in self._index
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Hold the log against other threads and processes, up to date with their writes.
+
+        Nested uses only lock and catch up once. Reads and writes take the
+        lock themselves; hold it around several of them to make them atomic.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                self._flock(True)
+                try:
+                    self._catch_up()
+                except BaseException:
+                    self._flock(False)
+                    raise
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._flock(False)
+
+    def keys(self) -> List[str]:
+        """
+        Get the live keys, in the order they were last written.
+
+        Returns:
+            The keys of the store
+        """
+        with self.locked():
+            return list(self._index)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read the value of a key.
+
+        Args:
+            key: The key
+
+        Returns:
+            The value, or None if the key does not exist
+        """
+        with self.locked():
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            return os.pread(self._file.fileno(), entry.value_length, entry.value_offset)
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Iterate over the live keys and values, in the order they were last written.
+
+        Returns:
+            An iterator of (key, value) pairs
+        """
+        for key in self.keys():
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+
+    def put(self, key: str, value: bytes):
+        """
+        Set the value of a key.
+
+        Args:
+            key: The key
+            value: The value
+        """
+        self.write_batch([(key, value)])
+
+    def delete(self, key: str) -> bool:
+        """
+        Delete a key.
+
+        Args:
+            key: The key
+
+        Returns:
+            True if the key existed
+        """
+        with self.locked():
+            if key not in self._index:
+                return False
+            self.write_batch([(key, None)])
+            return True
+
+    def write_batch(self, records: Iterable[Tuple[str, Optional[bytes]]]):
+        """
+        Append several puts and deletes with a single write.
+
+        Args:
+            records: (key, value) pairs; a value of None deletes the key
+
+        Raises:
+            ValueError: If a key is longer than MAX_KEY_SIZE bytes
+        """
+        frames = []
+        for key, value in records:
+            frames.append((key, value, _encode(key, value)))
+
+        with self.locked():
+            offset = self._size
+            self._file.write(b"".join(frame for _, _, frame in frames))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+            for key, value, frame in frames:
+                self._apply(key, value, offset, len(frame))
+                offset += len(frame)
+            self._size = offset
+
+    def compact(self, drop: Iterable[str] = ()):
+        """
+        Rewrite the log with only the live records.
+
+        Reads and writes keep working while the live records are copied;
+        records appended meanwhile are carried over before the new log is
+        swapped in. If another process compacts the log first, this
+        compaction is given up.
+
+        Args:
+            drop: Keys to delete as part of the compaction
+        """
+        dropped = set(drop)
+        temp_path = f"{self.path}.compact"
+
+        # Snapshot the index; the records it points to never change
+        with self.locked():
+            snapshot = list(self._index.items())
+            snapshot_size = self._size
+            source = os.dup(self._file.fileno())
+        source_inode = os.fstat(source).st_ino
+
+        try:
+            with open(temp_path, "wb") as out:
+                index: Dict[str, _Entry] = {}
+                offset = 0
+                for key, entry in snapshot:
+                    if key in dropped:
+                        continue
+                    start = entry.value_offset + entry.value_length - entry.record_length
+                    out.write(os.pread(source, entry.record_length, start))
+                    index[key] = _Entry(
+                        offset + entry.record_length - entry.value_length,
+                        entry.value_length,
+                        entry.record_length
+                    )
+                    offset += entry.record_length
+
+                with self.locked():
+                    if os.fstat(self._file.fileno()).st_ino != source_inode:
+                        # Another process compacted the log meanwhile
+                        out.close()
+                        os.unlink(temp_path)
+                        return
+
+                    # Carry over the records appended since the snapshot
+                    tail = os.pread(source, self._size - snapshot_size, snapshot_size)
+                    out.write(tail)
+                    out.flush()
+                    os.fsync(out.fileno())
+
+                    self._index = index
+                    self._live_bytes = offset
+                    self._size = offset
+                    self._index_records(_scan(tail, 0)[0], base=offset)
+
+                    os.replace(temp_path, self.path)
+                    self._file.close()
+                    self._file = open(self.path, "ab+")
+
+                    # Keys written again after the snapshot are dropped too
+                    rewritten = [(key, None) for key in dropped if key in self._index]
+                    if rewritten:
+                        self.write_batch(rewritten)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        finally:
+            os.close(source)
+
+    def sync(self):
+        """Flush the records written so far to disk."""
+        with self._lock:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the log file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._lock_file.close()
+
+    def _flock(self, exclusive: bool):
+        """Take or release the lock shared with other processes."""
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """Index what other processes appended to the log, or reopen it if they replaced it."""
+        if self._file is not None:
+            opened = os.fstat(self._file.fileno())
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                if opened.st_size == self._size:
+                    return
+                if opened.st_size > self._size:
+                    tail = os.pread(self._file.fileno(), opened.st_size - self._size, self._size)
+                    records, valid_length = _scan(tail, 0)
+                    self._index_records(records, base=self._size)
+                    # Writers hold the lock, so a record cut short was torn
+                    # by a process that died while writing it
+                    if valid_length < len(tail):
+                        os.ftruncate(self._file.fileno(), self._size)
+                    return
+
+            # The log was compacted, or truncated, by another process
+            self._file.close()
+            self._file = None
+
+        self._index = {}
+        self._live_bytes = 0
+        self._open()
+
+    def _open(self):
+        """Open the log and rebuild the index from it."""
+        with open(self.path, "ab+") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    records, valid_length = _scan(data, 0)
+            else:
+                records, valid_length = [], 0
+
+            # A torn or corrupt record ends the log
+            if valid_length < size:
+                f.truncate(valid_length)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._size = 0
+        self._index_records(records, base=0)
+        self._file = open(self.path, "ab+")
+
+    def _index_records(self, records: List[Tuple[str, Optional[int], int, int]], base: int):
+        """Index records parsed by _scan, appended to the log at base."""
+        for key, value_offset, value_length, record_length in records:
+            if value_offset is None:
+                self._discard(key)
+            else:
+                self._apply_entry(key, _Entry(base + value_offset, value_length, record_length))
+            self._size += record_length
+
+    def _apply(self, key: str, value: Optional[bytes], offset: int, record_length: int):
+        """Update the index for a record appended at offset."""
+        if value is None:
+            self._discard(key)
+        else:
+            self._apply_entry(key, _Entry(offset + record_length - len(value), len(value), record_length))
+
+    def _apply_entry(self, key: str, entry: _Entry):
+        """Point a key at a new live record."""
+        self._discard(key)
+        self._index[key] = entry
+        self._live_bytes += entry.record_length
+
+    def _discard(self, key: str):
+        """Forget the live record of a key."""
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._live_bytes -= previous.record_length
+
+
+def _encode(key: str, value: Optional[bytes]) -> bytes:
+    """Frame one record."""
+    encoded_key = key.encode("utf-8")
+    if len(encoded_key) > MAX_KEY_SIZE:
+        raise ValueError(f"Key longer than {MAX_KEY_SIZE} bytes")
+    kind = _DELETE if value is None else _PUT
+    payload = _HEADER.pack(len(encoded_key), kind) + encoded_key + (value or b"")
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _scan(data, offset: int) -> Tuple[List[Tuple[str, Optional[int], int, int]], int]:
+    """
+    Parse the records of a log.
+
+    Returns:
+        The records as (key, value_offset, value_length, record_length),
+        with a value_offset of None for deletes, and the length of the valid
+        prefix of the data
+    """
+    records = []
+    size = len(data)
+
+    while offset + _FRAME.size <= size:
+        length, checksum = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        end = start + length
+
+        if length < _HEADER.size or length > MAX_RECORD_SIZE or end > size:
+            break
+        if zlib.crc32(data[start:end]) != checksum:
+            break
+
+        key_length, kind = _HEADER.unpack_from(data, start)
+        key_start = start + _HEADER.size
+        value_start = key_start + key_length
+        if value_start > end or kind not in (_PUT, _DELETE):
+            break
+
+        key = data[key_start:value_start].decode("utf-8", errors="replace")
+        if kind == _DELETE:
+            records.append((key, None, 0, end - offset))
+        else:
+            records.append((key, value_start, end - value_start, end - offset))
+        offset = end
+
+    return records, offset
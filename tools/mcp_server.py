@@ -4,33 +4,51 @@ MCP (Message Control Protocol) Server implementation.
 import asyncio
 import json
 import logging
-from typing import Dict, Any, List, Optional, Type, Callable
+from typing import Dict, Any, List, Optional, Type, Callable, AsyncIterator
 import websockets
 
 from .base_tool import BaseTool
-from .utils import extract_tool_calls, format_tool_response
+from .dispatch import ClientConnection, DEFAULT_MAX_CONCURRENT_REQUESTS, Responder, run_tool_calls
+from .tool_call_parser import iter_tool_calls
+from .wire import requested_encoding
+from .utils import connection_path
 
 # Import all tool implementations
 from .browser_preview import BrowserPreviewTool
 from .run_command import RunCommandTool
+from .command_output import CommandOutputTool
+from .command_status import CommandStatusTool
+from .wait_command import WaitCommandTool
+from .kill_command import KillCommandTool
 from .view_file import ViewFileTool
+from .view_files import ViewFilesTool
 from .write_to_file import WriteToFileTool
 from .edit_file import EditFileTool
+from .edit_files import EditFilesTool
+from .edit_history import EditHistoryTool
 
 
 class MCPServer:
     """MCP Server for handling tool calls."""
     
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8765,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS
+    ):
         """
         Initialize the MCP server.
         
         Args:
             host: The host to bind to
             port: The port to bind to
+            max_concurrent_requests: Maximum number of request-ID-tagged frames
+                processed concurrently for a single connection
         """
         self.host = host
         self.port = port
+        self.max_concurrent_requests = max_concurrent_requests
         self.tools: Dict[str, BaseTool] = {}
         self.clients = set()
         self.logger = logging.getLogger("mcp_server")
@@ -43,16 +61,26 @@ class MCPServer:
         tools = [
             BrowserPreviewTool(),
             RunCommandTool(),
+            CommandOutputTool(),
+            CommandStatusTool(),
+            WaitCommandTool(),
+            KillCommandTool(),
             ViewFileTool(),
+            ViewFilesTool(),
             WriteToFileTool(),
             EditFileTool(),
+            EditFilesTool(),
+            EditHistoryTool(),
             # Add more tools here
         ]
         
         for tool in tools:
             self.tools[tool.name] = tool
+        
+        # Tool definitions never change once registered
+        self._tool_definitions = {name: tool.to_dict() for name, tool in self.tools.items()}
     
-    async def handle_client(self, websocket, path):
+    async def handle_client(self, websocket, path: Optional[str] = None):
         """
         Handle a client connection.
         
@@ -61,41 +89,85 @@ class MCPServer:
             path: The connection path
         """
         self.clients.add(websocket)
+        connection = ClientConnection(
+            websocket,
+            self.process_message,
+            self.max_concurrent_requests,
+            requested_encoding(path or connection_path(websocket))
+        )
         try:
+            await connection.open()
             async for message in websocket:
-                await self.process_message(websocket, message)
+                await connection.dispatch(message)
         finally:
+            await connection.close()
             self.clients.remove(websocket)
     
-    async def process_message(self, websocket, message: str):
+    async def process_message(self, responder: Responder, message: str):
         """
         Process a message from a client.
         
         Args:
-            websocket: The WebSocket connection
+            responder: The Responder for the request
             message: The message to process
         """
         try:
-            # Extract tool calls from the message
-            tool_calls = extract_tool_calls(message)
-            
-            # Process each tool call
-            for tool_call in tool_calls:
-                tool_name = tool_call.get("name")
-                parameters = tool_call.get("parameters", {})
-                
-                # Execute the tool
-                response = await self.execute_tool(tool_name, parameters)
-                
-                # Format the response
-                formatted_response = format_tool_response(tool_name, response)
-                
-                # Send the response back to the client
-                await websocket.send(formatted_response)
+            # Process the tool calls concurrently, starting each one as soon
+            # as it has been parsed
+            await run_tool_calls(
+                iter_tool_calls(message),
+                lambda tool_call: self.process_tool_call(responder, tool_call)
+            )
         
         except Exception as e:
             self.logger.error(f"Error processing message: {str(e)}")
-            await websocket.send(json.dumps({"error": str(e)}))
+            await responder.send_message({"error": str(e)})
+    
+    async def process_tool_call(self, responder: Responder, tool_call: Dict[str, Any]):
+        """
+        Execute a single tool call and send its response.
+        
+        Args:
+            responder: The Responder for the request
+            tool_call: The tool call to execute
+        """
+        tool_name = tool_call.get("name")
+        parameters = tool_call.get("parameters", {})
+        
+        if "error" in tool_call:
+            # Report malformed tool calls back to the client
+            response = {"error": f"Malformed tool call: {tool_call['error']}"}
+            await responder.send_tool_response(tool_name, response)
+            return
+        
+        # Format each frame of the response and send it back to the client
+        async for response in self.stream_tool(tool_name, parameters):
+            await responder.send_tool_response(tool_name, response)
+    
+    async def stream_tool(self, tool_name: str, parameters: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute a tool, yielding each frame of its response.
+        
+        Most tools respond with a single frame; command_output with Follow
+        sends one per batch of output.
+        
+        Args:
+            tool_name: The name of the tool to execute
+            parameters: The parameters for the tool
+            
+        Yields:
+            The responses of the tool
+        """
+        if tool_name not in self.tools:
+            yield {"error": f"Tool not found: {tool_name}"}
+            return
+        
+        try:
+            async for response in self.tools[tool_name].stream(parameters):
+                yield response
+        except Exception as e:
+            self.logger.error(f"Error executing tool {tool_name}: {str(e)}")
+            yield {"error": str(e)}
     
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -125,7 +197,7 @@ class MCPServer:
         Returns:
             A dictionary mapping tool names to their definitions
         """
-        return {name: tool.to_dict() for name, tool in self.tools.items()}
+        return dict(self._tool_definitions)
     
     async def start(self):
         """Start the MCP server."""
@@ -1,14 +1,44 @@
 """
 MemoryBank Agent implementation.
+
+Memories are kept in an append-only LogStore under the memory directory, so
+storing, updating or deleting one appends a record or two instead of
+rewriting the whole bank. Each memory has a metadata record, with its tags
+and timestamp, and a content record. The metadata of every memory is held in
+memory for filtering by tag; content is read back from the log when it is
+returned. Once overwritten and deleted records take up more of the log than
+the live ones, the log is compacted in the background.
+
+Queries are answered from a TextIndex of the content of every memory, ranked
+by BM25. The index is built from the log on the first query and kept up to
+date by every store, update and delete after that.
+
+Banks saved by earlier versions as index.pkl and content.pkl are migrated
+into the log the first time they are opened.
 """
+import asyncio
 import json
 import os
 import pickle
-from typing import Dict, Any, List, Optional, Union
-import aiofiles
+from typing import Dict, Any, List, Optional, Tuple, Union
 
+from . import serialization
 from .agent_base import Agent
 from .base_tool import BaseTool
+from .file_io import run_file_io
+from .log_store import LogStore
+from .text_index import TextIndex
+
+
+# Garbage in the log below which it is never compacted
+COMPACT_MIN_GARBAGE_BYTES = 1024 * 1024
+
+# Memories returned for a query unless top_k is given
+DEFAULT_TOP_K = 10
+
+# Prefixes of the metadata and content records of a memory in the log
+_META = "m/"
+_CONTENT = "c/"
 
 
 class MemoryBankAgent(Agent):
@@ -35,13 +65,18 @@ class MemoryBankAgent(Agent):
         super().__init__("MemoryBank", description, tools)
         
         self.memory_dir = memory_dir
-        self.memory_index = {}
-        self.memory_content = {}
+        self.memory_index: Dict[str, Dict[str, Any]] = {}
         
         # Create memory directory if it doesn't exist
         os.makedirs(memory_dir, exist_ok=True)
         
+        self._store = LogStore(os.path.join(memory_dir, "memories.log"))
+        self._write_lock = asyncio.Lock()
+        self._compaction: Optional[asyncio.Future] = None
+        self._text_index: Optional[TextIndex] = None
+        
         # Load existing memory if available
+        self._migrate_pickles()
         self._load_memory()
     
     async def process(self, message: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
@@ -51,7 +86,7 @@ class MemoryBankAgent(Agent):
         Args:
             message: The message to process
             context: The context for processing the message
-            
+        
         Returns:
             The response from the agent
         """
@@ -86,17 +121,20 @@ class MemoryBankAgent(Agent):
         if not content:
             return {"status": "error", "message": "Missing content for memory"}
         
-        # Store the memory
-        self.memory_content[key] = content
-        
-        # Update the index
-        self.memory_index[key] = {
+        metadata = {
             "tags": tags,
             "timestamp": context.get("timestamp", 0)
         }
         
-        # Save to disk
-        await self._save_memory()
+        # Append the content before the metadata, so a torn write never
+        # leaves metadata without content
+        try:
+            await self._write(key, [
+                (_CONTENT + key, serialization.dumps_bytes(content)),
+                (_META + key, serialization.dumps_bytes(metadata))
+            ], metadata, content=content)
+        except (TypeError, ValueError) as e:
+            return {"status": "error", "message": f"Failed to store memory: {str(e)}"}
         
         return {
             "status": "success",
@@ -112,34 +150,46 @@ class MemoryBankAgent(Agent):
         
         if key:
             # Retrieve by exact key
-            if key in self.memory_content:
+            if key in self.memory_index:
                 return {
                     "status": "success",
                     "key": key,
-                    "content": self.memory_content[key],
+                    "content": await run_file_io(self._read_content, key),
                     "metadata": self.memory_index.get(key, {})
                 }
             else:
                 return {"status": "error", "message": f"Memory not found with key: {key}"}
         
-        elif query or tags:
-            # Retrieve by query or tags
-            results = []
+        elif query:
+            # Retrieve the best matches of a query, optionally with one of the tags
+            top_k = message.get("top_k", DEFAULT_TOP_K)
+            if not isinstance(top_k, int) or top_k < 1:
+                return {"status": "error", "message": "top_k must be a positive integer"}
+            
+            accept = None
+            if tags:
+                accept = lambda k: any(tag in self.memory_index.get(k, {}).get("tags", []) for tag in tags)
             
-            for k, metadata in self.memory_index.items():
-                # Check if tags match
-                if tags and not any(tag in metadata.get("tags", []) for tag in tags):
-                    continue
-                
-                # Check if query matches (simple substring match for now)
-                if query and query.lower() not in self.memory_content[k].lower():
-                    continue
-                
-                results.append({
-                    "key": k,
-                    "content": self.memory_content[k],
-                    "metadata": metadata
-                })
+            text_index = await self._get_text_index()
+            matches = text_index.search(query, top_k, accept)
+            results = await run_file_io(self._read_memories, [k for k, _ in matches])
+            scores = dict(matches)
+            for result in results:
+                result["score"] = scores[result["key"]]
+            
+            return {
+                "status": "success",
+                "count": len(results),
+                "results": results
+            }
+        
+        elif tags:
+            # Retrieve by tags
+            keys = [
+                k for k, metadata in self.memory_index.items()
+                if any(tag in metadata.get("tags", []) for tag in tags)
+            ]
+            results = await run_file_io(self._read_memories, keys)
             
             return {
                 "status": "success",
@@ -159,22 +209,30 @@ class MemoryBankAgent(Agent):
         if not key:
             return {"status": "error", "message": "Missing key for memory update"}
         
-        if key not in self.memory_content:
+        if key not in self.memory_index:
             return {"status": "error", "message": f"Memory not found with key: {key}"}
         
-        # Update content if provided
-        if content is not None:
-            self.memory_content[key] = content
+        metadata = dict(self.memory_index[key])
         
         # Update tags if provided
         if tags is not None:
-            self.memory_index[key]["tags"] = tags
+            metadata["tags"] = tags
         
         # Update timestamp
-        self.memory_index[key]["timestamp"] = context.get("timestamp", 0)
+        metadata["timestamp"] = context.get("timestamp", 0)
         
-        # Save to disk
-        await self._save_memory()
+        # Only rewrite the content if provided
+        records = []
+        try:
+            if content is not None:
+                records.append((_CONTENT + key, serialization.dumps_bytes(content)))
+            records.append((_META + key, serialization.dumps_bytes(metadata)))
+            updated = await self._write(key, records, metadata, content=content, must_exist=True)
+        except (TypeError, ValueError) as e:
+            return {"status": "error", "message": f"Failed to update memory: {str(e)}"}
+        
+        if not updated:
+            return {"status": "error", "message": f"Memory not found with key: {key}"}
         
         return {
             "status": "success",
@@ -189,15 +247,12 @@ class MemoryBankAgent(Agent):
         if not key:
             return {"status": "error", "message": "Missing key for memory deletion"}
         
-        if key not in self.memory_content:
+        if key not in self.memory_index:
             return {"status": "error", "message": f"Memory not found with key: {key}"}
         
-        # Delete the memory
-        del self.memory_content[key]
-        del self.memory_index[key]
-        
-        # Save to disk
-        await self._save_memory()
+        # Delete the metadata first, so a torn write never leaves metadata
+        # without content
+        await self._write(key, [(_META + key, None), (_CONTENT + key, None)], None)
         
         return {
             "status": "success",
@@ -224,35 +279,162 @@ class MemoryBankAgent(Agent):
             "keys": keys
         }
     
+    async def _write(
+        self,
+        key: str,
+        records: List[Tuple[str, Optional[bytes]]],
+        metadata: Optional[Dict[str, Any]],
+        content: Any = None,
+        must_exist: bool = False
+    ) -> bool:
+        """
+        Append the records of a mutation to the log and apply it to the index.
+        
+        Args:
+            key: The key of the memory
+            records: (log key, value) pairs; a value of None deletes the record
+            metadata: The new metadata of the memory, or None if it is deleted
+            content: The new content of the memory, or None if it is unchanged
+            must_exist: Whether to give up if the memory was deleted meanwhile
+        
+        Returns:
+            True if the mutation was applied
+        """
+        # Mutations are appended in the order their index changes are applied
+        async with self._write_lock:
+            if must_exist and key not in self.memory_index:
+                return False
+            await run_file_io(self._store.write_batch, records)
+            if metadata is None:
+                self.memory_index.pop(key, None)
+            else:
+                self.memory_index[key] = metadata
+            
+            if self._text_index is not None:
+                if metadata is None:
+                    self._text_index.remove(key)
+                elif content is not None:
+                    self._text_index.add(key, _searchable_text(content))
+        
+        self._compact_if_needed()
+        return True
+    
+    def _read_content(self, key: str) -> Any:
+        """Read the content of a memory from the log."""
+        data = self._store.get(_CONTENT + key)
+        return None if data is None else serialization.loads(data)
+    
+    def _read_memories(self, keys: List[str]) -> List[Dict[str, Any]]:
+        """Read the content of memories from the log, with their metadata."""
+        results = []
+        
+        for k in keys:
+            content = self._read_content(k)
+            metadata = self.memory_index.get(k)
+            if content is None or metadata is None:
+                continue
+            
+            results.append({
+                "key": k,
+                "content": content,
+                "metadata": metadata
+            })
+        
+        return results
+    
+    async def _get_text_index(self) -> TextIndex:
+        """Get the full-text index of the memories, building it on first use."""
+        if self._text_index is None:
+            # Mutations wait for the build, so none is missed
+            async with self._write_lock:
+                if self._text_index is None:
+                    self._text_index = await run_file_io(self._build_text_index)
+        return self._text_index
+    
+    def _build_text_index(self) -> TextIndex:
+        """Index the content of every memory in the log."""
+        text_index = TextIndex()
+        contents = ((k, self._read_content(k)) for k in list(self.memory_index))
+        text_index.add_all((k, _searchable_text(content)) for k, content in contents if content is not None)
+        
+        self.logger.info(f"Indexed {len(text_index)} memories for search")
+        return text_index
+    
+    def _compact_if_needed(self):
+        """Start compacting the log in the background once it is mostly garbage."""
+        if self._compaction is not None and not self._compaction.done():
+            return
+        
+        garbage_bytes = self._store.garbage_bytes
+        if garbage_bytes <= max(self._store.live_bytes, COMPACT_MIN_GARBAGE_BYTES):
+            return
+        
+        self.logger.info(f"Compacting memory log, {garbage_bytes} bytes of garbage")
+        self._compaction = asyncio.ensure_future(run_file_io(self._store.compact))
+        self._compaction.add_done_callback(self._compacted)
+    
+    def _compacted(self, future: asyncio.Future):
+        """Log the outcome of a background compaction."""
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.logger.error(f"Failed to compact memory log: {str(future.exception())}")
+        else:
+            self.logger.info(f"Compacted memory log to {self._store.size} bytes")
+    
     def _load_memory(self):
         """Load memory from disk."""
-        index_path = os.path.join(self.memory_dir, "index.pkl")
-        content_path = os.path.join(self.memory_dir, "content.pkl")
-        
         try:
-            if os.path.exists(index_path) and os.path.exists(content_path):
-                with open(index_path, "rb") as f:
-                    self.memory_index = pickle.load(f)
-                
-                with open(content_path, "rb") as f:
-                    self.memory_content = pickle.load(f)
-                
-                self.logger.info(f"Loaded {len(self.memory_index)} memories from disk")
+            # Content written without its metadata by a torn write is dropped
+            orphans = []
+            for log_key in self._store.keys():
+                if log_key.startswith(_META):
+                    self.memory_index[log_key[len(_META):]] = serialization.loads(self._store.get(log_key))
+                elif log_key.startswith(_CONTENT) and _META + log_key[len(_CONTENT):] not in self._store:
+                    orphans.append((log_key, None))
+            if orphans:
+                self._store.write_batch(orphans)
+            
+            self.logger.info(f"Loaded {len(self.memory_index)} memories from disk")
         except Exception as e:
             self.logger.error(f"Failed to load memory: {str(e)}")
     
-    async def _save_memory(self):
-        """Save memory to disk."""
+    def _migrate_pickles(self):
+        """Move a memory bank saved as pickles by earlier versions into the log."""
         index_path = os.path.join(self.memory_dir, "index.pkl")
         content_path = os.path.join(self.memory_dir, "content.pkl")
         
+        if not (os.path.exists(index_path) and os.path.exists(content_path)):
+            return
+        
         try:
-            async with aiofiles.open(index_path, "wb") as f:
-                await f.write(pickle.dumps(self.memory_index))
+            with open(index_path, "rb") as f:
+                memory_index = pickle.load(f)
+            
+            with open(content_path, "rb") as f:
+                memory_content = pickle.load(f)
             
-            async with aiofiles.open(content_path, "wb") as f:
-                await f.write(pickle.dumps(self.memory_content))
+            records = []
+            for key, content in memory_content.items():
+                metadata = memory_index.get(key, {"tags": [], "timestamp": 0})
+                try:
+                    records.append((_CONTENT + key, serialization.dumps_bytes(content)))
+                except TypeError:
+                    records.append((_CONTENT + key, serialization.dumps_bytes(str(content))))
+                records.append((_META + key, serialization.dumps_bytes(metadata)))
             
-            self.logger.info(f"Saved {len(self.memory_index)} memories to disk")
+            # The pickles are only moved aside once the log is on disk, so an
+            # interrupted migration is simply run again
+            self._store.write_batch(records)
+            self._store.sync()
+            for path in (index_path, content_path):
+                os.replace(path, f"{path}.migrated")
+            
+            self.logger.info(f"Migrated {len(memory_content)} memories from pickles")
         except Exception as e:
-            self.logger.error(f"Failed to save memory: {str(e)}")
+            self.logger.error(f"Failed to migrate memory: {str(e)}")
+
+
+def _searchable_text(content: Any) -> str:
+    """Get the text of a memory's content to index."""
+    return content if isinstance(content, str) else serialization.dumps(content)
@@ -2,37 +2,55 @@
 Multi-Agent MCP (Message Control Protocol) Server implementation.
 """
 import asyncio
-import json
 import logging
 import time
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator
 import websockets
 
+from . import serialization
 from .base_tool import BaseTool
-from .utils import extract_tool_calls, format_tool_response
+from .dispatch import ClientConnection, DEFAULT_MAX_CONCURRENT_REQUESTS, Responder, run_tool_calls
+from .tool_call_parser import iter_tool_calls
+from .wire import requested_encoding
+from .utils import connection_path
 from .orchestrator import Orchestrator
 
 # Import all tool implementations
 from .browser_preview import BrowserPreviewTool
 from .run_command import RunCommandTool
+from .command_output import CommandOutputTool
+from .command_status import CommandStatusTool
+from .wait_command import WaitCommandTool
+from .kill_command import KillCommandTool
 from .view_file import ViewFileTool
+from .view_files import ViewFilesTool
 from .write_to_file import WriteToFileTool
 from .edit_file import EditFileTool
+from .edit_files import EditFilesTool
+from .edit_history import EditHistoryTool
 
 
 class MultiAgentMCPServer:
     """Multi-Agent MCP Server for handling tool calls and agent coordination."""
     
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8765,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS
+    ):
         """
         Initialize the Multi-Agent MCP server.
         
         Args:
             host: The host to bind to
             port: The port to bind to
+            max_concurrent_requests: Maximum number of request-ID-tagged frames
+                processed concurrently for a single connection
         """
         self.host = host
         self.port = port
+        self.max_concurrent_requests = max_concurrent_requests
         self.tools: Dict[str, BaseTool] = {}
         self.clients = set()
         self.logger = logging.getLogger("multi_agent_mcp_server")
@@ -48,16 +66,26 @@ class MultiAgentMCPServer:
         tools = [
             BrowserPreviewTool(),
             RunCommandTool(),
+            CommandOutputTool(),
+            CommandStatusTool(),
+            WaitCommandTool(),
+            KillCommandTool(),
             ViewFileTool(),
+            ViewFilesTool(),
             WriteToFileTool(),
             EditFileTool(),
+            EditFilesTool(),
+            EditHistoryTool(),
             # Add more tools here
         ]
         
         for tool in tools:
             self.tools[tool.name] = tool
+        
+        # Tool definitions never change once registered
+        self._tool_definitions = {name: tool.to_dict() for name, tool in self.tools.items()}
     
-    async def handle_client(self, websocket, path):
+    async def handle_client(self, websocket, path: Optional[str] = None):
         """
         Handle a client connection.
         
@@ -66,94 +94,156 @@ class MultiAgentMCPServer:
             path: The connection path
         """
         self.clients.add(websocket)
+        connection = ClientConnection(
+            websocket,
+            self.process_message,
+            self.max_concurrent_requests,
+            requested_encoding(path or connection_path(websocket))
+        )
         try:
+            await connection.open()
             async for message in websocket:
-                await self.process_message(websocket, message)
+                await connection.dispatch(message)
         finally:
+            await connection.close()
             self.clients.remove(websocket)
     
-    async def process_message(self, websocket, message: str):
+    async def process_message(self, responder: Responder, message: str):
         """
         Process a message from a client.
         
         Args:
-            websocket: The WebSocket connection
+            responder: The Responder for the request
             message: The message to process
         """
         try:
-            # Check if this is a direct tool call
-            tool_calls = extract_tool_calls(message)
+            # Agent and orchestrator calls are JSON objects with a "target" field
+            json_message = self._parse_json_message(message)
+            is_agent_call = isinstance(json_message, dict) and "target" in json_message
             
-            if tool_calls:
-                # Process each tool call
-                for tool_call in tool_calls:
-                    tool_name = tool_call.get("name")
-                    parameters = tool_call.get("parameters", {})
-                    
-                    # Execute the tool
-                    response = await self.execute_tool(tool_name, parameters)
-                    
-                    # Format the response
-                    formatted_response = format_tool_response(tool_name, response)
+            if not is_agent_call:
+                # Check if this is a direct tool call, and process the tool
+                # calls concurrently as soon as each one has been parsed
+                tool_count = await run_tool_calls(
+                    iter_tool_calls(message),
+                    lambda tool_call: self.process_tool_call(responder, tool_call)
+                )
+                if tool_count:
+                    return
+            
+            if is_agent_call:
+                target = json_message.get("target")
+                
+                if target == "orchestrator":
+                    # Call the orchestrator
+                    response = await self.orchestrator.process_message(json_message)
                     
                     # Send the response back to the client
-                    await websocket.send(formatted_response)
-            else:
-                # Try to parse as JSON
-                try:
-                    json_message = json.loads(message)
+                    await responder.send_message(response)
+                elif target in self.orchestrator.agents:
+                    # Call the agent directly
+                    agent = self.orchestrator.agents[target]
+                    context = {"timestamp": time.time(), "orchestrator": self.orchestrator}
+                    response = await agent.process(json_message, context)
                     
-                    # Check if this is an agent or orchestrator call
-                    if "target" in json_message:
-                        target = json_message.get("target")
-                        
-                        if target == "orchestrator":
-                            # Call the orchestrator
-                            response = await self.orchestrator.process_message(json_message)
-                            
-                            # Send the response back to the client
-                            await websocket.send(json.dumps(response))
-                        elif target in self.orchestrator.agents:
-                            # Call the agent directly
-                            agent = self.orchestrator.agents[target]
-                            context = {"timestamp": time.time(), "orchestrator": self.orchestrator}
-                            response = await agent.process(json_message, context)
-                            
-                            # Send the response back to the client
-                            await websocket.send(json.dumps(response))
-                        else:
-                            # Unknown target
-                            error_response = {
-                                "status": "error",
-                                "message": f"Unknown target: {target}",
-                                "available_targets": ["orchestrator"] + list(self.orchestrator.agents.keys())
-                            }
-                            
-                            # Send the error response back to the client
-                            await websocket.send(json.dumps(error_response))
-                    else:
-                        # Unknown message format
-                        error_response = {
-                            "status": "error",
-                            "message": "Unknown message format. Expected either tool calls or a JSON message with a 'target' field."
-                        }
-                        
-                        # Send the error response back to the client
-                        await websocket.send(json.dumps(error_response))
-                
-                except json.JSONDecodeError:
-                    # Not a valid JSON message or tool call
+                    # Send the response back to the client
+                    await responder.send_message(response)
+                else:
+                    # Unknown target
                     error_response = {
                         "status": "error",
-                        "message": "Invalid message format. Expected either tool calls or a valid JSON message."
+                        "message": f"Unknown target: {target}",
+                        "available_targets": ["orchestrator"] + list(self.orchestrator.agents.keys())
                     }
                     
                     # Send the error response back to the client
-                    await websocket.send(json.dumps(error_response))
+                    await responder.send_message(error_response)
+            elif json_message is not None:
+                # Unknown message format
+                error_response = {
+                    "status": "error",
+                    "message": "Unknown message format. Expected either tool calls or a JSON message with a 'target' field."
+                }
+                
+                # Send the error response back to the client
+                await responder.send_message(error_response)
+            else:
+                # Not a valid JSON message or tool call
+                error_response = {
+                    "status": "error",
+                    "message": "Invalid message format. Expected either tool calls or a valid JSON message."
+                }
+                
+                # Send the error response back to the client
+                await responder.send_message(error_response)
         
         except Exception as e:
             self.logger.error(f"Error processing message: {str(e)}")
-            await websocket.send(json.dumps({"error": str(e)}))
+            await responder.send_message({"error": str(e)})
+    
+    def _parse_json_message(self, message: str) -> Optional[Any]:
+        """
+        Parse a message as JSON.
+        
+        Args:
+            message: The message to parse
+            
+        Returns:
+            The parsed message, or None if it is not valid JSON
+        """
+        if not message.lstrip().startswith(("{", "[")):
+            return None
+        
+        try:
+            return serialization.loads(message)
+        except serialization.JSONDecodeError:
+            return None
+    
+    async def process_tool_call(self, responder: Responder, tool_call: Dict[str, Any]):
+        """
+        Execute a single tool call and send its response.
+        
+        Args:
+            responder: The Responder for the request
+            tool_call: The tool call to execute
+        """
+        tool_name = tool_call.get("name")
+        parameters = tool_call.get("parameters", {})
+        
+        if "error" in tool_call:
+            # Report malformed tool calls back to the client
+            response = {"error": f"Malformed tool call: {tool_call['error']}"}
+            await responder.send_tool_response(tool_name, response)
+            return
+        
+        # Format each frame of the response and send it back to the client
+        async for response in self.stream_tool(tool_name, parameters):
+            await responder.send_tool_response(tool_name, response)
+    
+    async def stream_tool(self, tool_name: str, parameters: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute a tool, yielding each frame of its response.
+        
+        Most tools respond with a single frame; command_output with Follow
+        sends one per batch of output.
+        
+        Args:
+            tool_name: The name of the tool to execute
+            parameters: The parameters for the tool
+            
+        Yields:
+            The responses of the tool
+        """
+        if tool_name not in self.tools:
+            yield {"error": f"Tool not found: {tool_name}"}
+            return
+        
+        try:
+            async for response in self.tools[tool_name].stream(parameters):
+                yield response
+        except Exception as e:
+            self.logger.error(f"Error executing tool {tool_name}: {str(e)}")
+            yield {"error": str(e)}
     
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -183,7 +273,7 @@ class MultiAgentMCPServer:
         Returns:
             A dictionary mapping tool names to their definitions
         """
-        return {name: tool.to_dict() for name, tool in self.tools.items()}
+        return dict(self._tool_definitions)
     
     def get_agent_definitions(self) -> Dict[str, Dict[str, Any]]:
         """
@@ -0,0 +1,306 @@
+"""
+Structural outlines of source files.
+
+An outline lists the landmarks of a file with their line numbers: classes,
+functions and methods for Python; exports, classes and components for
+JavaScript and TypeScript; top-level keys for JSON; and table statements for
+SQL. view_file uses it to summarize the lines it does not show. Outlines are
+computed once per version of a file and cached by content hash and file
+extension.
+"""
+import ast
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+# An outline entry: 0-indexed line number and description
+OutlineEntry = Tuple[int, str]
+
+# Maximum number of outlines kept in the cache
+DEFAULT_CACHE_SIZE = 256
+
+# Longest description kept for a single entry
+MAX_ENTRY_LENGTH = 120
+
+PYTHON_EXTENSIONS = (".py", ".pyi")
+SCRIPT_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+JSON_EXTENSIONS = (".json",)
+SQL_EXTENSIONS = (".sql",)
+
+_PYTHON_DEFINITION = re.compile(r'^(\s*)(?:async\s+def|def|class)\s+\w+.*$')
+
+_SCRIPT_LANDMARKS = [
+    # Exported functions, classes, constants, types and re-exports
+    re.compile(r'^export\s+.*$'),
+    # Top-level functions and classes
+    re.compile(r'^(?:async\s+)?function\s*\*?\s*\w+.*$'),
+    re.compile(r'^(?:abstract\s+)?class\s+\w+.*$'),
+    # Top-level components: const Name = (...) => ... or React.forwardRef(...)
+    re.compile(r'^(?:const|let)\s+[A-Z]\w*\s*(?::[^=]+)?=.*$'),
+    # Interfaces and type aliases
+    re.compile(r'^(?:interface|type|enum)\s+\w+.*$'),
+]
+
+_JSON_TOKEN = re.compile(r'[\n{}\[\]"]')
+
+_SQL_STATEMENT = re.compile(
+    r'^\s*(CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMPORARY\s+)?(?:TABLE|VIEW|INDEX|UNIQUE\s+INDEX|TRIGGER|PROCEDURE|FUNCTION|DATABASE|SCHEMA)'
+    r'(?:\s+IF\s+NOT\s+EXISTS)?\s+[`"\[]?[\w.]+[`"\]]?'
+    r'|ALTER\s+TABLE\s+[`"\[]?[\w.]+[`"\]]?'
+    r'|INSERT\s+INTO\s+[`"\[]?[\w.]+[`"\]]?)',
+    re.IGNORECASE
+)
+
+
+def build_outline(path: str, text: str) -> List[OutlineEntry]:
+    """
+    Build the outline of a file.
+
+    Args:
+        path: The path of the file, used to pick the language
+        text: The contents of the file
+
+    Returns:
+        The outline entries, in line order; empty for unsupported languages
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in PYTHON_EXTENSIONS:
+        return _python_outline(text)
+    if extension in SCRIPT_EXTENSIONS:
+        return _script_outline(text)
+    if extension in JSON_EXTENSIONS:
+        return _json_outline(text)
+    if extension in SQL_EXTENSIONS:
+        return _sql_outline(text)
+    return []
+
+
+def _python_outline(text: str) -> List[OutlineEntry]:
+    """Outline Python code: classes, functions and methods with their signatures."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        # Fall back to matching definitions line by line
+        return [
+            (number, _shorten(line.rstrip().rstrip(":")))
+            for number, line in enumerate(text.split("\n"))
+            if _PYTHON_DEFINITION.match(line)
+        ]
+
+    entries: List[OutlineEntry] = []
+
+    def visit(nodes: List[ast.stmt], depth: int):
+        indent = "    " * depth
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                bases = ", ".join(ast.unparse(base) for base in node.bases)
+                signature = f"class {node.name}({bases})" if bases else f"class {node.name}"
+                entries.append((node.lineno - 1, _shorten(indent + signature)))
+                visit(node.body, depth + 1)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                signature = f"{prefix} {node.name}({ast.unparse(node.args)})"
+                if node.returns is not None:
+                    signature += f" -> {ast.unparse(node.returns)}"
+                entries.append((node.lineno - 1, _shorten(indent + signature)))
+
+    visit(tree.body, 0)
+    return entries
+
+
+def _script_outline(text: str) -> List[OutlineEntry]:
+    """Outline JavaScript and TypeScript: exports, classes, functions and components."""
+    entries: List[OutlineEntry] = []
+    for number, line in enumerate(text.split("\n")):
+        if not line or line[0].isspace():
+            continue
+        if any(pattern.match(line) for pattern in _SCRIPT_LANDMARKS):
+            entries.append((number, _shorten(_strip_body(line))))
+    return entries
+
+
+def _json_outline(text: str) -> List[OutlineEntry]:
+    """Outline JSON: the keys of the top-level object."""
+    entries: List[OutlineEntry] = []
+    depth = 0
+    line = 0
+    position = 0
+
+    # Only newlines, brackets and strings matter; skip everything else
+    while True:
+        match = _JSON_TOKEN.search(text, position)
+        if match is None:
+            break
+
+        char = match.group()
+        index = match.start()
+        position = index + 1
+
+        if char == "\n":
+            line += 1
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+        else:
+            end = _string_end(text, index)
+            if depth == 1 and text[end + 1:end + 64].lstrip().startswith(":"):
+                entries.append((line, _shorten(text[index:end + 1])))
+            line += text.count("\n", index, end)
+            position = end + 1
+
+    return entries
+
+
+def _sql_outline(text: str) -> List[OutlineEntry]:
+    """Outline SQL: CREATE and ALTER statements, and one entry per run of INSERTs."""
+    entries: List[OutlineEntry] = []
+    insert_counts: Dict[int, int] = {}
+    last_insert: Optional[Tuple[str, int]] = None
+
+    for number, line in enumerate(text.split("\n")):
+        match = _SQL_STATEMENT.match(line)
+        if match is None:
+            continue
+
+        statement = " ".join(match.group(1).split())
+        if statement.upper().startswith("INSERT"):
+            # Collapse consecutive inserts into the same table
+            if last_insert is not None and last_insert[0] == statement.upper():
+                insert_counts[last_insert[1]] += 1
+                continue
+            last_insert = (statement.upper(), len(entries))
+            insert_counts[len(entries)] = 1
+        else:
+            last_insert = None
+
+        entries.append((number, _shorten(statement)))
+
+    for position, count in insert_counts.items():
+        if count > 1:
+            number, statement = entries[position]
+            entries[position] = (number, f"{statement} ({count} statements)")
+
+    return entries
+
+
+def _string_end(text: str, start: int) -> int:
+    """Find the closing quote of the JSON string starting at start."""
+    index = start + 1
+    while True:
+        index = text.find('"', index)
+        if index == -1:
+            return len(text) - 1
+        backslashes = 0
+        while text[index - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return index
+        index += 1
+
+
+def _strip_body(line: str) -> str:
+    """Drop the opening brace of a declaration."""
+    line = line.rstrip()
+    if line.endswith("{"):
+        line = line[:-1].rstrip()
+    return line
+
+
+def _shorten(description: str) -> str:
+    """Cut a description to MAX_ENTRY_LENGTH characters."""
+    if len(description) <= MAX_ENTRY_LENGTH:
+        return description
+    return description[:MAX_ENTRY_LENGTH - 3] + "..."
+
+
+class OutlineCache:
+    """
+    Cache of file outlines, keyed by content hash and file extension.
+
+    The content hash of each file is remembered together with its
+    modification time and size, so an unchanged file is neither re-read nor
+    re-hashed.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of outlines kept in the cache
+        """
+        self.max_entries = max_entries
+        self._outlines: "OrderedDict[str, List[OutlineEntry]]" = OrderedDict()
+        self._versions: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> List[OutlineEntry]:
+        """
+        Get the outline of a file.
+
+        This does blocking I/O and should be run off the event loop.
+
+        Args:
+            path: The path of the file
+
+        Returns:
+            The outline of the current version of the file
+        """
+        key = os.path.realpath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            version = self._versions.get(key)
+            if version is not None and version[:2] == (stat.st_mtime_ns, stat.st_size):
+                outline = self._outlines.get(version[2])
+                if outline is not None:
+                    self._outlines.move_to_end(version[2])
+                    return outline
+
+        with open(key, "rb") as f:
+            data = f.read()
+        # The outline of the same contents depends on the kind of file
+        digest = f"{os.path.splitext(key)[1].lower()}:{hashlib.sha1(data).hexdigest()}"
+
+        with self._lock:
+            self._remember(self._versions, key, (stat.st_mtime_ns, stat.st_size, digest))
+            outline = self._outlines.get(digest)
+            if outline is not None:
+                self._outlines.move_to_end(digest)
+                return outline
+
+        outline = build_outline(key, data.decode("utf-8", errors="replace"))
+
+        with self._lock:
+            self._remember(self._outlines, digest, outline)
+
+        return outline
+
+    def _remember(self, entries: OrderedDict, key: str, value):
+        """Store an entry, evicting the least recently used ones."""
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+
+_cache = OutlineCache()
+
+
+def get_outline(path: str) -> List[OutlineEntry]:
+    """
+    Get the outline of a file from the shared cache.
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        The outline of the current version of the file
+    """
+    return _cache.get(path)
@@ -0,0 +1,291 @@
+"""
+Bounded buffers for the output of running commands.
+
+Each stream of a command (stdout or stderr) is drained into an OutputBuffer.
+The newest bytes are kept in memory, up to a fixed capacity; older bytes are
+spilled to an anonymous temporary file, itself capped in size. Bytes are
+addressed by their offset since the start of the stream, so a client can poll
+with the offset it has read up to and get only what came after it, whether it
+is still in memory or already spilled. Once the spill file is full, bytes
+evicted from memory are dropped instead, and reads report how many were
+skipped. A buffer released once its command is reaped keeps its size, and
+reads report its output as expired.
+
+The output of a blocking command is returned whole instead, so it is drained
+into a HeadTailBuffer, which keeps only its first and last bytes past a cap.
+"""
+import asyncio
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+from .file_io import run_file_io
+
+
+# Bytes of each stream kept in memory, overridable with MCP_COMMAND_BUFFER_KB
+DEFAULT_BUFFER_BYTES = int(os.environ.get("MCP_COMMAND_BUFFER_KB", "256")) * 1024
+
+# Bytes of each stream spilled to disk, overridable with MCP_COMMAND_SPILL_MB
+DEFAULT_SPILL_BYTES = int(os.environ.get("MCP_COMMAND_SPILL_MB", "64")) * 1024 * 1024
+
+# Bytes of each stream of a blocking command returned, overridable with
+# MCP_COMMAND_OUTPUT_KB; the middle of longer output is elided
+DEFAULT_OUTPUT_CAP = int(os.environ.get("MCP_COMMAND_OUTPUT_KB", "256")) * 1024
+
+
+class OutputChunk(NamedTuple):
+    """Bytes read from an output buffer."""
+    data: bytes
+    offset: int
+    next_offset: int
+    dropped: int
+    expired: bool = False
+
+
+class OutputBuffer:
+    """The output of one stream of a command, in memory and spilled to disk."""
+
+    def __init__(self, capacity: int = DEFAULT_BUFFER_BYTES, spill_capacity: int = DEFAULT_SPILL_BYTES):
+        """
+        Initialize an empty buffer.
+
+        Args:
+            capacity: Bytes kept in memory
+            spill_capacity: Bytes spilled to disk once memory is full
+        """
+        self.capacity = max(1, capacity)
+        self.spill_capacity = max(0, spill_capacity)
+        self._memory = bytearray()
+        self._memory_start = 0
+        self._spill = None
+        self._spilled = 0
+        self._closed = False
+        self._released = False
+        self._changed = asyncio.Event()
+
+    @property
+    def size(self) -> int:
+        """Offset of the end of the stream, i.e. the number of bytes written."""
+        return self._memory_start + len(self._memory)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the stream has ended."""
+        return self._closed
+
+    @property
+    def released(self) -> bool:
+        """Whether the output has been freed; see release."""
+        return self._released
+
+    @property
+    def first_offset(self) -> int:
+        """Offset of the oldest byte still available."""
+        return 0 if self._spilled else self._memory_start
+
+    async def write(self, data: bytes):
+        """
+        Append bytes to the stream.
+
+        Args:
+            data: The bytes to append
+        """
+        if not data:
+            return
+        self._memory += data
+
+        overflow = len(self._memory) - self.capacity
+        if overflow > 0:
+            # Spill before evicting, so the bytes stay readable meanwhile
+            room = self.spill_capacity - self._spilled
+            if room > 0 and self._spilled == self._memory_start:
+                spilled = bytes(self._memory[:min(overflow, room)])
+                await run_file_io(self._write_spill, spilled, self._spilled)
+                self._spilled += len(spilled)
+            del self._memory[:overflow]
+            self._memory_start += overflow
+
+        self._notify()
+
+    def close(self):
+        """Mark the end of the stream."""
+        self._closed = True
+        self._notify()
+
+    def release(self):
+        """
+        Free the memory and the spill file of the buffer.
+
+        The size of the stream is kept, so readers still polling by offset
+        get no bytes and an expired chunk rather than offsets that went back.
+        """
+        self._memory_start += len(self._memory)
+        self._memory = bytearray()
+        self._spilled = 0
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._released = True
+        self.close()
+
+    async def read(self, offset: int, max_bytes: int) -> OutputChunk:
+        """
+        Read the bytes of the stream from an offset.
+
+        Reads never split a UTF-8 character unless the stream ends there.
+
+        Args:
+            offset: The offset to read from, usually the next_offset of the previous read
+            max_bytes: Largest number of bytes to read
+
+        Returns:
+            The bytes read, the offset they start at, the offset to read from
+            next, the number of bytes skipped because they were dropped, and
+            whether the buffer was released
+        """
+        offset = max(0, min(offset, self.size))
+        if self._released:
+            return OutputChunk(b"", offset, self.size, self.size - offset, True)
+
+        dropped = 0
+
+        # Bytes between the end of the spill file and memory were dropped
+        if self._spilled <= offset < self._memory_start:
+            dropped = self._memory_start - offset
+            offset = self._memory_start
+
+        end = min(self.size, offset + max(0, max_bytes))
+        if offset >= self._memory_start:
+            start = offset - self._memory_start
+            data = bytes(self._memory[start:end - self._memory_start])
+        else:
+            memory_start = self._memory_start
+            spill_end = min(end, self._spilled)
+            data = await run_file_io(self._read_spill, offset, spill_end - offset)
+
+            # Continue into memory, unless it moved on during the read
+            if end > spill_end and spill_end == memory_start == self._memory_start:
+                data += bytes(self._memory[:end - memory_start])
+
+        if not (self._closed and offset + len(data) == self.size):
+            data = data[:_utf8_boundary(data)]
+
+        return OutputChunk(data, offset, offset + len(data), dropped)
+
+    async def wait(self, offset: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until there is output past an offset or the stream ends.
+
+        Args:
+            offset: The offset read up to
+            timeout: Longest time to wait, in seconds
+
+        Returns:
+            True if there is output past the offset or the stream has ended
+        """
+        while self.size <= offset and not self._closed:
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def _notify(self):
+        """Wake up the readers waiting for output."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _write_spill(self, data: bytes, offset: int):
+        """Write spilled bytes to the spill file, creating it if needed."""
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="mcp-output-")
+        os.pwrite(self._spill.fileno(), data, offset)
+
+    def _read_spill(self, offset: int, length: int) -> bytes:
+        """Read bytes back from the spill file."""
+        if self._spill is None or length <= 0:
+            return b""
+        return os.pread(self._spill.fileno(), length, offset)
+
+
+class HeadTailBuffer:
+    """The first and last bytes of a stream, with the middle dropped past a cap."""
+
+    def __init__(self, max_bytes: int = DEFAULT_OUTPUT_CAP):
+        """
+        Initialize an empty buffer.
+
+        Args:
+            max_bytes: Bytes kept, half from the start of the stream and half from its end
+        """
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._head_bytes = max_bytes // 2
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    @property
+    def truncated(self) -> bool:
+        """Whether bytes were dropped from the middle of the stream."""
+        return self.total > len(self._head) + len(self._tail)
+
+    @property
+    def elided(self) -> int:
+        """Number of bytes dropped from the middle of the stream."""
+        return self.total - len(self._head) - len(self._tail)
+
+    def write(self, data: bytes):
+        """
+        Append bytes to the stream.
+
+        Args:
+            data: The bytes to append
+        """
+        self.total += len(data)
+        room = self._head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            excess = len(self._tail) - (self.max_bytes - self._head_bytes)
+            if excess > 0:
+                del self._tail[:excess]
+
+    def text(self) -> str:
+        """
+        Decode the kept bytes.
+
+        Returns:
+            The stream, or its start and end around a note of how many bytes
+            were elided; no UTF-8 character is split where they meet
+        """
+        if not self.truncated:
+            return (bytes(self._head) + bytes(self._tail)).decode("utf-8", errors="replace")
+
+        head = bytes(self._head[:_utf8_boundary(self._head)])
+        start = 0
+        while start < min(3, len(self._tail)) and self._tail[start] & 0xC0 == 0x80:
+            start += 1
+        tail = bytes(self._tail[start:])
+
+        elided = self.total - len(head) - len(tail)
+        return (
+            head.decode("utf-8", errors="replace")
+            + f"\n... [{elided} bytes elided] ...\n"
+            + tail.decode("utf-8", errors="replace")
+        )
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """Get the length of data without a UTF-8 character cut off at its end."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return len(data)
+        if byte >= 0xC0:
+            # A lead byte: keep the character only if it is complete
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) if back >= needed else len(data) - back
+    return len(data)
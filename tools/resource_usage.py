@@ -0,0 +1,438 @@
+"""
+Resource accounting for the commands run by run_command.
+
+Commands are spawned as AccountedProcesses: a thread reaps each one with
+wait4, which returns the CPU time, peak resident set size and block I/O of
+the shell and of every process it waited for. asyncio's own subprocesses are
+reaped by its child watcher, which throws these figures away.
+
+The kernel carries the memory high-water mark of the server over into the
+processes it spawns, so a wait4 peak RSS no higher than the server's own only
+says that the command used no more than that; it is reported as unknown.
+
+While a command runs, the same figures are sampled from /proc for every
+process in its process group. Completed commands are totalled per client
+and per workflow in a UsageLedger, to find the commands that load the
+machine. Where wait4 or /proc are unavailable, only the wall time is known
+and the other figures are None.
+"""
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+# Clients and workflows the ledger keeps totals for; the least recently
+# active ones are dropped past this
+DEFAULT_LEDGER_ENTRIES = 1000
+
+# Key of the commands run outside of a client connection, or for no workflow
+UNATTRIBUTED = "unattributed"
+
+# Bytes per block counted in ru_inblock and ru_oublock
+RUSAGE_BLOCK_BYTES = 512
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class ResourceUsage(NamedTuple):
+    """Resources used by a command, None where unknown."""
+    wall_seconds: float
+    user_cpu_seconds: Optional[float] = None
+    system_cpu_seconds: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the usage.
+
+        Returns:
+            The figures, with times rounded to the millisecond
+        """
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "user_cpu_seconds": _round(self.user_cpu_seconds),
+            "system_cpu_seconds": _round(self.system_cpu_seconds),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    """Round a time to the millisecond, keeping None."""
+    return round(value, 3) if value is not None else None
+
+
+class AccountedProcess:
+    """A shell command reaped with wait4, with its output piped."""
+
+    def __init__(self, popen: subprocess.Popen, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader):
+        """
+        Wrap a started process; use AccountedProcess.start to create one.
+
+        Args:
+            popen: The process
+            stdout: Reader of its stdout
+            stderr: Reader of its stderr
+        """
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self.usage: Optional[ResourceUsage] = None
+        self._started = time.monotonic()
+        self._spawner_peak_rss = _read_peak_rss(os.getpid())
+        self._exited = asyncio.get_running_loop().create_future()
+
+    @classmethod
+    async def start(cls, command_line: str, cwd: str, **options) -> "AccountedProcess":
+        """
+        Run a command line in a new shell.
+
+        Args:
+            command_line: The command line to run
+            cwd: The working directory of the command
+            **options: Further options of subprocess.Popen
+
+        Returns:
+            The running process
+        """
+        loop = asyncio.get_running_loop()
+        popen = subprocess.Popen(
+            command_line,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            **options
+        )
+        try:
+            stdout = await _connect_reader(loop, popen.stdout)
+            stderr = await _connect_reader(loop, popen.stderr)
+        except BaseException:
+            popen.kill()
+            popen.wait()
+            raise
+
+        process = cls(popen, stdout, stderr)
+        threading.Thread(target=process._reap, args=(loop,), name=f"reap-{popen.pid}", daemon=True).start()
+        return process
+
+    async def wait(self) -> int:
+        """
+        Wait for the process to exit.
+
+        Returns:
+            The exit code, negative if the process was killed by a signal
+        """
+        await asyncio.shield(self._exited)
+        return self.returncode
+
+    async def communicate(self) -> Tuple[bytes, bytes]:
+        """
+        Read all of the output of the process and wait for it to exit.
+
+        Returns:
+            The stdout and stderr of the process
+        """
+        stdout, stderr = await asyncio.gather(self.stdout.read(), self.stderr.read())
+        await self.wait()
+        return stdout, stderr
+
+    def sample(self) -> ResourceUsage:
+        """
+        Get the resources used so far.
+
+        Returns:
+            The final usage once the process has exited; until then, the
+            usage of the processes in its process group, read from /proc
+        """
+        if self.usage is not None:
+            return self.usage
+        return sample_process_group(self.pid, time.monotonic() - self._started)
+
+    def terminate(self):
+        """Ask the process to exit."""
+        if self.returncode is None:
+            self.popen.terminate()
+
+    def kill(self):
+        """Kill the process."""
+        if self.returncode is None:
+            self.popen.kill()
+
+    def _reap(self, loop: asyncio.AbstractEventLoop):
+        """Wait for the process in a thread, and hand its exit status to the loop."""
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(self.pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+            wall = time.monotonic() - self._started
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            peak_rss = rusage.ru_maxrss * (1 if os.uname().sysname == "Darwin" else 1024)
+            usage = ResourceUsage(
+                wall,
+                rusage.ru_utime,
+                rusage.ru_stime,
+                peak_rss if peak_rss > self._spawner_peak_rss else None,
+                rusage.ru_inblock * RUSAGE_BLOCK_BYTES,
+                rusage.ru_oublock * RUSAGE_BLOCK_BYTES
+            )
+        else:
+            returncode = self.popen.wait()
+            usage = ResourceUsage(time.monotonic() - self._started)
+
+        try:
+            loop.call_soon_threadsafe(self._set_exited, returncode, usage)
+        except RuntimeError:
+            # The loop was closed while the process was running
+            pass
+
+    def _set_exited(self, returncode: int, usage: ResourceUsage):
+        """Record the exit status of the process, on the loop."""
+        self.returncode = returncode
+        self.popen.returncode = returncode
+        self.usage = usage
+        if not self._exited.done():
+            self._exited.set_result(returncode)
+
+
+async def _connect_reader(loop: asyncio.AbstractEventLoop, pipe) -> asyncio.StreamReader:
+    """Read a pipe of a subprocess through a StreamReader."""
+    reader = asyncio.StreamReader(loop=loop)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe)
+    return reader
+
+
+def read_process_totals(pid: int) -> Optional[Tuple[float, float, int, int]]:
+    """
+    Read the CPU time and block I/O of a process and of the children it reaped.
+
+    Args:
+        pid: The ID of the process
+
+    Returns:
+        The user and system CPU seconds and the bytes read and written, or
+        None if /proc is unavailable or the process is gone
+    """
+    stat = _read_stat(pid)
+    if stat is None:
+        return None
+    io = _read_io(pid)
+    return (
+        (int(stat[11]) + int(stat[13])) / _CLOCK_TICKS,
+        (int(stat[12]) + int(stat[14])) / _CLOCK_TICKS,
+        io.get("read_bytes", 0),
+        io.get("write_bytes", 0)
+    )
+
+
+def sample_process_group(pgid: int, wall_seconds: float) -> ResourceUsage:
+    """
+    Total the resources used by the processes of a process group, from /proc.
+
+    CPU time and I/O include the children the processes have reaped; the
+    peak RSS is that of the largest process.
+
+    Args:
+        pgid: The ID of the process group
+        wall_seconds: The wall time to report
+
+    Returns:
+        The usage, with only the wall time if /proc is unavailable
+    """
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return ResourceUsage(wall_seconds)
+
+    user = system = 0.0
+    peak_rss = read_bytes = write_bytes = 0
+    for pid in pids:
+        stat = _read_stat(pid)
+        if stat is None or int(stat[2]) != pgid:
+            continue
+        user += (int(stat[11]) + int(stat[13])) / _CLOCK_TICKS
+        system += (int(stat[12]) + int(stat[14])) / _CLOCK_TICKS
+        peak_rss = max(peak_rss, _read_peak_rss(pid))
+        io = _read_io(pid)
+        read_bytes += io.get("read_bytes", 0)
+        write_bytes += io.get("write_bytes", 0)
+
+    return ResourceUsage(wall_seconds, user, system, peak_rss, read_bytes, write_bytes)
+
+
+def process_group_members(pgid: int) -> Optional[List[int]]:
+    """
+    List the live processes of a process group, from /proc.
+
+    Args:
+        pgid: The ID of the process group
+
+    Returns:
+        The process IDs, zombies excluded, or None if /proc is unavailable
+    """
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+
+    members = []
+    for pid in pids:
+        stat = _read_stat(pid)
+        if stat is not None and int(stat[2]) == pgid and stat[0] != b"Z":
+            members.append(pid)
+    return members
+
+
+def _read_stat(pid: int) -> Optional[list]:
+    """Read the fields of /proc/<pid>/stat after the command name."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may itself contain spaces
+    return data[data.rfind(b")") + 2:].split()
+
+
+def _read_peak_rss(pid: int) -> int:
+    """Read the peak resident set size of a process, in bytes."""
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _read_io(pid: int) -> Dict[str, int]:
+    """Read the block I/O counters of a process, empty if they are not readable."""
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            return {
+                key.decode(): int(value)
+                for key, value in (line.split(b":", 1) for line in f if b":" in line)
+            }
+    except (OSError, ValueError):
+        return {}
+
+
+class UsageTotals:
+    """Resources used by a set of commands."""
+
+    def __init__(self):
+        """Initialize empty totals."""
+        self.commands = 0
+        self.wall_seconds = 0.0
+        self.user_cpu_seconds = 0.0
+        self.system_cpu_seconds = 0.0
+        self.peak_rss_bytes = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+
+    def add(self, usage: ResourceUsage):
+        """
+        Add the usage of a command.
+
+        Args:
+            usage: The resources used by the command
+        """
+        self.commands += 1
+        self.wall_seconds += usage.wall_seconds
+        self.user_cpu_seconds += usage.user_cpu_seconds or 0.0
+        self.system_cpu_seconds += usage.system_cpu_seconds or 0.0
+        self.peak_rss_bytes = max(self.peak_rss_bytes, usage.peak_rss_bytes or 0)
+        self.read_bytes += usage.read_bytes or 0
+        self.write_bytes += usage.write_bytes or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the totals.
+
+        Returns:
+            The number of commands, their summed times and I/O, and the
+            largest peak RSS among them
+        """
+        return {
+            "commands": self.commands,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "user_cpu_seconds": round(self.user_cpu_seconds, 3),
+            "system_cpu_seconds": round(self.system_cpu_seconds, 3),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes
+        }
+
+
+class UsageLedger:
+    """Resources used by completed commands, per client and per workflow."""
+
+    def __init__(self, max_entries: int = DEFAULT_LEDGER_ENTRIES):
+        """
+        Initialize an empty ledger.
+
+        Args:
+            max_entries: Clients and workflows kept, each
+        """
+        self.max_entries = max_entries
+        self.total = UsageTotals()
+        self._clients: "OrderedDict[str, UsageTotals]" = OrderedDict()
+        self._workflows: "OrderedDict[str, UsageTotals]" = OrderedDict()
+
+    def record(self, usage: ResourceUsage, client: Optional[str] = None, workflow: Optional[str] = None):
+        """
+        Add the usage of a completed command.
+
+        Args:
+            usage: The resources used by the command
+            client: The client the command ran for
+            workflow: The workflow the command ran for
+        """
+        self.total.add(usage)
+        self._totals(self._clients, client or UNATTRIBUTED).add(usage)
+        self._totals(self._workflows, workflow or UNATTRIBUTED).add(usage)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the totals.
+
+        Returns:
+            The overall totals, and the totals of each client and workflow
+        """
+        return {
+            "total": self.total.to_dict(),
+            "clients": {name: totals.to_dict() for name, totals in self._clients.items()},
+            "workflows": {name: totals.to_dict() for name, totals in self._workflows.items()}
+        }
+
+    def _totals(self, entries: OrderedDict, key: str) -> UsageTotals:
+        """Get the totals for a key, dropping the least recently active past the limit."""
+        totals = entries.get(key)
+        if totals is None:
+            totals = entries[key] = UsageTotals()
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        entries.move_to_end(key)
+        return totals
+
+
+_ledger = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """
+    Get the ledger shared by all tools.
+
+    Returns:
+        The shared usage ledger
+    """
+    return _ledger
@@ -4,9 +4,22 @@ Run Command Tool implementation.
 import asyncio
 import json
 import os
+import signal
 import subprocess
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from .base_tool import BaseTool
+from .command_cache import CachedResult, get_command_cache
+from .command_manager import (
+    DRAIN_CHUNK_BYTES, DRAIN_GRACE_SECONDS, KILL_GRACE_SECONDS, get_command_manager,
+    signal_process_group, spawn_command
+)
+from .command_scheduler import INTERACTIVE, PRIORITIES, get_command_scheduler
+from .dispatch import get_current_client
+from .file_io import run_file_io
+from .output_buffer import HeadTailBuffer
+from .resource_usage import ResourceUsage, get_usage_ledger
+from .shell_session import SessionError, SessionTimeout, get_session_pool
 
 
 class RunCommandTool(BaseTool):
@@ -32,11 +45,42 @@ class RunCommandTool(BaseTool):
             },
             "WaitMsBeforeAsync": {
               "type": "integer",
-              "description": "Only applicable if Blocking is false. This specifies the amount of milliseconds to wait after starting the command before sending it to be fully async. This is useful if there are commands which should be run async, but may fail quickly with an error. This allows you to see the error if it happens in this duration. Don't set it too long or you may keep everyone waiting."
+              "description": "Only applicable if Blocking is false. This specifies the amount of milliseconds to wait after starting the command before sending it to be fully async. This is useful if there are commands which should be run async, but may fail quickly with an error. This allows you to see the error if it happens in this duration. Don't set it too long or you may keep everyone waiting. The command only counts against the limit on commands running at once for this long, so long-running processes such as web servers do not hold up other commands."
             },
             "SafeToAutoRun": {
               "type": "boolean",
               "description": "Set to true if you believe that this command is safe to run WITHOUT user approval. A command is unsafe if it may have some destructive side-effects. Example unsafe side-effects include: deleting files, mutating state, installing system dependencies, making external requests, etc. Set to true only if you are extremely confident it is safe. If you feel the command could be unsafe, never set this to true, EVEN if the USER asks you to. It is imperative that you never auto-run a potentially unsafe command."
+            },
+            "Priority": {
+              "type": "string",
+              "enum": ["interactive", "workflow"],
+              "description": "interactive for a command the USER is waiting on, workflow for a command run as part of a longer automated task, such as a build or test run started by a workflow. When too many commands are running, queued interactive commands start first. Defaults to interactive."
+            },
+            "CacheInputs": {
+              "type": "array",
+              "items": {"type": "string"},
+              "minItems": 1,
+              "description": "Only applicable if Blocking is true. Glob patterns, relative to Cwd, of every file the command reads, such as src/**/*.ts and tsconfig.json; ** matches any number of directories. If set, the result is cached: running the same command again while none of these files has changed returns the stored result at once, with cached set to true. Only set this for commands whose result depends on nothing but these files, such as linters, type checkers and tests; never for commands with side effects."
+            },
+            "CacheEnv": {
+              "type": "array",
+              "items": {"type": "string"},
+              "description": "Only applicable with CacheInputs. Names of the environment variables the result of the command depends on, such as NODE_ENV."
+            },
+            "TimeoutMs": {
+              "type": "integer",
+              "minimum": 1,
+              "description": "Only applicable if Blocking is true. Longest time to wait for the command, in milliseconds, including any time spent queued for a slot; past it, the command and every process it started are killed, and the output printed so far is returned with status timed_out. A command still queued by then is not run at all and returns status timed_out with a null exit_code. Defaults to the server's timeout, 10 minutes unless configured otherwise."
+            },
+            "MaxOutputBytes": {
+              "type": "integer",
+              "minimum": 1024,
+              "maximum": 16777216,
+              "description": "Only applicable if Blocking is true. Largest number of bytes of each of stdout and stderr returned. Longer output keeps its start and its end, with the middle elided, and sets truncated. Defaults to 262144."
+            },
+            "WorkflowId": {
+              "type": "string",
+              "description": "The ID of the workflow this command is run for, as returned by the orchestrator, if any. The resources used by commands are totalled per workflow."
             }
           },
           "additionalProperties": false,
@@ -53,12 +97,14 @@ class RunCommandTool(BaseTool):
             "Note that the user will have to approve the command before it is executed. The user may reject it if it is not to their liking.\n"
             "The actual command will NOT execute until the user approves it. The user may not approve it immediately.\n"
             "If the step is WAITING for user approval, it has NOT started running.\n"
+            "The output of a non-blocking command is kept as it is printed; read it with command_output, using the command ID returned by this tool.\n"
+            "Only a limited number of commands run at once; past that, commands are queued, and a queued non-blocking command reports its queue_position. A non-blocking command only counts against the limit for its first WaitMsBeforeAsync milliseconds. Results report the time spent queued and running separately, and the resources the command used: CPU time, peak memory and disk I/O.\n"
+            "A blocking command is killed after TimeoutMs, counted from when it is submitted, queued or not, and the middle of long output is elided, keeping its start and end.\n"
+            "Set CacheInputs on blocking lint, type-check and test commands to get the stored result at once when the command is run again on unchanged files.\n"
             "Commands will be run with PAGER=cat. You may want to limit the length of output for commands that usually rely on paging and may contain very long output (e.g. git log, use git log -n <N>)."
         )
         
         super().__init__("run_command", description, schema)
-        self._command_counter = 0
-        self._running_commands = {}
     
     async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -80,6 +126,8 @@ class RunCommandTool(BaseTool):
         blocking = params.get("Blocking", True)
         wait_ms = params.get("WaitMsBeforeAsync", 0)
         safe_to_auto_run = params.get("SafeToAutoRun", False)
+        priority = params.get("Priority", INTERACTIVE)
+        workflow_id = params.get("WorkflowId")
         
         # Check if the command is safe to run
         if not safe_to_auto_run:
@@ -90,65 +138,251 @@ class RunCommandTool(BaseTool):
                 "cwd": cwd
             }
         
+        if priority not in PRIORITIES:
+            return {"error": f"Unknown priority: {priority}"}
+        
         # Generate a unique command ID
-        self._command_counter += 1
-        command_id = f"cmd_{self._command_counter}"
+        manager = get_command_manager()
+        command_id = manager.next_id()
+        client = get_current_client()
         
         try:
             if blocking:
-                # Run the command and wait for it to complete
-                process = await asyncio.create_subprocess_shell(
-                    command_line,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd
+                return await self._run_blocking(
+                    command_id, command_line, cwd, client, priority,
+                    params.get("CacheInputs"), params.get("CacheEnv", []), workflow_id,
+                    params.get("TimeoutMs"), params.get("MaxOutputBytes")
                 )
-                
-                stdout, stderr = await process.communicate()
-                
-                return {
-                    "command_id": command_id,
-                    "status": "completed",
-                    "exit_code": process.returncode,
-                    "stdout": stdout.decode('utf-8', errors='replace'),
-                    "stderr": stderr.decode('utf-8', errors='replace')
-                }
-            else:
-                # Start the command but don't wait for it to complete
-                process = await asyncio.create_subprocess_shell(
-                    command_line,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd
-                )
-                
-                # Store the process for later status checks
-                self._running_commands[command_id] = process
-                
-                # Wait for the specified time before returning
-                if wait_ms > 0:
-                    try:
-                        await asyncio.wait_for(process.wait(), timeout=wait_ms / 1000)
-                        stdout, stderr = await process.communicate()
-                        
-                        return {
-                            "command_id": command_id,
-                            "status": "completed",
-                            "exit_code": process.returncode,
-                            "stdout": stdout.decode('utf-8', errors='replace'),
-                            "stderr": stderr.decode('utf-8', errors='replace')
-                        }
-                    except asyncio.TimeoutError:
-                        # Command is still running
-                        pass
-                
+            
+            # Start the command in the background, or queue it if too many
+            # are running; its output is drained into bounded buffers, read
+            # back with command_output. It gives its slot back after
+            # WaitMsBeforeAsync, so servers and watchers do not hold it
+            # until they are killed
+            command = await manager.start(
+                command_line, cwd, command_id, client, priority, workflow_id, slot_seconds=wait_ms / 1000
+            )
+            
+            # Wait for the specified time before returning
+            if wait_ms > 0 and await command.wait(wait_ms / 1000):
+                return await command.read(max_bytes=max(command.stdout.size, command.stderr.size))
+            
+            if command.status == "queued":
                 return {
                     "command_id": command_id,
-                    "status": "running",
-                    "message": f"Command started with ID {command_id}"
+                    "status": "queued",
+                    "queue_position": command.queue_position,
+                    "message": f"Command queued with ID {command_id}; it starts when a slot frees up"
                 }
+            
+            return {
+                "command_id": command_id,
+                "status": "running",
+                "queue_wait_seconds": round(command.queue_wait, 3),
+                "message": f"Command started with ID {command_id}; read its output with command_output"
+            }
         
         except Exception as e:
             return {
                 "error": f"Failed to execute command: {str(e)}"
             }
+    
+    async def _run_blocking(
+        self,
+        command_id: str,
+        command_line: str,
+        cwd: str,
+        client: Optional[str],
+        priority: str,
+        cache_inputs: Optional[List[str]] = None,
+        cache_env: Optional[List[str]] = None,
+        workflow_id: Optional[str] = None,
+        timeout_ms: Optional[int] = None,
+        max_output_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run a command once the scheduler gives it a slot, and wait for it to complete.
+        
+        The timeout covers the wait for a slot as well as the run: a command
+        still queued when it expires is not run, and one that starts gets
+        what is left of it. If the call is cancelled, because the client
+        disconnected, the command and every process it started are killed.
+        
+        Args:
+            command_id: The ID of the command
+            command_line: The command line to run
+            cwd: The working directory of the command
+            client: The client the command runs for
+            priority: The priority class of the command
+            cache_inputs: Glob patterns of the files the command reads, to
+                cache its result by; not cached if None
+            cache_env: Names of the environment variables the result depends on
+            workflow_id: The workflow the command runs for
+            timeout_ms: Longest time to wait for the command, queued and
+                running; the default timeout if None
+            max_output_bytes: Bytes of each stream returned; the default cap if None
+            
+        Returns:
+            The exit code and output of the command, the time it spent queued
+            and running, and the resources it used
+        """
+        manager = get_command_manager()
+        timeout = timeout_ms / 1000 if timeout_ms is not None else manager.timeout
+        stdout = HeadTailBuffer(max_output_bytes or manager.output_cap)
+        stderr = HeadTailBuffer(max_output_bytes or manager.output_cap)
+        
+        # A cached result of the same command on the same inputs is returned
+        # without taking a slot
+        cache = get_command_cache() if cache_inputs else None
+        cache_key = None
+        if cache is not None:
+            started = time.time()
+            cache_key = await run_file_io(cache.key, command_line, cwd, cache_inputs, cache_env or [])
+            cached = cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                return {
+                    "command_id": command_id,
+                    "status": "completed",
+                    "exit_code": cached.exit_code,
+                    "stdout": cached.stdout,
+                    "stderr": cached.stderr,
+                    "truncated": cached.truncated,
+                    "queue_wait_seconds": 0.0,
+                    "run_seconds": round(time.time() - started, 3),
+                    "cached": True
+                }
+        
+        scheduler = get_command_scheduler()
+        ticket = scheduler.submit(client, priority)
+        try:
+            try:
+                # Cancelling the wait takes the ticket out of the queue
+                await asyncio.wait_for(scheduler.wait(ticket), timeout)
+            except asyncio.TimeoutError:
+                return {
+                    "command_id": command_id,
+                    "status": "timed_out",
+                    "exit_code": None,
+                    "stdout": "",
+                    "stderr": "",
+                    "truncated": False,
+                    "queue_wait_seconds": round(ticket.queue_wait, 3),
+                    "run_seconds": 0.0,
+                    "message": f"Command was still queued for a slot after {timeout:g} seconds and was not run"
+                }
+            started = time.time()
+            run_timeout = max(timeout - ticket.queue_wait, 0.001) if timeout is not None else None
+            
+            session_pool = get_session_pool()
+            if session_pool is not None:
+                # Run the command in a warm shell session instead of a new shell
+                try:
+                    exit_code, _, _, usage = await session_pool.run(command_line, cwd, run_timeout, stdout, stderr)
+                    timed_out = False
+                except SessionTimeout:
+                    # The session was killed together with the command
+                    exit_code, usage, timed_out = None, None, True
+                except SessionError as e:
+                    return {"error": f"Failed to execute command: {str(e)}"}
+            else:
+                exit_code, usage, timed_out = await self._run_process(command_line, cwd, run_timeout, stdout, stderr)
+            run_seconds = time.time() - started
+        finally:
+            scheduler.release(ticket)
+        
+        usage = usage or ResourceUsage(run_seconds)
+        get_usage_ledger().record(usage, client, workflow_id)
+        
+        stdout_text, stderr_text = stdout.text(), stderr.text()
+        truncated = stdout.truncated or stderr.truncated
+        
+        # The result is only stored if the command finished and its inputs
+        # did not change while it was running
+        if cache_key is not None and not timed_out:
+            if await run_file_io(cache.key, command_line, cwd, cache_inputs, cache_env or []) == cache_key:
+                cache.put(cache_key, CachedResult(
+                    exit_code, stdout_text, stderr_text, run_seconds, time.time(), truncated
+                ))
+        
+        result = {
+            "command_id": command_id,
+            "status": "timed_out" if timed_out else "completed",
+            "exit_code": exit_code,
+            "stdout": stdout_text,
+            "stderr": stderr_text,
+            "truncated": truncated,
+            "queue_wait_seconds": round(ticket.queue_wait, 3),
+            "run_seconds": round(run_seconds, 3),
+            "resources": usage.to_dict()
+        }
+        if truncated:
+            result["elided_bytes"] = {"stdout": stdout.elided, "stderr": stderr.elided}
+        if timed_out:
+            result["message"] = f"Command timed out after {timeout:g} seconds and was killed"
+        if cache is not None:
+            result["cached"] = False
+        return result
+    
+    async def _run_process(
+        self,
+        command_line: str,
+        cwd: str,
+        timeout: float,
+        stdout: HeadTailBuffer,
+        stderr: HeadTailBuffer
+    ) -> Tuple[Optional[int], Optional[ResourceUsage], bool]:
+        """
+        Run a command in a new shell, draining its output into capped buffers.
+        
+        Args:
+            command_line: The command line to run
+            cwd: The working directory of the command
+            timeout: Seconds after which the command is killed
+            stdout: Buffer the stdout of the command is written to
+            stderr: Buffer the stderr of the command is written to
+            
+        Returns:
+            The exit code, the resources used, and whether the command timed out
+        """
+        # Reaped with wait4, to get the resources the command used, and in a
+        # process group of its own, so it can be killed with its children
+        process = await spawn_command(command_line, cwd)
+        drainers = [
+            asyncio.create_task(_drain(process.stdout, stdout)),
+            asyncio.create_task(_drain(process.stderr, stderr))
+        ]
+        
+        try:
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+                signal_process_group(process, signal.SIGTERM)
+                try:
+                    await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+                except asyncio.TimeoutError:
+                    signal_process_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+                    await process.wait()
+            
+            # Output still in flight; a background child holding a pipe open
+            # does not keep the call waiting past this
+            await asyncio.wait(drainers, timeout=DRAIN_GRACE_SECONDS)
+        except BaseException:
+            # The call was cancelled: nobody is waiting for the command anymore
+            signal_process_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+            raise
+        finally:
+            for drainer in drainers:
+                drainer.cancel()
+        
+        return process.returncode, process.usage, timed_out
+
+
+async def _drain(stream: asyncio.StreamReader, output: HeadTailBuffer):
+    """Copy a pipe into a capped buffer until it is closed."""
+    while True:
+        chunk = await stream.read(DRAIN_CHUNK_BYTES)
+        if not chunk:
+            return
+        output.write(chunk)
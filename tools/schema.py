@@ -0,0 +1,242 @@
+"""
+Compiled JSON schema validation for tool parameters.
+
+Tool schemas are compiled once into a tree of small validator functions, so
+validating a call costs a few dictionary lookups and isinstance checks
+instead of re-reading the schema. The supported subset covers what the tool
+schemas use: type, properties, required, additionalProperties, items, enum,
+minimum, maximum, minItems, maxItems and anyOf.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# A compiled validator takes a value and the path of that value in the
+# parameters, and returns an error message or None
+Validator = Callable[[Any, str], Optional[str]]
+
+# Python types accepted for each JSON schema type. Booleans are excluded from
+# the numeric types explicitly, since bool is a subclass of int.
+_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list, tuple),
+    "null": (type(None),),
+}
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], Optional[str]]:
+    """
+    Compile a JSON schema into a validator.
+
+    Args:
+        schema: The parsed JSON schema
+
+    Returns:
+        A function taking the parameters of a call and returning an error
+        message if they do not match the schema, None otherwise
+
+    Raises:
+        ValueError: If the schema uses an unknown type
+    """
+    validator = _compile(schema)
+
+    def validate(params: Any) -> Optional[str]:
+        return validator(params, "")
+
+    return validate
+
+
+def _compile(schema: Dict[str, Any]) -> Validator:
+    """Compile a schema node into a validator."""
+    checks: List[Validator] = []
+
+    if "type" in schema:
+        checks.append(_compile_type(schema["type"]))
+
+    if "enum" in schema:
+        checks.append(_compile_enum(schema["enum"]))
+
+    if "minimum" in schema or "maximum" in schema:
+        checks.append(_compile_range(schema.get("minimum"), schema.get("maximum")))
+
+    if "properties" in schema or "required" in schema or "additionalProperties" in schema:
+        checks.append(_compile_object(schema))
+
+    if "items" in schema or "minItems" in schema or "maxItems" in schema:
+        checks.append(_compile_array(schema))
+
+    if "anyOf" in schema:
+        checks.append(_compile_any_of(schema["anyOf"]))
+
+    if not checks:
+        return lambda value, path: None
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value: Any, path: str) -> Optional[str]:
+        for check in checks:
+            error = check(value, path)
+            if error:
+                return error
+        return None
+
+    return validate
+
+
+def _compile_any_of(schemas: List[Dict[str, Any]]) -> Validator:
+    """Compile alternatives, reporting the error of the first one if none match."""
+    alternatives = [_compile(alternative) for alternative in schemas]
+
+    def validate(value: Any, path: str) -> Optional[str]:
+        first_error = None
+        for alternative in alternatives:
+            error = alternative(value, path)
+            if not error:
+                return None
+            first_error = first_error or error
+        return first_error
+
+    return validate
+
+
+def _compile_type(type_spec: Any) -> Validator:
+    """Compile a type constraint."""
+    names = [type_spec] if isinstance(type_spec, str) else list(type_spec)
+    for name in names:
+        if name not in _TYPES:
+            raise ValueError(f"Unsupported schema type: {name}")
+
+    accepted = tuple(t for name in names for t in _TYPES[name])
+    allows_bool = "boolean" in names
+    expected = " or ".join(names)
+
+    def validate(value: Any, path: str) -> Optional[str]:
+        if isinstance(value, accepted) and (allows_bool or not isinstance(value, bool)):
+            return None
+        return (
+            f"Invalid type for parameter {_describe(path)}: "
+            f"expected {expected}, got {_json_type(value)}"
+        )
+
+    return validate
+
+
+def _compile_enum(options: List[Any]) -> Validator:
+    """Compile an enum constraint."""
+    def validate(value: Any, path: str) -> Optional[str]:
+        if value in options:
+            return None
+        return f"Invalid value for parameter {_describe(path)}: must be one of {options}"
+
+    return validate
+
+
+def _compile_range(minimum: Optional[float], maximum: Optional[float]) -> Validator:
+    """Compile minimum/maximum constraints."""
+    def validate(value: Any, path: str) -> Optional[str]:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return None
+        if minimum is not None and value < minimum:
+            return f"Invalid value for parameter {_describe(path)}: must be at least {minimum}"
+        if maximum is not None and value > maximum:
+            return f"Invalid value for parameter {_describe(path)}: must be at most {maximum}"
+        return None
+
+    return validate
+
+
+def _compile_object(schema: Dict[str, Any]) -> Validator:
+    """Compile the properties, required and additionalProperties constraints."""
+    properties = {
+        name: _compile(subschema)
+        for name, subschema in schema.get("properties", {}).items()
+    }
+    required = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", True)
+    additional_validator = _compile(additional) if isinstance(additional, dict) else None
+
+    def validate(value: Any, path: str) -> Optional[str]:
+        if not isinstance(value, dict):
+            return None
+
+        for name in required:
+            if name not in value:
+                return f"Missing required parameter: {_join(path, name)}"
+
+        for name, item in value.items():
+            validator = properties.get(name)
+            if validator is None:
+                if additional is False:
+                    return f"Unexpected parameter: {_join(path, name)}"
+                validator = additional_validator
+                if validator is None:
+                    continue
+
+            error = validator(item, _join(path, name))
+            if error:
+                return error
+
+        return None
+
+    return validate
+
+
+def _compile_array(schema: Dict[str, Any]) -> Validator:
+    """Compile the items, minItems and maxItems constraints."""
+    items = schema.get("items")
+    item_validator = _compile(items) if isinstance(items, dict) else None
+    min_items = schema.get("minItems")
+    max_items = schema.get("maxItems")
+
+    def validate(value: Any, path: str) -> Optional[str]:
+        if not isinstance(value, (list, tuple)):
+            return None
+
+        if min_items is not None and len(value) < min_items:
+            return f"Invalid value for parameter {_describe(path)}: expected at least {min_items} items"
+
+        if max_items is not None and len(value) > max_items:
+            return f"Invalid value for parameter {_describe(path)}: expected at most {max_items} items"
+
+        if item_validator is not None:
+            for index, item in enumerate(value):
+                error = item_validator(item, f"{path}[{index}]")
+                if error:
+                    return error
+
+        return None
+
+    return validate
+
+
+def _join(path: str, name: str) -> str:
+    """Append a property name to a parameter path."""
+    return f"{path}.{name}" if path else name
+
+
+def _describe(path: str) -> str:
+    """Describe a parameter path in error messages."""
+    return path or "parameters"
+
+
+def _json_type(value: Any) -> str:
+    """Get the JSON type name of a value."""
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if value is None:
+        return "null"
+    return type(value).__name__
@@ -0,0 +1,95 @@
+"""
+JSON serialization for the MCP server tools.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Every module should go through loads/dumps here rather than
+calling json directly, so the hot paths pick up the fast codec.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Raised by loads for invalid input, whichever backend is in use
+# (orjson.JSONDecodeError is a subclass of json.JSONDecodeError)
+JSONDecodeError = json.JSONDecodeError
+
+# Name of the backend in use
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    _ORJSON_INDENT_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse a JSON document.
+
+    Args:
+        data: The document, as str or UTF-8 bytes
+
+    Returns:
+        The parsed value
+
+    Raises:
+        JSONDecodeError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize a value to UTF-8 encoded JSON.
+
+    Args:
+        obj: The value to serialize
+        indent: If true, indent the output by two spaces
+
+    Returns:
+        The serialized value
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_INDENT_OPTIONS if indent else _ORJSON_OPTIONS)
+        except TypeError:
+            # Values orjson refuses, such as integers wider than 64 bits
+            pass
+    return _stdlib_dumps(obj, indent).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Serialize a value to a JSON string.
+
+    The output is compact unless indent is set, and non-ASCII characters are
+    written as-is rather than escaped.
+
+    Args:
+        obj: The value to serialize
+        indent: If true, indent the output by two spaces
+
+    Returns:
+        The serialized value
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj, option=_ORJSON_INDENT_OPTIONS if indent else _ORJSON_OPTIONS
+            ).decode("utf-8")
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, indent)
+
+
+def _stdlib_dumps(obj: Any, indent: bool) -> str:
+    """Serialize a value with the standard library, matching the orjson output."""
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,477 @@
+"""
+Persistent shell sessions for running short commands.
+
+Starting a shell for every command costs a fork, an exec and the shell's own
+startup. A ShellSession keeps one shell running and writes each command to
+its stdin instead, evaluated in a subshell so that cd, export, exit or a
+syntax error in one command do not affect the next. After the command, the
+shell prints a sentinel line carrying the exit code to stdout, and another to
+stderr; the output of the command is everything before them. The output is
+written to capped HeadTailBuffers as it is read, so a command printing a lot
+does not fill up the server's memory.
+
+Processes a command leaves running in the background still hold the shell's
+stdout and stderr, and would write into the output of the commands after it.
+Each command's output therefore starts at a line the shell prints before it,
+which drops anything written in between, and a session whose process group
+still has processes other than the shell once a command is done is not
+reused: it is closed, killing them, as it would be after a timeout.
+
+A ShellSessionPool keeps idle sessions per working directory. A session
+whose command does not finish within the timeout, or whose shell dies, is
+killed and evicted from the pool rather than reused. Sessions need a POSIX
+shell and /proc to find leftover processes; elsewhere the pool is
+unavailable and commands are spawned as usual.
+
+The session shell reaps each command, so the CPU time and block I/O of a
+command are the growth of the shell's totals for its reaped children while
+it ran; its peak RSS is not known.
+"""
+import asyncio
+import logging
+import os
+import shlex
+import signal
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+from .output_buffer import DEFAULT_OUTPUT_CAP, HeadTailBuffer
+from .resource_usage import ResourceUsage, process_group_members, read_process_totals
+
+logger = logging.getLogger(__name__)
+
+# Whether blocking commands run in shell sessions, overridable with
+# MCP_SHELL_SESSIONS
+DEFAULT_SHELL_SESSIONS = os.environ.get("MCP_SHELL_SESSIONS", "").lower() in ("1", "true", "yes")
+
+# Shell run by the sessions
+SESSION_SHELL = "/bin/sh"
+
+# Idle sessions kept per working directory
+DEFAULT_MAX_IDLE_PER_CWD = 4
+
+# Sessions kept in total, idle or busy
+DEFAULT_MAX_SESSIONS = 16
+
+# Seconds an idle session is kept before it is closed
+DEFAULT_IDLE_SECONDS = 300.0
+
+# Seconds a command may run in a session before the session is considered
+# stuck and evicted, overridable with MCP_SESSION_TIMEOUT
+DEFAULT_SESSION_TIMEOUT = float(os.environ.get("MCP_SESSION_TIMEOUT", "600"))
+
+# Bytes read from the shell's pipes at a time
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class SessionError(Exception):
+    """A session that died or got stuck running a command."""
+
+
+class SessionTimeout(SessionError):
+    """A command that ran past its timeout; the session was killed with it."""
+
+
+class SessionResult(NamedTuple):
+    """The result of a command run in a session."""
+    exit_code: int
+    stdout: HeadTailBuffer
+    stderr: HeadTailBuffer
+    usage: Optional[ResourceUsage] = None
+
+
+def sessions_supported() -> bool:
+    """
+    Check whether shell sessions can be used on this system.
+
+    Returns:
+        True if a POSIX shell and /proc are available
+    """
+    return os.name == "posix" and os.path.exists(SESSION_SHELL) and os.path.isdir("/proc")
+
+
+class ShellSession:
+    """A long-lived shell running commands one at a time."""
+
+    def __init__(self, cwd: str, process: asyncio.subprocess.Process):
+        """
+        Wrap a running shell; use ShellSession.start to create one.
+
+        Args:
+            cwd: The working directory of the shell
+            process: The shell process, with stdin, stdout and stderr piped
+        """
+        self.cwd = cwd
+        self.process = process
+        self.commands_run = 0
+        self.last_used = time.monotonic()
+        # Cleared once a command leaves processes running in the session
+        self.reusable = True
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+
+    @classmethod
+    async def start(cls, cwd: str) -> "ShellSession":
+        """
+        Start a shell session.
+
+        Args:
+            cwd: The working directory of the shell
+
+        Returns:
+            The new session
+        """
+        process = await asyncio.create_subprocess_exec(
+            SESSION_SHELL,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            start_new_session=True
+        )
+        return cls(cwd, process)
+
+    @property
+    def alive(self) -> bool:
+        """Whether the shell is still running."""
+        return self.process.returncode is None
+
+    async def run(
+        self,
+        command_line: str,
+        timeout: Optional[float] = DEFAULT_SESSION_TIMEOUT,
+        stdout: Optional[HeadTailBuffer] = None,
+        stderr: Optional[HeadTailBuffer] = None
+    ) -> SessionResult:
+        """
+        Run a command in the session.
+
+        Args:
+            command_line: The command line to run
+            timeout: Longest time the command may run, in seconds
+            stdout: Buffer the stdout of the command is written to; a new one by default
+            stderr: Buffer the stderr of the command is written to; a new one by default
+
+        Returns:
+            The exit code and output of the command; if the command left
+            processes running, the session is no longer reusable
+
+        Raises:
+            SessionError: If the shell died or the command timed out; the
+                session is closed and must not be reused, and the buffers
+                hold the output printed until then
+        """
+        stdout = stdout if stdout is not None else HeadTailBuffer(DEFAULT_OUTPUT_CAP)
+        stderr = stderr if stderr is not None else HeadTailBuffer(DEFAULT_OUTPUT_CAP)
+        token = uuid.uuid4().hex
+        start = f"__mcp_start_{token}__".encode("ascii")
+        sentinel = f"__mcp_session_{token}__".encode("ascii")
+
+        # The command is evaluated in a subshell reading from /dev/null, so
+        # it can neither change the session nor consume the commands that
+        # follow, and a syntax error only fails the subshell; the output
+        # starts after the start lines, and the sentinels start on a new line
+        # even if the output does not end with one
+        script = (
+            f"printf '%s\\n' {start.decode()}\n"
+            f"printf '%s\\n' {start.decode()} >&2\n"
+            f"(cd {shlex.quote(self.cwd)} || exit 1; eval {shlex.quote(command_line)}) < /dev/null\n"
+            f"printf '\\n%s %d\\n' {sentinel.decode()} $?\n"
+            f"printf '\\n%s\\n' {sentinel.decode()} >&2\n"
+        )
+
+        before = read_process_totals(self.process.pid)
+        started = time.monotonic()
+
+        readers = None
+        try:
+            self.process.stdin.write(script.encode("utf-8"))
+            await self.process.stdin.drain()
+
+            readers = asyncio.gather(
+                _read_until_sentinel(self.process.stdout, self._stdout, start, sentinel, stdout),
+                _read_until_sentinel(self.process.stderr, self._stderr, start, sentinel, stderr)
+            )
+            status, _ = await asyncio.wait_for(readers, timeout)
+        except asyncio.TimeoutError:
+            # Keep the output read but not yet written out, as no sentinel is coming
+            stdout.write(bytes(self._stdout))
+            stderr.write(bytes(self._stderr))
+            await self.close()
+            raise SessionTimeout(f"Command timed out after {timeout:g} seconds")
+        except (OSError, EOFError, ValueError) as e:
+            await self.close()
+            raise SessionError(f"Shell session failed: {str(e) or type(e).__name__}")
+        except BaseException:
+            # A cancelled command leaves the shell in an unknown state
+            await self.close()
+            raise
+        finally:
+            # A cancelled gather holds an exception that is logged unless retrieved
+            if readers is not None and readers.done() and not readers.cancelled():
+                readers.exception()
+
+        # Processes left in the background would write into the output of
+        # the next command
+        members = process_group_members(self.process.pid)
+        if members is None or any(pid != self.process.pid for pid in members):
+            self.reusable = False
+
+        self.commands_run += 1
+        self.last_used = time.monotonic()
+        return SessionResult(int(status), stdout, stderr, self._usage(before, self.last_used - started))
+
+    def _usage(self, before, wall_seconds: float) -> ResourceUsage:
+        """Get the resources used by a command from the growth of the shell's totals."""
+        after = read_process_totals(self.process.pid)
+        if before is None or after is None:
+            return ResourceUsage(wall_seconds)
+        user, system, read_bytes, write_bytes = (later - earlier for later, earlier in zip(after, before))
+        return ResourceUsage(wall_seconds, user, system, None, read_bytes, write_bytes)
+
+    async def close(self):
+        """Kill the shell and everything it started."""
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            logger.warning(f"Shell session {self.process.pid} did not exit")
+
+
+async def _read_until_sentinel(
+    stream: asyncio.StreamReader,
+    buffer: bytearray,
+    start: bytes,
+    sentinel: bytes,
+    output: HeadTailBuffer
+) -> bytes:
+    """
+    Read a pipe up to the sentinel line ending the output of a command.
+
+    Everything up to the start line is dropped: it was written by processes
+    an earlier command left behind. The output between the start line and
+    the sentinel is written out as it is read; only what may be the start of
+    the sentinel is kept in the buffer.
+
+    Returns:
+        What follows the sentinel on its line
+    """
+    start_line = start + b"\n"
+    while True:
+        position = buffer.find(start_line)
+        if position != -1:
+            del buffer[:position + len(start_line)]
+            break
+        del buffer[:max(len(buffer) - len(start_line) + 1, 0)]
+
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            raise EOFError("Shell exited")
+        buffer += chunk
+
+    marker = b"\n" + sentinel
+
+    while True:
+        position = buffer.find(marker)
+        if position != -1:
+            end = buffer.find(b"\n", position + len(marker))
+            output.write(bytes(buffer[:position]))
+            if end != -1:
+                status = bytes(buffer[position + len(marker):end]).strip()
+                del buffer[:end + 1]
+                return status
+            del buffer[:position]
+        else:
+            flushed = len(buffer) - len(marker) + 1
+            if flushed > 0:
+                output.write(bytes(buffer[:flushed]))
+                del buffer[:flushed]
+
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            raise EOFError("Shell exited")
+        buffer += chunk
+
+
+class ShellSessionPool:
+    """Idle shell sessions, by working directory."""
+
+    def __init__(
+        self,
+        max_idle_per_cwd: int = DEFAULT_MAX_IDLE_PER_CWD,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        idle_seconds: float = DEFAULT_IDLE_SECONDS,
+        timeout: Optional[float] = DEFAULT_SESSION_TIMEOUT
+    ):
+        """
+        Initialize an empty pool.
+
+        Args:
+            max_idle_per_cwd: Idle sessions kept per working directory
+            max_sessions: Sessions kept in total, idle or busy; commands past
+                this run in a session closed right after
+            idle_seconds: Seconds an idle session is kept
+            timeout: Longest time a command may run in a session
+        """
+        self.max_idle_per_cwd = max_idle_per_cwd
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self.started = 0
+        self.evicted = 0
+        self._idle: Dict[str, List[ShellSession]] = {}
+        self._busy = 0
+
+    @property
+    def idle_count(self) -> int:
+        """Number of idle sessions in the pool."""
+        return sum(len(sessions) for sessions in self._idle.values())
+
+    async def run(
+        self,
+        command_line: str,
+        cwd: str,
+        timeout: Optional[float] = None,
+        stdout: Optional[HeadTailBuffer] = None,
+        stderr: Optional[HeadTailBuffer] = None
+    ) -> SessionResult:
+        """
+        Run a command in an idle session for its working directory, starting one if needed.
+
+        Args:
+            command_line: The command line to run
+            cwd: The working directory of the command
+            timeout: Longest time the command may run, at most the pool's timeout
+            stdout: Buffer the stdout of the command is written to
+            stderr: Buffer the stderr of the command is written to
+
+        Returns:
+            The exit code and output of the command
+
+        Raises:
+            SessionError: If the session died or got stuck
+        """
+        cwd = os.path.abspath(cwd)
+        session = await self._acquire(cwd)
+        try:
+            if timeout is None or (self.timeout is not None and self.timeout < timeout):
+                timeout = self.timeout
+            result = await session.run(command_line, timeout, stdout, stderr)
+        except SessionError:
+            self.evicted += 1
+            raise
+        finally:
+            self._busy -= 1
+
+        await self._release(session)
+        return result
+
+    async def close(self):
+        """Close every idle session."""
+        sessions = [session for idle in self._idle.values() for session in idle]
+        self._idle.clear()
+        await asyncio.gather(*(session.close() for session in sessions))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get counters describing the pool.
+
+        Returns:
+            The number of idle and busy sessions, of sessions started, and of
+            sessions evicted after dying, getting stuck or leaving processes
+            running
+        """
+        return {
+            "idle": self.idle_count,
+            "busy": self._busy,
+            "started": self.started,
+            "evicted": self.evicted
+        }
+
+    async def _acquire(self, cwd: str) -> ShellSession:
+        """Take an idle session for a directory, or start a new one."""
+        await self._expire_idle()
+
+        idle = self._idle.get(cwd, [])
+        while idle:
+            session = idle.pop()
+            if session.alive:
+                self._busy += 1
+                return session
+            self.evicted += 1
+
+        session = await ShellSession.start(cwd)
+        self.started += 1
+        self._busy += 1
+        return session
+
+    async def _release(self, session: ShellSession):
+        """Put a session back in the pool, or close it if the pool is full."""
+        idle = self._idle.setdefault(session.cwd, [])
+        if not session.reusable:
+            self.evicted += 1
+        if (
+            session.alive
+            and session.reusable
+            and len(idle) < self.max_idle_per_cwd
+            and self.idle_count + self._busy < self.max_sessions
+        ):
+            idle.append(session)
+        else:
+            await session.close()
+
+    async def _expire_idle(self):
+        """Close the sessions that have been idle for too long."""
+        now = time.monotonic()
+        expired = []
+        for cwd, idle in list(self._idle.items()):
+            keep = [session for session in idle if now - session.last_used < self.idle_seconds]
+            expired.extend(session for session in idle if session not in keep)
+            if keep:
+                self._idle[cwd] = keep
+            else:
+                del self._idle[cwd]
+        if expired:
+            await asyncio.gather(*(session.close() for session in expired))
+
+
+_pool: Optional[ShellSessionPool] = None
+_sessions_enabled = DEFAULT_SHELL_SESSIONS
+
+
+def get_session_pool() -> Optional[ShellSessionPool]:
+    """
+    Get the shell session pool shared by all tools.
+
+    Returns:
+        The pool, or None if sessions are disabled or unsupported
+    """
+    global _pool
+    if not _sessions_enabled or not sessions_supported():
+        return None
+    if _pool is None:
+        _pool = ShellSessionPool()
+    return _pool
+
+
+def configure_shell_sessions(
+    enabled: bool,
+    max_idle_per_cwd: int = DEFAULT_MAX_IDLE_PER_CWD,
+    timeout: Optional[float] = DEFAULT_SESSION_TIMEOUT
+):
+    """
+    Enable or disable shell sessions for blocking commands.
+
+    Args:
+        enabled: Whether blocking commands run in shell sessions
+        max_idle_per_cwd: Idle sessions kept per working directory
+        timeout: Longest time a command may run in a session, in seconds
+    """
+    global _pool, _sessions_enabled
+    _sessions_enabled = enabled
+    _pool = ShellSessionPool(max_idle_per_cwd=max_idle_per_cwd, timeout=timeout) if enabled else None
@@ -0,0 +1,40 @@
+"""
+Tests of the ordering of tool calls within a message.
+"""
+import asyncio
+import os
+
+from ..dispatch import run_tool_calls, tool_call_keys
+
+
+def test_multi_file_calls_get_a_key_per_file():
+    call = {"name": "edit_files", "parameters": {
+        "Edits": [{"TargetFile": "/a", "CodeEdit": ""}, {"TargetFile": "/b", "CodeEdit": ""}],
+        "NewFiles": [{"TargetFile": "/c", "CodeContent": ""}, {"TargetFile": "/a", "CodeContent": ""}]
+    }}
+
+    assert tool_call_keys(call) == [os.path.normcase(os.path.abspath(path)) for path in ("/a", "/b", "/c")]
+
+
+def test_commands_are_not_ordered_by_working_directory():
+    call = {"name": "run_command", "parameters": {"CommandLine": "ls", "Cwd": "/tmp"}}
+
+    assert tool_call_keys(call) == []
+
+
+def test_call_on_several_files_waits_for_each_of_them():
+    calls = [
+        {"name": "slow", "parameters": {"TargetFile": "/a"}},
+        {"name": "fast", "parameters": {"TargetFile": "/b"}},
+        {"name": "view_files", "parameters": {"Files": [{"AbsolutePath": "/a"}, {"AbsolutePath": "/b"}]}},
+        {"name": "run_command", "parameters": {"Cwd": "/"}},
+    ]
+    finished = []
+
+    async def handler(tool_call):
+        if tool_call["name"] == "slow":
+            await asyncio.sleep(0.05)
+        finished.append(tool_call["name"])
+
+    assert asyncio.run(run_tool_calls(calls, handler)) == 4
+    assert finished == ["fast", "run_command", "slow", "view_files"]
@@ -0,0 +1,34 @@
+"""
+Tests of the anchored edit engine.
+"""
+import pytest
+
+from ..edit_engine import EditError, apply_edits
+
+
+ORIGINAL = "def a():\n    return 1\n\ndef b():\n    return 2\n"
+
+
+def test_block_with_both_anchors_replaces_the_lines_between_them():
+    edit = "{{ ... }}\ndef a():\n    return 10\n\ndef b():\n{{ ... }}"
+
+    content, _ = apply_edits(ORIGINAL, edit)
+
+    assert content == "def a():\n    return 10\n\ndef b():\n    return 2\n"
+
+
+@pytest.mark.parametrize("edit", [
+    # The last line of the block is blank
+    "{{ ... }}\ndef a():\n    return 10\n\n{{ ... }}",
+    # The last line of the block is not in the file
+    "{{ ... }}\ndef a():\n    return 10\n{{ ... }}",
+])
+def test_block_without_a_tail_anchor_is_rejected(edit):
+    with pytest.raises(EditError, match="last line"):
+        apply_edits(ORIGINAL, edit)
+
+
+def test_lines_added_at_the_end_of_the_file_need_no_tail_anchor():
+    content, _ = apply_edits(ORIGINAL, "{{ ... }}\n    return 2\n\ndef c():\n    return 3\n{{ ... }}")
+
+    assert content == ORIGINAL + "\ndef c():\n    return 3\n"
@@ -0,0 +1,63 @@
+"""
+Tests that file I/O done by the tools does not hold up other connections.
+"""
+import asyncio
+import json
+
+import websockets
+
+from ..file_io import get_file_executor
+from ..mcp_server import MCPServer
+
+
+def view_file_call(path: str, start_line: int, end_line: int) -> str:
+    """Build a message calling view_file."""
+    parameters = {
+        "AbsolutePath": path,
+        "StartLine": start_line,
+        "EndLine": end_line,
+        "IncludeSummaryOfOtherLines": True
+    }
+    return f"<view_file>{json.dumps(parameters)}</view_file>"
+
+
+async def serve_two_clients(large_path: str, small_path: str):
+    """Send a large view_file on one connection and a small one on another, recording the order of the responses."""
+    server = MCPServer()
+    finished = []
+
+    async with websockets.serve(server.handle_client, "localhost", 0) as ws_server:
+        port = next(iter(ws_server.sockets)).getsockname()[1]
+        url = f"ws://localhost:{port}"
+
+        async with websockets.connect(url) as large_client, websockets.connect(url) as small_client:
+            async def request(client, name: str, message: str):
+                await client.send(message)
+                await client.recv()
+                finished.append(name)
+
+            large = asyncio.create_task(request(large_client, "large", view_file_call(large_path, 1000000, 1000100)))
+
+            # Wait for the large read to be running in the file I/O pool
+            executor = get_file_executor()
+            for _ in range(500):
+                if executor.running:
+                    break
+                await asyncio.sleep(0.001)
+            assert executor.running, "the large view_file never reached the file I/O pool"
+
+            await request(small_client, "small", view_file_call(small_path, 0, 10))
+            await large
+
+    return finished
+
+
+def test_large_view_file_does_not_block_other_connections(tmp_path):
+    large_path = tmp_path / "large.log"
+    large_path.write_text("".join(f"line {i}: request handled in {i % 97} ms\n" for i in range(2000000)))
+    small_path = tmp_path / "small.txt"
+    small_path.write_text("".join(f"line {i}\n" for i in range(20)))
+
+    finished = asyncio.run(serve_two_clients(str(large_path), str(small_path)))
+
+    assert finished == ["small", "large"]
@@ -0,0 +1,17 @@
+"""
+Tests of the edit journal shared by several servers.
+"""
+from ..file_transaction import FileChange
+from ..journal import EditJournal
+
+
+def test_journals_sharing_a_directory_allocate_distinct_ids(tmp_path):
+    first = EditJournal(str(tmp_path))
+    second = EditJournal(str(tmp_path))
+
+    first_id = first.record("edit_file", [FileChange("/a.txt", "one\n", "two\n", None)])
+    second_id = second.record("edit_file", [FileChange("/a.txt", "two\n", "three\n", None)])
+
+    assert (first_id, second_id) == ("edit_1", "edit_2")
+    assert first.entry("edit_2")["files"][0]["forward"] == [[0, 1, ["three"]]]
+    assert second.entry("edit_1")["files"][0]["reverse"] == [[0, 1, ["one"]]]
@@ -0,0 +1,21 @@
+"""
+Tests of the output buffers of non-blocking commands.
+"""
+import asyncio
+
+from ..output_buffer import OutputBuffer
+
+
+def test_released_buffer_keeps_its_size_and_reports_expired_output():
+    async def run():
+        buffer = OutputBuffer(capacity=8, spill_capacity=16)
+        for _ in range(3):
+            await buffer.write(b"abcdefgh")
+        buffer.release()
+        return buffer.size, await buffer.read(4, 100)
+
+    size, chunk = asyncio.run(run())
+
+    assert size == 24
+    assert chunk.expired and chunk.data == b""
+    assert (chunk.next_offset, chunk.dropped) == (24, 20)
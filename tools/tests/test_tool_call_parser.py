@@ -0,0 +1,18 @@
+"""
+Tests of the incremental tool call parser.
+"""
+from ..tool_call_parser import iter_tool_calls
+
+
+def test_tags_around_plain_text_are_not_tool_calls():
+    calls = list(iter_tool_calls('<p>hi</p> <b>[1]</b> <view_file>{"Path": "a"}</view_file>'))
+
+    assert calls == [{"name": "view_file", "parameters": {"Path": "a"}}]
+
+
+def test_tags_around_invalid_json_objects_are_reported():
+    calls = list(iter_tool_calls('<view_file>{"Path": </view_file> <edit_file>{"Path": "a"'))
+
+    assert [call["name"] for call in calls] == ["view_file", "edit_file"]
+    assert calls[0]["error"].startswith("Invalid JSON parameters")
+    assert calls[1]["error"] == "Unterminated tool call: missing </edit_file>"
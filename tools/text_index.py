@@ -0,0 +1,389 @@
+"""
+Inverted full-text index with BM25 ranking.
+
+Documents are split into lowercase word tokens. For each token the index
+keeps the documents containing it, grouped by the number of occurrences and
+ordered by document length within a group; for each document it keeps its
+tokens with their counts, and its tokens in order, packed as 32-bit token
+IDs, so phrases can be checked without rereading the text. Documents are
+added, replaced and removed one at a time, and the index is always up to
+date.
+
+A query is a list of words, quoted "phrases" and prefixes ending in *.
+Documents matching any word or prefix are ranked by BM25; every phrase must
+appear in a document for it to match, and its words count towards the score.
+Only the best documents are wanted, so scoring stops early wherever it can:
+within a group the BM25 score of a word falls as documents get longer, so a
+group is only read until its documents can no longer reach the top results;
+words are scored from the rarest up, and once the words left cannot lift a
+new document into the top results, only documents already found are scored
+further (MaxScore).
+"""
+import bisect
+import heapq
+import math
+import re
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+# BM25 term frequency saturation and document length normalization
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Words a prefix expands to, the ones in the most documents first
+MAX_PREFIX_TERMS = 32
+
+# Words of the vocabulary looked at when expanding a prefix
+MAX_PREFIX_SCAN = 2000
+
+# Bytes taken by a token in the packed token stream of a document
+_TERM_SIZE = array("I").itemsize
+
+# Entries of a posting list pack the document length above the document ID,
+# so that sorting them orders documents by length
+_DOC_BITS = 32
+_DOC_MASK = (1 << _DOC_BITS) - 1
+
+_TOKEN = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]*)"|(\w+)\*|(\w+)')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens.
+
+    Args:
+        text: The text
+
+    Returns:
+        The tokens, in order
+    """
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query: str) -> Tuple[List[str], List[str], List[List[str]]]:
+    """
+    Split a query into words, prefixes and phrases.
+
+    Args:
+        query: The query; "quoted text" is a phrase and a word ending in * a prefix
+
+    Returns:
+        The words, the prefixes without their *, and the words of each phrase
+    """
+    words, prefixes, phrases = [], [], []
+    for phrase, prefix, word in _QUERY.findall(query.lower()):
+        if prefix:
+            prefixes.append(prefix)
+        elif word:
+            words.append(word)
+        else:
+            tokens = tokenize(phrase)
+            if tokens:
+                phrases.append(tokens)
+    return words, prefixes, phrases
+
+
+class TextIndex:
+    """An incrementally maintained inverted index of documents keyed by string."""
+
+    def __init__(self, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._term_ids: Dict[str, int] = {}
+        self._sorted_terms: List[str] = []
+        # term -> occurrences -> sorted (length << _DOC_BITS | doc) entries
+        self._postings: Dict[int, Dict[int, array]] = {}
+        self._document_counts: Dict[int, int] = {}
+        self._doc_ids: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._doc_terms: Dict[int, Dict[int, int]] = {}
+        self._streams: Dict[int, bytes] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._next_doc = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._doc_ids
+
+    def add(self, key: str, text: str):
+        """
+        Index a document, replacing any earlier one with the same key.
+
+        Args:
+            key: The key of the document
+            text: The text of the document
+        """
+        self.remove(key)
+        for group, entry in self._insert(key, text):
+            bisect.insort(group, entry)
+
+    def add_all(self, documents: Iterable[Tuple[str, str]]):
+        """
+        Index many documents, faster than adding them one at a time.
+
+        Args:
+            documents: (key, text) pairs; each replaces any earlier document
+                with the same key
+        """
+        # Posting lists are only sorted again at the end, so every document
+        # replaced is removed first
+        documents = dict(documents)
+        for key in documents:
+            self.remove(key)
+
+        touched: Dict[int, array] = {}
+        for key, text in documents.items():
+            for group, entry in self._insert(key, text):
+                group.append(entry)
+                touched[id(group)] = group
+        for group in touched.values():
+            group[:] = array("Q", sorted(group))
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a document.
+
+        Args:
+            key: The key of the document
+
+        Returns:
+            True if the document was indexed
+        """
+        doc = self._doc_ids.pop(key, None)
+        if doc is None:
+            return False
+
+        length = self._lengths.pop(doc)
+        entry = length << _DOC_BITS | doc
+        for term, count in self._doc_terms.pop(doc).items():
+            groups = self._postings[term]
+            group = groups[count]
+            del group[bisect.bisect_left(group, entry)]
+            if not group:
+                del groups[count]
+            if not groups:
+                del self._postings[term]
+                del self._document_counts[term]
+            else:
+                self._document_counts[term] -= 1
+
+        del self._keys[doc]
+        del self._streams[doc]
+        self._total_length -= length
+        return True
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the documents best matching a query.
+
+        Args:
+            query: Words, "quoted phrases" and prefixes ending in *
+            limit: Maximum number of documents returned
+            accept: If given, only documents whose key it returns True for match
+
+        Returns:
+            (key, score) pairs, best first
+        """
+        words, prefixes, phrases = parse_query(query)
+        if not self._doc_ids or limit < 1:
+            return []
+
+        # Each clause scores a document by the best of its terms
+        clauses: List[List[int]] = []
+        for word in words:
+            term = self._term_ids.get(word)
+            if term in self._postings:
+                clauses.append([term])
+        for prefix in prefixes:
+            terms = self._expand(prefix)
+            if terms:
+                clauses.append(terms)
+
+        required: Optional[Set[int]] = None
+        for phrase in phrases:
+            terms = [self._term_ids.get(word) for word in phrase]
+            if any(term not in self._postings for term in terms):
+                return []
+            docs = self._phrase_docs(terms)
+            required = docs if required is None else required & docs
+            if not required:
+                return []
+            clauses.extend([term] for term in set(terms))
+
+        if not clauses:
+            return []
+
+        weighted = []
+        for terms in clauses:
+            idfs = {term: self._idf(term) for term in terms}
+            weighted.append((max(idfs.values()) * (self.k1 + 1), idfs))
+        weighted.sort(key=lambda clause: clause[0], reverse=True)
+
+        # BM25 of a term is idf * count * (k1 + 1) / (count + base + slope * length)
+        base = self.k1 * (1 - self.b)
+        slope = self.k1 * self.b * len(self._doc_ids) / (self._total_length or 1)
+        saturation = self.k1 + 1
+
+        scores: Dict[int, float] = {}
+        rejected: Set[int] = set()
+        remaining = sum(bound for bound, _ in weighted)
+
+        for bound, idfs in weighted:
+            # Bound of the clauses after this one
+            remaining = max(remaining - bound, 0.0)
+
+            # Score the documents already found
+            for doc, score in scores.items():
+                counts = self._doc_terms[doc]
+                length = self._lengths[doc]
+                best = 0.0
+                for term, idf in idfs.items():
+                    count = counts.get(term)
+                    if count:
+                        best = max(best, idf * count * saturation / (count + base + slope * length))
+                scores[doc] = score + best
+
+            # New documents can only enter the top results while this clause
+            # and the ones after it could score them above the cut-off
+            top = heapq.nlargest(limit, scores.values())
+            heapq.heapify(top)
+            if len(top) >= limit and bound + remaining <= top[0]:
+                self._prune(scores, limit, remaining)
+                continue
+
+            found: Dict[int, float] = {}
+            for term, idf in idfs.items():
+                groups = self._postings[term]
+                for count in sorted(groups, reverse=True):
+                    for entry in groups[count]:
+                        score = idf * count * saturation / (count + base + slope * (entry >> _DOC_BITS))
+                        # The documents left in the group are longer and score lower
+                        if len(top) >= limit and score + remaining <= top[0]:
+                            break
+
+                        doc = entry & _DOC_MASK
+                        if doc in scores or doc in rejected:
+                            continue
+                        if (required is not None and doc not in required) or (
+                            accept is not None and not accept(self._keys[doc])
+                        ):
+                            rejected.add(doc)
+                            continue
+
+                        # A prefix may find a document through several terms;
+                        # only its first score raises the cut-off, which stays
+                        # a lower bound
+                        previous = found.get(doc)
+                        if previous is None:
+                            if len(top) < limit:
+                                heapq.heappush(top, score)
+                            else:
+                                heapq.heappushpop(top, score)
+                        if previous is None or score > previous:
+                            found[doc] = score
+
+            scores.update(found)
+            self._prune(scores, limit, remaining)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self._keys[doc], round(score, 4)) for doc, score in best]
+
+    def _prune(self, scores: Dict[int, float], limit: int, remaining: float):
+        """Drop the documents that can no longer reach the top results."""
+        if len(scores) <= limit:
+            return
+        threshold = heapq.nlargest(limit, scores.values())[-1]
+        for doc in [doc for doc, score in scores.items() if score + remaining < threshold]:
+            del scores[doc]
+
+    def _insert(self, key: str, text: str) -> Iterator[Tuple[array, int]]:
+        """Record a new document, yielding the posting lists its entry belongs in."""
+        doc = self._next_doc
+        self._next_doc += 1
+        stream = array("I", (self._term_id(token) for token in tokenize(text)))
+
+        counts: Dict[int, int] = {}
+        for term in stream:
+            counts[term] = counts.get(term, 0) + 1
+
+        self._doc_ids[key] = doc
+        self._keys[doc] = key
+        self._doc_terms[doc] = counts
+        self._streams[doc] = stream.tobytes()
+        self._lengths[doc] = len(stream)
+        self._total_length += len(stream)
+
+        entry = len(stream) << _DOC_BITS | doc
+        for term, count in counts.items():
+            groups = self._postings.setdefault(term, {})
+            self._document_counts[term] = self._document_counts.get(term, 0) + 1
+            yield groups.setdefault(count, array("Q")), entry
+
+    def _term_id(self, token: str) -> int:
+        """Get the ID of a token, adding it to the vocabulary if new."""
+        term = self._term_ids.get(token)
+        if term is None:
+            term = len(self._term_ids)
+            self._term_ids[token] = term
+            bisect.insort(self._sorted_terms, token)
+        return term
+
+    def _idf(self, term: int) -> float:
+        """BM25 inverse document frequency of a term."""
+        count = self._document_counts[term]
+        return math.log(1 + (len(self._doc_ids) - count + 0.5) / (count + 0.5))
+
+    def _expand(self, prefix: str) -> List[int]:
+        """Get the indexed terms starting with a prefix, the most frequent first."""
+        terms = []
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        for token in self._sorted_terms[start:start + MAX_PREFIX_SCAN]:
+            if not token.startswith(prefix):
+                break
+            term = self._term_ids[token]
+            if term in self._postings:
+                terms.append(term)
+        terms.sort(key=lambda term: self._document_counts[term], reverse=True)
+        return terms[:MAX_PREFIX_TERMS]
+
+    def _phrase_docs(self, terms: List[int]) -> Set[int]:
+        """Get the documents in which terms appear next to each other, in order."""
+        rarest = min(set(terms), key=lambda term: self._document_counts[term])
+        docs = set()
+        for group in self._postings[rarest].values():
+            for entry in group:
+                doc = entry & _DOC_MASK
+                counts = self._doc_terms[doc]
+                if all(term in counts for term in terms):
+                    docs.add(doc)
+        if len(terms) == 1:
+            return docs
+
+        pattern = array("I", terms).tobytes()
+        matched = set()
+        for doc in docs:
+            stream = self._streams[doc]
+            position = stream.find(pattern)
+            # A match must start on a token boundary
+            while position >= 0 and position % _TERM_SIZE:
+                position = stream.find(pattern, position + 1)
+            if position >= 0:
+                matched.add(doc)
+        return matched
@@ -0,0 +1,232 @@
+"""
+Incremental parser for tool calls embedded in messages.
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import serialization
+
+
+# An opening tag such as <view_file>
+_OPEN_TAG = re.compile(r'<([a-zA-Z_][a-zA-Z0-9_]*)>')
+
+# The start of an opening tag cut off at the end of the buffer, such as <view_fi
+_PARTIAL_OPEN_TAG = re.compile(r'<(?:[a-zA-Z_][a-zA-Z0-9_]*)?\Z')
+
+# Any closing tag, used to rule out unterminated tags once the input is complete
+_CLOSE_TAG = re.compile(r'</([a-zA-Z_][a-zA-Z0-9_]*)>')
+
+# Consumed input is dropped from the buffer once it grows past this many characters
+_COMPACT_THRESHOLD = 64 * 1024
+
+
+def _looks_like_call(body: str) -> bool:
+    """Check whether a tag body opens a JSON object, rather than being prose."""
+    return body.lstrip().startswith("{")
+
+
+class ToolCallParser:
+    """
+    Single-pass parser for tool calls like <tool_name> {...} </tool_name>.
+
+    Input can be fed in arbitrary chunks; each tool call is returned as soon
+    as its closing tag has been seen. Valid calls are returned as
+    {"name": ..., "parameters": {...}}. A tag whose body opens a JSON object
+    but does not parse is returned as {"name": ..., "error": ...} instead of
+    being dropped, and so is one that is never closed, once the input ends.
+    Tags whose body does not start with "{", such as <p>hi</p>, are plain
+    text and skipped.
+
+    Tags are matched the same way as the original regular expression: the
+    body of a call runs up to the first matching closing tag, and an opening
+    tag that is never closed is skipped. Because a tag can only be known to
+    be unterminated once all the input has been seen, the calls that follow
+    one are returned by close().
+    """
+
+    def __init__(self):
+        """Initialize the parser."""
+        self._buffer = ""
+        self._offset = 0            # Position of the buffer in the whole input
+        self._pos = 0               # Where scanning resumes in the buffer
+        self._name: Optional[str] = None
+        self._tag_start = 0         # Start of the opening tag being collected
+        self._body_start = 0        # Start of the body being collected
+        self._search_from = 0       # Where to resume looking for the closing tag
+        self._closed = False
+        self._last_closing: Optional[Dict[str, int]] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Feed a chunk of input to the parser.
+
+        Args:
+            chunk: The next piece of the message
+
+        Returns:
+            The tool calls completed by this chunk
+        """
+        return list(self.iter_feed(chunk))
+
+    def iter_feed(self, chunk: str) -> Iterator[Dict[str, Any]]:
+        """
+        Feed a chunk of input, yielding each tool call as soon as it is parsed.
+
+        Args:
+            chunk: The next piece of the message
+
+        Yields:
+            The tool calls completed by this chunk
+        """
+        if self._closed:
+            raise ValueError("Cannot feed a closed parser")
+
+        self._buffer += chunk
+        yield from self._scan()
+        self._compact()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Signal the end of the input.
+
+        Returns:
+            The remaining tool calls, including unterminated ones
+        """
+        return list(self.iter_close())
+
+    def iter_close(self) -> Iterator[Dict[str, Any]]:
+        """
+        Signal the end of the input, yielding the remaining tool calls.
+
+        Yields:
+            The remaining tool calls, including unterminated ones
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        yield from self._scan()
+        self._buffer = ""
+
+    def _scan(self) -> Iterator[Dict[str, Any]]:
+        """Scan the buffer from the current position."""
+        buffer = self._buffer
+
+        while True:
+            if self._name is None:
+                start = buffer.find("<", self._pos)
+                if start == -1:
+                    self._pos = len(buffer)
+                    return
+
+                match = _OPEN_TAG.match(buffer, start)
+                if match is None:
+                    if not self._closed and _PARTIAL_OPEN_TAG.match(buffer, start):
+                        # Wait for the rest of the tag
+                        self._pos = start
+                        return
+                    self._pos = start + 1
+                    continue
+
+                self._name = match.group(1)
+                self._tag_start = start
+                self._body_start = match.end()
+                self._search_from = match.end()
+                self._pos = match.end()
+
+            closing = f"</{self._name}>"
+
+            if self._closed and not self._may_close(self._name, self._body_start):
+                end = -1
+            else:
+                end = buffer.find(closing, self._search_from)
+
+            if end == -1:
+                if not self._closed:
+                    # Wait for more input, re-checking the tail in case the
+                    # closing tag was cut in half
+                    self._search_from = max(self._body_start, len(buffer) - len(closing) + 1)
+                    return
+
+                # The tag is never closed: report it if it looks like a tool
+                # call and resume scanning right after the opening tag
+                call = self._unterminated_call()
+                self._name = None
+                self._pos = self._body_start
+                if call is not None:
+                    yield call
+                continue
+
+            body = buffer[self._body_start:end]
+            call = self._make_call(self._name, body, self._tag_start)
+            self._name = None
+            self._pos = end + len(closing)
+            if call is not None:
+                yield call
+
+    def _may_close(self, name: str, position: int) -> bool:
+        """Check whether a closing tag for name exists after position."""
+        if self._last_closing is None:
+            self._last_closing = {}
+            for match in _CLOSE_TAG.finditer(self._buffer, self._pos):
+                self._last_closing[match.group(1)] = match.start()
+        return self._last_closing.get(name, -1) >= position
+
+    def _unterminated_call(self) -> Optional[Dict[str, Any]]:
+        """Build the error entry for an unterminated tag, if it looks like a call."""
+        if not _looks_like_call(self._buffer[self._body_start:self._body_start + 256]):
+            return None
+
+        return {
+            "name": self._name,
+            "error": f"Unterminated tool call: missing </{self._name}>",
+            "offset": self._offset + self._tag_start
+        }
+
+    def _make_call(self, name: str, body: str, tag_start: int) -> Optional[Dict[str, Any]]:
+        """Parse the body of a tool call, or return None if it is plain text."""
+        if not _looks_like_call(body[:256]):
+            return None
+
+        try:
+            parameters = serialization.loads(body)
+        except serialization.JSONDecodeError as e:
+            return {
+                "name": name,
+                "error": f"Invalid JSON parameters: {str(e)}",
+                "offset": self._offset + tag_start
+            }
+
+        return {
+            "name": name,
+            "parameters": parameters
+        }
+
+    def _compact(self):
+        """Drop the consumed part of the buffer."""
+        keep_from = self._tag_start if self._name is not None else self._pos
+        if keep_from < _COMPACT_THRESHOLD:
+            return
+
+        self._buffer = self._buffer[keep_from:]
+        self._offset += keep_from
+        self._pos -= keep_from
+        if self._name is not None:
+            self._tag_start -= keep_from
+            self._body_start -= keep_from
+            self._search_from -= keep_from
+
+
+def iter_tool_calls(text: str) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a complete message, yielding each tool call as soon as it is found.
+
+    Args:
+        text: The message to parse
+
+    Yields:
+        Tool calls and malformed tool call entries, in order
+    """
+    parser = ToolCallParser()
+    yield from parser.iter_feed(text)
+    yield from parser.iter_close()
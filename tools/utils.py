@@ -1,44 +1,29 @@
 """
 Utility functions for the MCP server tools.
 """
-import json
 import re
 from typing import Dict, Any, List, Optional
 
+from . import serialization
+from .tool_call_parser import iter_tool_calls
 
-def extract_tool_calls(text: str) -> List[Dict[str, Any]]:
+
+def extract_tool_calls(text: str, include_malformed: bool = False) -> List[Dict[str, Any]]:
     """
     Extract tool calls from text.
     
     Args:
         text: The text to extract tool calls from
+        include_malformed: If true, malformed tool calls are returned as
+            entries with an "error" key instead of being skipped
         
     Returns:
         A list of dictionaries with tool name and parameters
     """
-    # Pattern to match tool calls like <tool_name> {...} </tool_name>
-    pattern = r'<([a-zA-Z_][a-zA-Z0-9_]*)>\s*(.*?)\s*</\1>'
-    
-    # Find all matches
-    matches = re.finditer(pattern, text, re.DOTALL)
-    
-    tool_calls = []
-    for match in matches:
-        tool_name = match.group(1)
-        params_str = match.group(2)
-        
-        try:
-            # Parse parameters as JSON
-            params = json.loads(params_str)
-            tool_calls.append({
-                "name": tool_name,
-                "parameters": params
-            })
-        except json.JSONDecodeError:
-            # Skip invalid JSON
-            continue
-    
-    return tool_calls
+    return [
+        tool_call for tool_call in iter_tool_calls(text)
+        if include_malformed or "error" not in tool_call
+    ]
 
 
 def format_tool_response(tool_name: str, response: Dict[str, Any]) -> str:
@@ -52,7 +37,7 @@ def format_tool_response(tool_name: str, response: Dict[str, Any]) -> str:
     Returns:
         A formatted string with the tool response
     """
-    response_json = json.dumps(response, indent=2)
+    response_json = serialization.dumps(response, indent=True)
     return f"<{tool_name}_response>\n{response_json}\n</{tool_name}_response>"
 
 
@@ -83,3 +68,21 @@ def safe_path(path: str) -> str:
     """
     # Remove any path traversal attempts
     return re.sub(r'\.\./', '', path)
+
+
+def connection_path(websocket) -> str:
+    """
+    Get the request path of a WebSocket connection.
+    
+    Args:
+        websocket: The WebSocket connection
+        
+    Returns:
+        The path, including the query string, or an empty string if unknown
+    """
+    # Newer versions of websockets expose the handshake request, older ones
+    # the path itself
+    request = getattr(websocket, "request", None)
+    if request is not None and getattr(request, "path", None):
+        return request.path
+    return getattr(websocket, "path", "") or ""
@@ -1,13 +1,65 @@
 """
 View File Tool implementation.
 """
+import bisect
 import json
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from .base_tool import BaseTool
+from .file_io import run_file_io
+from .line_index import read_line_range
+from .outline import OutlineEntry, get_outline
 from .utils import safe_path
 
 
+# Maximum number of outline entries listed for each range of hidden lines
+MAX_SUMMARY_ENTRIES = 100
+
+
+async def summarize_other_lines(path: str, shown: List[Tuple[int, int]], total_lines: int) -> str:
+    """
+    Summarize the lines of a file outside of the viewed ranges.
+    
+    Each hidden range is described by its size and by the outline entries
+    (classes, functions, exports, keys...) it contains.
+    
+    Args:
+        path: The path of the file
+        shown: The viewed (start_line, end_line) ranges, inclusive
+        total_lines: The number of lines in the file
+        
+    Returns:
+        The summary of the hidden lines
+    """
+    # The outline is computed once per version of the file
+    outline = await run_file_io(get_outline, path)
+    summary = []
+    
+    # Summarize the lines between, before and after the viewed ranges
+    next_line = 0
+    for start_line, end_line in sorted(shown) + [(total_lines, total_lines)]:
+        if start_line > next_line:
+            summary.append(f"Lines {next_line}-{start_line-1} (not shown): {start_line - next_line} lines")
+            summary.extend(_outline_range(outline, next_line, start_line - 1))
+        next_line = max(next_line, end_line + 1)
+    
+    return "\n".join(summary)
+
+
+def _outline_range(outline: List[OutlineEntry], first_line: int, last_line: int) -> List[str]:
+    """Describe the outline entries between two lines, inclusive."""
+    # The outline is sorted by line, so find the range by bisection
+    first = bisect.bisect_left(outline, (first_line, ""))
+    last = bisect.bisect_left(outline, (last_line + 1, ""))
+    
+    shown = outline[first:min(last, first + MAX_SUMMARY_ENTRIES)]
+    entries = [f"  {line}: {description}" for line, description in shown]
+    if last - first > MAX_SUMMARY_ENTRIES:
+        entries.append(f"  ... {last - first - MAX_SUMMARY_ENTRIES} more")
+    
+    return entries
+
+
 class ViewFileTool(BaseTool):
     """Tool to view the contents of a file."""
     
@@ -88,43 +140,23 @@ class ViewFileTool(BaseTool):
             return {"error": "Cannot view more than 200 lines at once"}
         
         try:
-            # Read the file
-            with open(path, 'r', encoding='utf-8', errors='replace') as f:
-                lines = f.readlines()
-            
-            # Get the requested lines
-            total_lines = len(lines)
-            
-            # Adjust line numbers to be within bounds
-            start_line = max(0, min(start_line, total_lines - 1))
-            end_line = max(0, min(end_line, total_lines - 1))
-            
-            # Extract the requested lines
-            requested_lines = lines[start_line:end_line + 1]
+            # Read the requested lines off the event loop, through the cached
+            # line index of the file
+            content, total_lines, start_line, end_line = await run_file_io(
+                read_line_range, path, start_line, end_line
+            )
             
             result = {
                 "file_path": path,
                 "start_line": start_line,
                 "end_line": end_line,
                 "total_lines": total_lines,
-                "content": "".join(requested_lines)
+                "content": content
             }
             
             # Include summary of other lines if requested
             if include_summary and (start_line > 0 or end_line < total_lines - 1):
-                summary = []
-                
-                # Summarize lines before the requested range
-                if start_line > 0:
-                    before_lines = lines[:start_line]
-                    summary.append(f"Lines 0-{start_line-1} (not shown): {len(before_lines)} lines")
-                
-                # Summarize lines after the requested range
-                if end_line < total_lines - 1:
-                    after_lines = lines[end_line+1:]
-                    summary.append(f"Lines {end_line+1}-{total_lines-1} (not shown): {len(after_lines)} lines")
-                
-                result["summary"] = "\n".join(summary)
+                result["summary"] = await summarize_other_lines(path, [(start_line, end_line)], total_lines)
             
             return result
         
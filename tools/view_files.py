@@ -0,0 +1,175 @@
+"""
+View files tool for the MCP server.
+"""
+import asyncio
+import os
+from typing import Dict, Any, List, Tuple
+from .base_tool import BaseTool
+from .file_io import run_file_io
+from .line_index import read_line_ranges
+from .utils import safe_path
+from .view_file import summarize_other_lines
+
+
+# Maximum number of lines in a single range, as for view_file
+MAX_RANGE_LINES = 200
+
+# Maximum number of lines returned by a single call
+MAX_TOTAL_LINES = 2000
+
+
+class ViewFilesTool(BaseTool):
+    """Tool to view several ranges of several files at once."""
+    
+    def __init__(self):
+        """Initialize the view files tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "Files": {
+              "type": "array",
+              "minItems": 1,
+              "maxItems": 50,
+              "items": {
+                "type": "object",
+                "properties": {
+                  "AbsolutePath": {
+                    "type": "string",
+                    "description": "Path to file to view. Must be an absolute path."
+                  },
+                  "Ranges": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {
+                      "type": "object",
+                      "properties": {
+                        "StartLine": {
+                          "type": "integer",
+                          "description": "Startline to view"
+                        },
+                        "EndLine": {
+                          "type": "integer",
+                          "description": "Endline to view, inclusive. This cannot be more than 200 lines away from StartLine"
+                        }
+                      },
+                      "additionalProperties": false,
+                      "required": ["StartLine", "EndLine"]
+                    },
+                    "description": "The ranges of lines to view in this file"
+                  }
+                },
+                "additionalProperties": false,
+                "required": ["AbsolutePath", "Ranges"]
+              },
+              "description": "The files to view, each with the ranges of lines to view"
+            },
+            "IncludeSummaryOfOtherLines": {
+              "type": "boolean",
+              "description": "If true, you will also get a condensed summary of the lines of each file outside of the requested ranges."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["Files"]
+        }
+        """
+        
+        description = (
+            "View several ranges of lines from several files in a single call. The lines of each file are 0-indexed "
+            "and ranges are inclusive, as in view_file. Each range can span at most 200 lines, and a call can return "
+            "at most 2000 lines in total. Use this instead of repeated view_file calls when you already know which "
+            "parts of which files you need. A file that cannot be read gets an error entry without failing the "
+            "other files."
+        )
+        
+        super().__init__("view_files", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the view files tool.
+        
+        Args:
+            params: The parameters for the tool
+        
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        files = params.get("Files", [])
+        include_summary = params.get("IncludeSummaryOfOtherLines", False)
+        
+        # Validate line ranges before reading anything
+        total_lines = 0
+        for entry in files:
+            for line_range in entry["Ranges"]:
+                start_line = line_range["StartLine"]
+                end_line = line_range["EndLine"]
+                
+                if end_line < start_line:
+                    return {"error": f"EndLine must be greater than or equal to StartLine in {entry['AbsolutePath']}"}
+                
+                if end_line - start_line > MAX_RANGE_LINES:
+                    return {"error": f"Cannot view more than {MAX_RANGE_LINES} lines at once in {entry['AbsolutePath']}"}
+                
+                total_lines += end_line - start_line + 1
+        
+        if total_lines > MAX_TOTAL_LINES:
+            return {"error": f"Cannot view more than {MAX_TOTAL_LINES} lines in one call, requested {total_lines}"}
+        
+        # Read the files concurrently; the file I/O pool bounds the parallelism
+        results = await asyncio.gather(*(
+            self._view_file(
+                entry["AbsolutePath"],
+                [(line_range["StartLine"], line_range["EndLine"]) for line_range in entry["Ranges"]],
+                include_summary
+            )
+            for entry in files
+        ))
+        
+        return {"files": results}
+    
+    async def _view_file(self, path: str, ranges: List[Tuple[int, int]], include_summary: bool) -> Dict[str, Any]:
+        """
+        View the ranges of one file.
+        
+        Args:
+            path: The path of the file
+            ranges: The (start_line, end_line) ranges to view, inclusive
+            include_summary: Whether to summarize the lines outside of the ranges
+        
+        Returns:
+            The contents of the ranges, or an error
+        """
+        path = safe_path(path)
+        if not os.path.isfile(path):
+            return {"file_path": path, "error": f"File not found: {path}"}
+        
+        try:
+            # All ranges come from the same version of the file and share
+            # its cached line index
+            contents, total_lines = await run_file_io(read_line_ranges, path, ranges)
+            
+            result = {
+                "file_path": path,
+                "total_lines": total_lines,
+                "ranges": [
+                    {"start_line": start_line, "end_line": end_line, "content": content}
+                    for content, start_line, end_line in contents
+                ]
+            }
+            
+            if include_summary and total_lines > 0:
+                shown = [(start_line, end_line) for _, start_line, end_line in contents]
+                summary = await summarize_other_lines(path, shown, total_lines)
+                if summary:
+                    result["summary"] = summary
+            
+            return result
+        
+        except Exception as e:
+            return {"file_path": path, "error": f"Failed to read file: {str(e)}"}
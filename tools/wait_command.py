@@ -0,0 +1,69 @@
+"""
+Wait Command Tool implementation.
+"""
+from typing import Dict, Any
+from .base_tool import BaseTool
+from .command_manager import get_command_manager
+
+
+class WaitCommandTool(BaseTool):
+    """Tool to wait for a command started by run_command to finish."""
+    
+    def __init__(self):
+        """Initialize the wait command tool."""
+        schema = """
+        {
+          "$schema": "https://json-schema.org/draft/2020-12/schema",
+          "properties": {
+            "CommandId": {
+              "type": "string",
+              "description": "The ID of the command, as returned by run_command."
+            },
+            "TimeoutMs": {
+              "type": "integer",
+              "minimum": 0,
+              "maximum": 600000,
+              "description": "Longest time to wait, in milliseconds. Defaults to 30000."
+            }
+          },
+          "additionalProperties": false,
+          "type": "object",
+          "required": ["CommandId"]
+        }
+        """
+        
+        description = (
+            "Wait for a non-blocking command started with run_command to finish, up to a timeout, and return its "
+            "status and exit code. Use this instead of polling command_status in a loop. If the timeout expires "
+            "first, timed_out is true and the command keeps running."
+        )
+        
+        super().__init__("wait_command", description, schema)
+    
+    async def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the wait command tool.
+        
+        Args:
+            params: The parameters for the tool
+            
+        Returns:
+            The result of executing the tool
+        """
+        # Validate parameters
+        error = self.validate_params(params)
+        if error:
+            return {"error": error}
+        
+        command_id = params.get("CommandId", "")
+        timeout_ms = params.get("TimeoutMs", 30000)
+        
+        command = get_command_manager().get(command_id)
+        if command is None:
+            return {"error": f"Command not found: {command_id}"}
+        
+        finished = await command.wait(timeout_ms / 1000)
+        
+        result = command.to_dict()
+        result["timed_out"] = not finished
+        return result
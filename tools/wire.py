@@ -0,0 +1,140 @@
+"""
+Wire encodings for the responses sent to clients.
+"""
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+from . import serialization
+from .utils import format_tool_response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+# The original format: XML-like tags around indented JSON, in text frames
+TEXT_ENCODING = "text"
+
+# Compact JSON objects in text frames
+JSON_ENCODING = "json"
+
+# MessagePack or CBOR objects in binary frames
+MSGPACK_ENCODING = "msgpack"
+CBOR_ENCODING = "cbor"
+
+ENCODINGS = (TEXT_ENCODING, JSON_ENCODING, MSGPACK_ENCODING, CBOR_ENCODING)
+
+
+def available_encodings() -> List[str]:
+    """
+    Get the encodings that can be used with the installed packages.
+
+    Returns:
+        The names of the available encodings
+    """
+    encodings = [TEXT_ENCODING, JSON_ENCODING]
+    if msgpack is not None:
+        encodings.append(MSGPACK_ENCODING)
+    if cbor2 is not None:
+        encodings.append(CBOR_ENCODING)
+    return encodings
+
+
+def requested_encoding(path: Optional[str]) -> Optional[str]:
+    """
+    Get the encoding a client asked for in its connection URL.
+
+    Clients opt in with a query parameter, e.g. ws://localhost:8765/?encoding=msgpack
+
+    Args:
+        path: The path of the connection request, including the query string
+
+    Returns:
+        The requested encoding, or None if the client did not ask for one
+    """
+    if not path:
+        return None
+
+    values = parse_qs(urlparse(path).query).get("encoding")
+    return values[0].lower() if values else None
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """
+    Choose the encoding for a connection.
+
+    Args:
+        requested: The encoding requested by the client, if any
+
+    Returns:
+        The requested encoding if it is available, compact JSON if the client
+        asked for an encoding that is not, and the text format otherwise
+    """
+    if requested is None:
+        return TEXT_ENCODING
+
+    if requested in available_encodings():
+        return requested
+
+    return JSON_ENCODING
+
+
+def encode_message(message: Dict[str, Any], encoding: str) -> Union[str, bytes]:
+    """
+    Encode a message for the wire.
+
+    Args:
+        message: The message to encode
+        encoding: The encoding of the connection
+
+    Returns:
+        A str to send as a text frame, or bytes to send as a binary frame
+    """
+    if encoding == MSGPACK_ENCODING:
+        return msgpack.packb(message, use_bin_type=True)
+
+    if encoding == CBOR_ENCODING:
+        return cbor2.dumps(message)
+
+    # Both JSON-based encodings send compact JSON for plain messages
+    return serialization.dumps(message)
+
+
+def encode_tool_response(
+    tool_name: str,
+    response: Dict[str, Any],
+    encoding: str,
+    request_id: Optional[str] = None
+) -> Union[str, bytes]:
+    """
+    Encode a tool response for the wire.
+
+    In the text encoding, this is the tagged format produced by
+    format_tool_response. Other encodings send an object with the tool name
+    and its response: {"tool": ..., "response": {...}}.
+
+    Args:
+        tool_name: The name of the tool
+        response: The response from the tool
+        encoding: The encoding of the connection
+        request_id: The ID of the request the response belongs to, if any
+
+    Returns:
+        A str to send as a text frame, or bytes to send as a binary frame
+    """
+    if encoding == TEXT_ENCODING:
+        formatted_response = format_tool_response(tool_name, response)
+        if request_id is None:
+            return formatted_response
+        return serialization.dumps({"request_id": request_id, "response": formatted_response})
+
+    message = {"tool": tool_name, "response": response}
+    if request_id is not None:
+        message["request_id"] = request_id
+    return encode_message(message, encoding)
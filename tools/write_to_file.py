@@ -1,10 +1,14 @@
 """
 Write to File Tool implementation.
 """
+import asyncio
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from .base_tool import BaseTool
+from .file_io import atomic_write_text, lock_paths, path_lock, run_file_io
+from .file_transaction import FileChange
+from .journal import record_changes
 from .utils import safe_path
 
 
@@ -28,11 +32,35 @@ class WriteToFileTool(BaseTool):
             "EmptyFile": {
               "type": "boolean",
               "description": "Set this to true to create an empty file."
+            },
+            "Files": {
+              "type": "array",
+              "minItems": 1,
+              "maxItems": 500,
+              "items": {
+                "type": "object",
+                "properties": {
+                  "TargetFile": {
+                    "type": "string",
+                    "description": "The file to create."
+                  },
+                  "CodeContent": {
+                    "type": "string",
+                    "description": "The contents of the file."
+                  }
+                },
+                "additionalProperties": false,
+                "required": ["TargetFile", "CodeContent"]
+              },
+              "description": "Several files to create in one call, instead of TargetFile, CodeContent and EmptyFile."
             }
           },
           "additionalProperties": false,
           "type": "object",
-          "required": ["TargetFile", "CodeContent", "EmptyFile"]
+          "anyOf": [
+            {"required": ["TargetFile", "CodeContent", "EmptyFile"]},
+            {"required": ["Files"]}
+          ]
         }
         """
         
@@ -42,7 +70,10 @@ class WriteToFileTool(BaseTool):
             "1. NEVER use this tool to modify or overwrite existing files. Always first confirm that TargetFile "
             "does not exist before calling this tool. "
             "2. You MUST specify TargetFile as the FIRST argument. Please specify the full TargetFile before "
-            "any of the code contents."
+            "any of the code contents. "
+            "3. To create many files at once, such as when scaffolding a module, pass them all in Files instead "
+            "of making one call per file. Each file is created independently and gets its own status; files "
+            "that already exist are reported and left untouched."
         )
         
         super().__init__("write_to_file", description, schema)
@@ -62,6 +93,11 @@ class WriteToFileTool(BaseTool):
         if error:
             return {"error": error}
         
+        if "Files" in params:
+            if "TargetFile" in params or "CodeContent" in params:
+                return {"error": "Pass either Files or TargetFile and CodeContent, not both"}
+            return await self._create_files(params["Files"])
+        
         target_file = params.get("TargetFile", "")
         code_content = params.get("CodeContent", "")
         empty_file = params.get("EmptyFile", False)
@@ -69,25 +105,135 @@ class WriteToFileTool(BaseTool):
         # Validate target file
         target_file = safe_path(target_file)
         
-        # Check if file already exists
-        if os.path.exists(target_file):
-            return {"error": f"File already exists: {target_file}. Use edit_file tool instead."}
-        
         try:
-            # Create parent directories if they don't exist
-            os.makedirs(os.path.dirname(target_file), exist_ok=True)
-            
-            # Write the file
-            with open(target_file, 'w', encoding='utf-8') as f:
-                if not empty_file:
-                    f.write(code_content)
+            # Hold the lock of the file, so that two concurrent calls cannot
+            # both create it
+            async with path_lock(target_file):
+                # Check if file already exists
+                if os.path.exists(target_file):
+                    return {"error": f"File already exists: {target_file}. Use edit_file tool instead."}
+                
+                # Create the file off the event loop
+                content = "" if empty_file else code_content
+                await run_file_io(self._create_file, target_file, content)
+                
+                # Journal the creation so that it can be undone
+                edit_id = await record_changes(self.name, [FileChange(target_file, None, content, None)])
             
             return {
                 "success": True,
                 "message": f"File created: {target_file}",
                 "file_path": target_file,
+                "edit_id": edit_id,
                 "is_empty": empty_file
             }
         
+        except FileExistsError:
+            return {"error": f"File already exists: {target_file}. Use edit_file tool instead."}
         except Exception as e:
             return {"error": f"Failed to write file: {str(e)}"}
+    
+    def _create_file(self, target_file: str, content: str):
+        """
+        Create a file and its parent directories.
+        
+        Args:
+            target_file: The path of the file
+            content: The contents to write
+        """
+        # Create parent directories if they don't exist
+        directory = os.path.dirname(target_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Write the file atomically, failing if another process created it meanwhile
+        atomic_write_text(target_file, content, overwrite=False)
+    
+    async def _create_files(self, files: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Create several files, each independently of the others.
+        
+        Args:
+            files: The TargetFile and CodeContent of each file
+            
+        Returns:
+            The result of the call, with the status of each file
+        """
+        targets = [safe_path(file["TargetFile"]) for file in files]
+        statuses: List[Dict[str, Any]] = [{"file_path": target} for target in targets]
+        
+        # A path given twice is only created from its first entry
+        pending: Dict[str, int] = {}
+        for index, target in enumerate(targets):
+            if target in pending:
+                statuses[index]["error"] = "File given more than once in the same call"
+            else:
+                pending[target] = index
+        
+        try:
+            # Hold the locks of every file, so concurrent calls cannot create them too
+            async with lock_paths(list(pending)):
+                existing = await run_file_io(_existing_paths, list(pending))
+                for target in existing:
+                    statuses[pending.pop(target)]["error"] = f"File already exists: {target}. Use edit_file tool instead."
+                
+                # Create each parent directory once, then write the files in parallel;
+                # a file whose directory cannot be created fails on its own
+                failed = await run_file_io(_make_directories, list(pending))
+                for target in [target for target in pending if os.path.dirname(target) in failed]:
+                    error = failed[os.path.dirname(target)]
+                    statuses[pending.pop(target)]["error"] = f"Failed to create directory: {error}"
+                
+                async def create(target: str, index: int) -> Optional[FileChange]:
+                    content = files[index]["CodeContent"]
+                    try:
+                        await run_file_io(atomic_write_text, target, content, None, False)
+                    except FileExistsError:
+                        statuses[index]["error"] = f"File already exists: {target}. Use edit_file tool instead."
+                        return None
+                    except OSError as e:
+                        statuses[index]["error"] = f"Failed to write file: {str(e)}"
+                        return None
+                    statuses[index]["success"] = True
+                    return FileChange(target, None, content, None)
+                
+                results = await asyncio.gather(*(create(target, index) for target, index in pending.items()))
+                created = [change for change in results if change is not None]
+                
+                # Journal the files that were created as one edit
+                edit_id = await record_changes(self.name, created) if created else None
+        
+        except Exception as e:
+            return {"error": f"Failed to write files: {str(e)}"}
+        
+        if not created:
+            return {"error": f"None of the {len(files)} files could be created", "files": statuses}
+        
+        return {
+            "success": True,
+            "message": f"{len(created)} of {len(files)} files created",
+            "edit_id": edit_id,
+            "files": statuses
+        }
+
+
+def _existing_paths(paths: List[str]) -> List[str]:
+    """Get the paths that already exist."""
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _make_directories(paths: List[str]) -> Dict[str, str]:
+    """
+    Create the parent directories of several files, each only once.
+
+    Returns:
+        The error of each directory that could not be created
+    """
+    failed: Dict[str, str] = {}
+    directories = {os.path.dirname(path) for path in paths}
+    for directory in sorted(directory for directory in directories if directory):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            failed[directory] = str(e)
+    return failed